@@ -1,5 +1,6 @@
 import os
 import shutil
+import asyncio
 from fastapi import (
     APIRouter,
     Depends,
@@ -47,11 +48,48 @@ from app.db.firestore import (
     get_guideline_pages,
     get_guideline_page,
     get_brand_guidelines_by_user,
+    update_brand_guideline_colors,
 )
+from app.core.agent.brand_palette import brand_palettes
+from app.core.openrouter_agent.tool_cache import tool_cache, GUIDELINE_TOOLS
 
 import logging
 logger = logging.getLogger(__name__)
 
+# Import the analysis cache if Redis support is available
+try:
+    from app.core.openrouter_agent.redis import get_analysis_cache, invalidate_cached_results
+    analysis_cache_available = True
+except ImportError:
+    analysis_cache_available = False
+
+
+async def invalidate_cached_analyses():
+    """Invalidate cached compliance analyses and guideline tool results after guidelines change."""
+    tool_cache.invalidate(GUIDELINE_TOOLS)
+    if not analysis_cache_available:
+        return
+    try:
+        await get_analysis_cache().invalidate_guidelines()
+        # Results keyed on the old version no longer match; drop them instead of waiting for their TTL
+        for tool_name in GUIDELINE_TOOLS:
+            await invalidate_cached_results(tool_name)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate analysis cache: {str(e)}")
+
+
+async def index_brand_colors(guideline_id: str, brand_name: str, brand_colors: list):
+    """Store a guideline's brand colors and rebuild the brand's palette index."""
+    if not brand_colors:
+        return
+    try:
+        await asyncio.to_thread(update_brand_guideline_colors, guideline_id, brand_colors)
+        await asyncio.to_thread(brand_palettes.reload, brand_name)
+    except Exception as e:
+        logger.warning(f"Failed to index brand colors for {brand_name}: {str(e)}")
+        # Keep this worker's index usable even if the colors could not be stored
+        brand_palettes.build(brand_name, brand_colors)
+
 router = APIRouter()
 
 
@@ -118,6 +156,9 @@ async def upload_brand_guideline(
     from app.utils.background_tasks import process_guideline_page
 
     async def event_stream():
+        # Guidelines are changing, so analyses made against the old ones are stale
+        await invalidate_cached_analyses()
+
         # Extract pages as images
         results = pdf_to_image_fitz(
             pdf_path=temp_file_path,
@@ -127,6 +168,7 @@ async def upload_brand_guideline(
             verbose=True
         )
         processed = 0
+        brand_colors = []
         for result in results:
             if result["success"]:
                 # Store page in database 
@@ -157,6 +199,7 @@ async def upload_brand_guideline(
                 page_data_with_id = dict(page_data)
                 page_data_with_id["id"] = page_id
                 llm_result = await process_guideline_page(page_data_with_id)
+                brand_colors.extend(llm_result.get("brand_colors") or [])
                 # Update page with results in Firestore
                 try:
                     from app.db.firestore import update_guideline_page_with_results
@@ -173,6 +216,12 @@ async def upload_brand_guideline(
                 percent = int((processed / total_pages) * 100)
                 # Stream progress as JSON line
                 yield f"data: {json.dumps({'progress': percent, 'processed_pages': processed, 'total_pages': total_pages, 'guideline_id': str(guideline_id)})}\n\n"
+        # Store the brand colors and build the palette index used by match_brand_colors
+        await index_brand_colors(str(guideline_id), brand_name, brand_colors)
+
+        # Invalidate again so analyses cached while pages were processing are not reused
+        await invalidate_cached_analyses()
+
         # Final result
         guideline = get_brand_guideline(guideline_id)
         # Convert datetime fields to ISO strings for JSON serialization
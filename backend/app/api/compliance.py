@@ -33,6 +33,14 @@ from app.db.database import create_compliance_analysis as create_compliance_anal
 from app.db.firestore import create_feedback, get_user_feedback, log_compliance_check, get_compliance_analysis, get_user_compliance_analyses, create_compliance_analysis, get_user_usage, get_brand_guidelines_by_user
 from app.utils.compliance_extractor import extract_brand_and_score
 
+# Import the analysis cache if Redis support is available
+try:
+    from app.core.openrouter_agent.redis import get_analysis_cache, get_analysis_cache_config
+    from app.core.openrouter_agent.redis.analysis_cache import hash_asset
+    analysis_cache_available = True
+except ImportError:
+    analysis_cache_available = False
+
 import re
 import xmltodict
 
@@ -148,8 +156,13 @@ async def process_image_and_stream(
     # Create a queue for the streaming data
     queue = asyncio.Queue()
 
+    # Streamed agent events, kept so the analysis cache can replay them
+    recorded_events = []
+
     # Define the streaming callback
     async def on_stream(data: Dict[str, Any]):
+        if data.get("type") != "complete":
+            recorded_events.append(data)
         await queue.put(data)
 
     # Get user feedback to include in the system prompt
@@ -175,51 +188,85 @@ async def process_image_and_stream(
     else:
         print(f"[LOG] process_image_and_stream: No user feedback found (line {inspect.currentframe().f_lineno})")
 
+    analysis_model = "anthropic/claude-3.7-sonnet"
+
+    # Look up a previous analysis of the same asset, brand, prompt, model and guideline version
+    analysis_cache = None
+    analysis_cache_key = None
+    cached_analysis = None
+    if analysis_cache_available and get_analysis_cache_config()["enabled"]:
+        try:
+            analysis_cache = get_analysis_cache()
+            analysis_cache_key = await analysis_cache.make_key(
+                hash_asset(image_base64), brand_name, f"{custom_system_prompt}\n\n{text}", analysis_model
+            )
+            cached_analysis = await analysis_cache.get(analysis_cache_key)
+        except Exception as e:
+            print(f"[WARNING] process_image_and_stream: Analysis cache unavailable: {e} (line {inspect.currentframe().f_lineno})")
+            analysis_cache = None
+
+    if cached_analysis:
+        # Replay the stored events and final report through the normal streaming loop
+        print(f"[LOG] process_image_and_stream: Replaying cached analysis {analysis_cache_key} (line {inspect.currentframe().f_lineno})")
+        agent = None
+
+        async def replay_cached_analysis():
+            await queue.put({"type": "status", "content": "Found an identical previous analysis, replaying results..."})
+            if get_analysis_cache_config()["replay_events"]:
+                for event in cached_analysis.get("events") or []:
+                    await queue.put(event)
+            await queue.put({"type": "complete", "content": cached_analysis["final_report"]})
+
+        processing_task = asyncio.create_task(replay_cached_analysis())
+    else:
+        processing_task = None
+
     # Create an OpenRouterAgent instance using our native implementation with Claude 3.7 Sonnet
     # Claude is better suited for image compliance analysis with its ability to detect visual details
     print(f"[LOG] process_image_and_stream: Instantiating OpenRouterNativeAgent with Claude 3.7 (line {inspect.currentframe().f_lineno})")
     from app.core.openrouter_agent.native_agent import OpenRouterAgent as OpenRouterNativeAgent
 
-    # Get the OpenRouter API key from environment variables
-    import os
-    OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-    if not OPENROUTER_API_KEY:
-        print(f"\033[91m[ERROR] OPENROUTER_API_KEY not found in environment variables\033[0m")
-        raise ValueError("OPENROUTER_API_KEY environment variable is required")
-
-    print(f"\033[94m[INFO] Using OpenRouter API key: {OPENROUTER_API_KEY[:5]}...\033[0m")
-
-    # Note: The OpenRouterNativeAgent uses OPENROUTER_TIMEOUT internally, so we don't pass timeout here
-    agent = OpenRouterNativeAgent(
-        api_key=OPENROUTER_API_KEY,  # Required parameter
-        model="anthropic/claude-3.7-sonnet",  # Using Claude 3.7 Sonnet for improved compliance analysis
-        on_stream=on_stream,
-        system_prompt=custom_system_prompt,
-        temperature=0.1  # Lower temperature for more consistent outputs
-    )
+    if processing_task is None:
+        # Get the OpenRouter API key from environment variables
+        import os
+        OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+        if not OPENROUTER_API_KEY:
+            print(f"\033[91m[ERROR] OPENROUTER_API_KEY not found in environment variables\033[0m")
+            raise ValueError("OPENROUTER_API_KEY environment variable is required")
+
+        print(f"\033[94m[INFO] Using OpenRouter API key: {OPENROUTER_API_KEY[:5]}...\033[0m")
+
+        # Note: The OpenRouterNativeAgent uses OPENROUTER_TIMEOUT internally, so we don't pass timeout here
+        agent = OpenRouterNativeAgent(
+            api_key=OPENROUTER_API_KEY,  # Required parameter
+            model=analysis_model,  # Using Claude 3.7 Sonnet for improved compliance analysis
+            on_stream=on_stream,
+            system_prompt=custom_system_prompt,
+            temperature=0.1  # Lower temperature for more consistent outputs
+        )
 
-    # Start the agent process in a background task
-    print(f"[LOG] process_image_and_stream: Creating processing_task for OpenRouterAgent (line {inspect.currentframe().f_lineno})")
-    try:
-        # Ensure image_base64 doesn't include the prefix if it's already there
-        if image_base64.startswith("data:image/"):
-            # Extract only the base64 portion if it includes the data URL prefix
-            image_base64 = image_base64.split(",")[1]
+        # Start the agent process in a background task
+        print(f"[LOG] process_image_and_stream: Creating processing_task for OpenRouterAgent (line {inspect.currentframe().f_lineno})")
+        try:
+            # Ensure image_base64 doesn't include the prefix if it's already there
+            if image_base64.startswith("data:image/"):
+                # Extract only the base64 portion if it includes the data URL prefix
+                image_base64 = image_base64.split(",")[1]
 
-        print(f"[DEBUG] Image base64 length: {len(image_base64)} characters")
+            print(f"[DEBUG] Image base64 length: {len(image_base64)} characters")
 
-        processing_task = asyncio.create_task(
-            agent.process(
-                user_prompt=text,
-                image_base64=image_base64,
-                # No need to pass media_type - native agent handles image format internally
+            processing_task = asyncio.create_task(
+                agent.process(
+                    user_prompt=text,
+                    image_base64=image_base64,
+                    # No need to pass media_type - native agent handles image format internally
+                )
             )
-        )
-    except Exception as e:
-        print(f"[ERROR] process_image_and_stream: Exception when creating processing_task: {e} (line {inspect.currentframe().f_lineno})")
-        import traceback
-        traceback.print_exc()
-        raise
+        except Exception as e:
+            print(f"[ERROR] process_image_and_stream: Exception when creating processing_task: {e} (line {inspect.currentframe().f_lineno})")
+            import traceback
+            traceback.print_exc()
+            raise
 
     # Stream the results
     try:
@@ -339,8 +386,22 @@ async def process_image_and_stream(
                                 print(f"[ERROR] process_image_and_stream: Error accessing agent's message handler: {str(e)}")
 
                             # Extract brand name and compliance score from the final report
+                            # (a replayed analysis already has them)
                             print(f"[LOG] process_image_and_stream: Extracting brand name and compliance score from final report (line {inspect.currentframe().f_lineno})")
-                            extracted_brand_name, extracted_compliance_score = await extract_brand_and_score(final_answer)
+                            if cached_analysis:
+                                extracted_brand_name = cached_analysis.get("brand_name", "Unknown")
+                                extracted_compliance_score = cached_analysis.get("compliance_score", 0)
+                            else:
+                                extracted_brand_name, extracted_compliance_score = await extract_brand_and_score(final_answer)
+                                # Cache the report before analysis_id is added, so replays get their own record;
+                                # failed, partial or forced-completion runs are not cached
+                                if analysis_cache and analysis_cache_key and data.get("cacheable"):
+                                    analysis_cache.store_in_background(
+                                        analysis_cache_key,
+                                        json.loads(json.dumps(final_answer, default=str)),
+                                        recorded_events if get_analysis_cache_config()["replay_events"] else None,
+                                        {"brand_name": extracted_brand_name, "compliance_score": extracted_compliance_score}
+                                    )
                             print(f"[LOG] process_image_and_stream: Extracted brand name: {extracted_brand_name}, compliance score: {extracted_compliance_score} (line {inspect.currentframe().f_lineno})")
 
                             # Use extracted values or fallback to provided/default values
@@ -357,7 +418,8 @@ async def process_image_and_stream(
                                 "compliance_score": final_compliance_score,
                                 "media_type": media_type,
                                 "agent_messages": agent_messages,  # Store the agent's streamed messages
-                                "complete_conversation": complete_conversation  # Store the complete conversation history
+                                "complete_conversation": complete_conversation,  # Store the complete conversation history
+                                "cached": bool(cached_analysis)  # Replayed from the analysis cache
                             }
 
                             # Store in database
@@ -619,52 +681,83 @@ async def process_video_frames_and_stream(
     else:
         print(f"🧠 [USER MEMORIES] No feedback found for user {user_id}")
 
-    # Download video and extract frames
-    print(f"[LOG] process_video_frames_and_stream: Downloading video from {video_url} (line {inspect.currentframe().f_lineno})")
-
     # Import video processing functions
-    from app.core.video_agent.gemini_llm import extract_frames
+    from app.core.video_agent.frame_sampler import FrameSampler, stream_frames
+    from app.core.video_agent.frame_dedup import FrameDeduplicator
     from app.core.video_agent.video_agent_class import download_video
+    from app.api.video_upload import load_frame_manifest, fetch_manifest_frames
 
-    # Download the video
-    try:
-        # First yield a status event to inform the client that download is in progress
-        yield "data: status:Downloading video file...\n\n"
-
-        # Download the video to a temporary file
-        video_path_tuple = await download_video(video_url)
-        video_path = video_path_tuple[0]  # Get the path to the downloaded video
+    # Choose a reasonable subset of frames if there are too many (e.g., max 10 frames)
+    max_frames = 10
 
-        # Yield status update
-        yield "data: status:Extracting video frames for analysis...\n\n"
+    # Videos uploaded here usually have their frames extracted already; only the frames sent
+    # to the agent are fetched
+    frames = None
+    try:
+        manifest = await load_frame_manifest(video_url)
+        if manifest and manifest["frames"]:
+            yield "data: status:Loading pre-extracted video frames...\n\n"
+            selected = manifest["frames"]
+            if len(selected) > max_frames:
+                # Take frames at even intervals to cover the whole video
+                step = len(selected) // max_frames
+                selected = selected[::step][:max_frames]
+            frames = await fetch_manifest_frames(selected)
+            frame_base64_list = [frame['base64'] for frame in frames]
+            print(f"[LOG] process_video_frames_and_stream: Loaded {len(frames)} of {len(manifest['frames'])} pre-extracted frames (line {inspect.currentframe().f_lineno})")
+    except Exception as e:
+        print(f"\033[93m[WARNING] Could not load pre-extracted frames, extracting them from the video: {str(e)}\033[0m")
+        frames = None
 
-        # Extract frames from the video (with a reasonable interval to avoid too many frames)
-        frames = await extract_frames(video_path, initial_interval=1.0)  # Extract a frame every 3 seconds
+    if frames is None:
+        # Download video and extract frames
+        print(f"[LOG] process_video_frames_and_stream: Downloading video from {video_url} (line {inspect.currentframe().f_lineno})")
+        video_path_tuple = None
+        try:
+            # First yield a status event to inform the client that download is in progress
+            yield "data: status:Downloading video file...\n\n"
+
+            # Download the video to a temporary file
+            video_path_tuple = await download_video(video_url)
+            video_path = video_path_tuple[0]  # Get the path to the downloaded video
+
+            # Yield status update
+            yield "data: status:Extracting video frames for analysis...\n\n"
+
+            # Extract a frame every second. Decoding, deduplication and encoding run in a worker
+            # thread, so the event loop stays free and each frame is reported as it arrives
+            sampler = FrameSampler(video_path, interval=1.0)
+            dedup = FrameDeduplicator()
+            frames = []
+            async for frame in stream_frames(sampler, dedup=dedup, quality=70):
+                frames.append(frame)
+                yield (
+                    f"data: status:Extracted frame {len(frames)} at {frame['timestamp']:.1f}s "
+                    f"({sampler.stats['frames_decoded']} of ~{sampler.stats['expected_samples']} sampled)...\n\n"
+                )
 
-        print(f"[LOG] process_video_frames_and_stream: Extracted {len(frames)} frames from video (line {inspect.currentframe().f_lineno})")
+            print(f"[LOG] process_video_frames_and_stream: Extracted {len(frames)} distinct frames from video ({dedup.get_stats()['frames_duplicate']} duplicates dropped): {sampler.summary()} (line {inspect.currentframe().f_lineno})")
 
-        # Convert frames to base64 format for the OpenRouterNativeAgent
-        frame_base64_list = []
-        for frame in frames:
-            if 'base64' in frame:  # Fix: use 'base64' key which is what extract_frames produces
-                # The image data is already in base64 format from the extract_frames function
-                frame_base64_list.append(frame['base64'])
+            if len(frames) > max_frames:
+                # Take frames at even intervals to cover the whole video
+                step = len(frames) // max_frames
+                frames = frames[::step][:max_frames]
+                print(f"[LOG] process_video_frames_and_stream: Reduced to {len(frames)} representative frames (line {inspect.currentframe().f_lineno})")
 
-        print(f"[LOG] process_video_frames_and_stream: Prepared {len(frame_base64_list)} frame images for analysis (line {inspect.currentframe().f_lineno})")
+            # Convert frames to base64 format for the OpenRouterNativeAgent
+            frame_base64_list = [frame['base64'] for frame in frames]
 
-        # Choose a reasonable subset of frames if there are too many (e.g., max 10 frames)
-        max_frames = 10
-        if len(frame_base64_list) > max_frames:
-            # Take frames at even intervals to cover the whole video
-            step = len(frame_base64_list) // max_frames
-            frame_base64_list = frame_base64_list[::step][:max_frames]
-            print(f"[LOG] process_video_frames_and_stream: Reduced to {len(frame_base64_list)} representative frames (line {inspect.currentframe().f_lineno})")
+            print(f"[LOG] process_video_frames_and_stream: Prepared {len(frame_base64_list)} frame images for analysis (line {inspect.currentframe().f_lineno})")
 
-    except Exception as e:
-        error_msg = f"Error downloading or processing video: {str(e)}"
-        print(f"\033[91m[ERROR] {error_msg}\033[0m")
-        yield f"data: error:{error_msg}\n\n"
-        return
+        except Exception as e:
+            error_msg = f"Error downloading or processing video: {str(e)}"
+            print(f"\033[91m[ERROR] {error_msg}\033[0m")
+            yield f"data: error:{error_msg}\n\n"
+            return
+        finally:
+            # The downloader keeps its own cached copy; this request's link to it is no longer needed
+            if video_path_tuple:
+                shutil.rmtree(video_path_tuple[1], ignore_errors=True)
 
     # Get the OpenRouter API key from environment variables
     import os
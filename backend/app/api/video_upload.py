@@ -1,11 +1,17 @@
 import os
+import json
+import base64
+import shutil
+import functools
+import tempfile
+import urllib.parse
 import boto3
 from botocore.exceptions import NoCredentialsError, ClientError
 from fastapi import APIRouter, UploadFile, File, HTTPException, status
 from dotenv import load_dotenv
 import logging
 import uuid
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import threading
@@ -124,6 +130,32 @@ R2_PUBLIC_URL_BASE = os.getenv(
     "R2_PUBLIC_URL_BASE"
 )  # Optional: Base URL for public access if bucket is public
 
+# Extract, deduplicate and store frames in the background after each upload, so a video
+# check can load them instead of downloading and decoding the video
+PREEXTRACT_FRAMES = os.getenv("VIDEO_PREEXTRACT_FRAMES", "True").lower() == "true"
+
+# Seconds between pre-extracted frames (matches what check-video samples)
+PREEXTRACT_INTERVAL = float(os.getenv("VIDEO_PREEXTRACT_INTERVAL", 1.0))
+
+# Seconds a video check waits for this worker's in-flight extraction of the same video
+MANIFEST_WAIT_TIMEOUT = float(os.getenv("VIDEO_MANIFEST_WAIT_TIMEOUT", 60))
+
+# Frame uploads to R2 running at once across all pre-extractions in this worker; extraction
+# pauses while a video has this many frames waiting to be stored
+FRAME_UPLOAD_WORKERS = int(os.getenv("VIDEO_FRAME_UPLOAD_WORKERS", 4))
+
+# Seconds shutdown waits for running pre-extractions before cancelling them
+MANIFEST_SHUTDOWN_TIMEOUT = float(os.getenv("VIDEO_MANIFEST_SHUTDOWN_TIMEOUT", 20))
+
+# Frame manifest layout version
+MANIFEST_VERSION = 1
+
+# Pre-extraction tasks running in this worker, by video object key
+_manifest_tasks: Dict[str, asyncio.Task] = {}
+
+# Threads storing pre-extracted frames, kept apart from the default executor
+_frame_upload_executor = ThreadPoolExecutor(max_workers=FRAME_UPLOAD_WORKERS, thread_name_prefix="frame-upload")
+
 # Check if all required environment variables are set
 required_env_vars = [
     CLOUDFLARE_ACCOUNT_ID,
@@ -187,6 +219,215 @@ else:
         s3_client = None
 
 
+def manifest_key(video_key: str) -> str:
+    """Object key of a video's frame manifest, stored next to the video."""
+    return f"{os.path.splitext(video_key)[0]}.frames.json"
+
+
+def frame_key(video_key: str, frame_number: int) -> str:
+    """Object key of one pre-extracted frame of a video."""
+    return f"{os.path.splitext(video_key)[0]}/frames/{frame_number:06d}.jpg"
+
+
+def video_key_from_url(video_url: str) -> Optional[str]:
+    """Object key of a video uploaded here, or None if the URL is not in our R2 bucket."""
+    if not R2_PUBLIC_URL_BASE:
+        return None
+    base_url = R2_PUBLIC_URL_BASE.rstrip("/") + "/"
+    if not video_url.startswith(base_url):
+        return None
+    return urllib.parse.unquote(video_url[len(base_url):].split("?")[0]) or None
+
+
+def _copy_upload(file, suffix: str) -> str:
+    """Copy an uploaded file to a temporary path, for processing after the request closes it."""
+    file.seek(0)
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(handle, "wb") as f:
+        shutil.copyfileobj(file, f, 1024 * 1024)
+    return path
+
+
+async def extract_frame_manifest(video_path: str, video_key: str) -> Dict[str, Any]:
+    """Extract, deduplicate and store the frames of an uploaded video, then its manifest.
+
+    Frames are stored as JPEG objects next to the video while extraction
+    continues, at most FRAME_UPLOAD_WORKERS at a time. The manifest
+    (timestamps, perceptual hashes, object keys and the frame-cluster map) is
+    written last, so its presence means the frame set is complete. If
+    extraction fails or is cancelled, the frames stored so far are deleted.
+
+    Args:
+        video_path: Local copy of the uploaded video
+        video_key: Object key of the video in R2
+
+    Returns:
+        The manifest
+    """
+    from app.core.video_agent.frame_sampler import FrameSampler, stream_frames
+    from app.core.video_agent.frame_dedup import FrameDeduplicator
+
+    start = time.time()
+    loop = asyncio.get_running_loop()
+    sampler = FrameSampler(video_path, interval=PREEXTRACT_INTERVAL)
+    dedup = FrameDeduplicator()
+    upload_slots = asyncio.Semaphore(FRAME_UPLOAD_WORKERS)
+    frames = []
+    uploads = []
+    try:
+        async for frame in stream_frames(sampler, dedup=dedup, quality=70):
+            key = frame_key(video_key, frame["frame_number"])
+            await upload_slots.acquire()
+            upload = loop.run_in_executor(_frame_upload_executor, functools.partial(
+                s3_client.put_object,
+                Bucket=R2_BUCKET_NAME,
+                Key=key,
+                Body=base64.b64decode(frame["base64"]),
+                ContentType="image/jpeg",
+            ))
+            upload.add_done_callback(lambda _: upload_slots.release())
+            uploads.append(upload)
+            frames.append({
+                "timestamp": frame["timestamp"],
+                "frame_number": frame["frame_number"],
+                "hash": frame["hash"],
+                "cluster": frame["cluster"],
+                "key": key,
+            })
+        await asyncio.gather(*uploads)
+    except BaseException:
+        # Let running uploads finish so none lands after the cleanup, then remove the partial frame set
+        if uploads:
+            await asyncio.wait(uploads)
+        await _delete_frames([frame["key"] for frame in frames])
+        raise
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "video_key": video_key,
+        "interval": PREEXTRACT_INTERVAL,
+        "created_at": int(time.time()),
+        "frames": frames,
+        "clusters": dedup.cluster_map(),
+        "stats": {**sampler.stats, **dedup.get_stats()},
+    }
+    await asyncio.to_thread(
+        s3_client.put_object,
+        Bucket=R2_BUCKET_NAME,
+        Key=manifest_key(video_key),
+        Body=json.dumps(manifest).encode("utf-8"),
+        ContentType="application/json",
+    )
+    logger.info(
+        f"Stored frame manifest for '{video_key}': {len(frames)} frames in {time.time() - start:.1f}s ({sampler.summary()})"
+    )
+    return manifest
+
+
+async def _delete_frames(keys: List[str]) -> None:
+    """Delete stored frames of an incomplete pre-extraction, logging instead of raising."""
+    loop = asyncio.get_running_loop()
+    for start in range(0, len(keys), 1000):
+        batch = [{"Key": key} for key in keys[start:start + 1000]]
+        try:
+            await loop.run_in_executor(_frame_upload_executor, functools.partial(
+                s3_client.delete_objects, Bucket=R2_BUCKET_NAME, Delete={"Objects": batch, "Quiet": True}
+            ))
+        except Exception as e:
+            logger.error(f"Could not delete {len(batch)} frames of an incomplete pre-extraction: {e}")
+
+
+async def _run_frame_manifest(video_path: str, video_key: str) -> Optional[Dict[str, Any]]:
+    try:
+        return await extract_frame_manifest(video_path, video_key)
+    except Exception as e:
+        logger.error(f"Frame pre-extraction failed for '{video_key}': {e}")
+        return None
+    finally:
+        _manifest_tasks.pop(video_key, None)
+        try:
+            os.remove(video_path)
+        except OSError:
+            pass
+
+
+def schedule_frame_manifest(video_path: str, video_key: str) -> None:
+    """Start pre-extracting the frames of an uploaded video in the background; the task removes video_path."""
+    _manifest_tasks[video_key] = asyncio.create_task(_run_frame_manifest(video_path, video_key))
+
+
+async def shutdown_frame_manifests(timeout: float = MANIFEST_SHUTDOWN_TIMEOUT) -> None:
+    """Give running pre-extractions time to finish, cancel the rest, and stop the upload threads.
+
+    Cancelled extractions delete their partial frame sets and temporary video
+    copies, so a check-video after restart extracts those videos itself.
+    """
+    tasks = list(_manifest_tasks.values())
+    if tasks:
+        logger.info(f"Waiting up to {timeout:.0f}s for {len(tasks)} frame pre-extractions")
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Cancelled {len(pending)} unfinished frame pre-extractions")
+            await asyncio.gather(*pending, return_exceptions=True)
+    await asyncio.to_thread(_frame_upload_executor.shutdown)
+
+
+async def load_frame_manifest(video_url: str) -> Optional[Dict[str, Any]]:
+    """Frame manifest of an uploaded video, if one exists or is being built in this worker.
+
+    Returns:
+        The manifest, or None if the video was not pre-extracted (the caller then
+        extracts frames itself)
+    """
+    if not s3_client:
+        return None
+    video_key = video_key_from_url(video_url)
+    if not video_key:
+        return None
+
+    task = _manifest_tasks.get(video_key)
+    if task is not None:
+        try:
+            # Shielded so a check that gives up waiting does not cancel the extraction
+            return await asyncio.wait_for(asyncio.shield(task), MANIFEST_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.info(f"Frame pre-extraction for '{video_key}' still running, extracting frames directly")
+            return None
+
+    try:
+        response = await asyncio.to_thread(s3_client.get_object, Bucket=R2_BUCKET_NAME, Key=manifest_key(video_key))
+        manifest = json.loads(await asyncio.to_thread(response["Body"].read))
+    except ClientError:
+        return None
+    except ValueError as e:
+        logger.error(f"Invalid frame manifest for '{video_key}': {e}")
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+async def fetch_manifest_frames(frames: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Load the images of manifest frames from R2 in parallel.
+
+    Returns:
+        Frame dictionaries in the shape extract_frames produces, in order
+    """
+    async def fetch(frame: Dict[str, Any]) -> Dict[str, Any]:
+        response = await asyncio.to_thread(s3_client.get_object, Bucket=R2_BUCKET_NAME, Key=frame["key"])
+        base64_data = base64.b64encode(await asyncio.to_thread(response["Body"].read)).decode("utf-8")
+        return {
+            "timestamp": frame["timestamp"],
+            "frame_number": frame["frame_number"],
+            "base64": base64_data,
+            "image_data": base64_data,
+            "hash": frame.get("hash"),
+            "cluster": frame.get("cluster"),
+        }
+
+    return list(await asyncio.gather(*(fetch(frame) for frame in frames)))
+
+
 @router.post(
     "/upload-video/", status_code=status.HTTP_201_CREATED, tags=["Video Upload"]
 )
@@ -194,7 +435,9 @@ async def upload_video_to_r2(file: UploadFile = File(...)):
     """
     Receives a video file and uploads it to Cloudflare R2.
 
-    Returns the URL of the uploaded file if successful.
+    Returns the URL of the uploaded file if successful. Unless
+    VIDEO_PREEXTRACT_FRAMES is off, the video's frames are then extracted
+    in the background and stored with a frame manifest for check-video.
     """
     if not s3_client:
         logger.error(
@@ -231,6 +474,8 @@ async def upload_video_to_r2(file: UploadFile = File(...)):
         f"Attempting to upload '{file.filename}' as '{unique_filename}' to R2 bucket '{R2_BUCKET_NAME}'."
     )
 
+    # Local copy of the upload for frame pre-extraction
+    video_path = None
     try:
         # Get file size if available
         file_size = 0
@@ -248,6 +493,15 @@ async def upload_video_to_r2(file: UploadFile = File(...)):
         # Log the file size
         logger.info(f"Uploading file of size: {file_size} bytes")
 
+        # Spool the upload to disk before sending it: upload_fileobj closes the file it is given,
+        # so the frames are extracted from this copy and small files are uploaded from it too
+        if PREEXTRACT_FRAMES and R2_PUBLIC_URL_BASE:
+            try:
+                video_path = await asyncio.to_thread(_copy_upload, file.file, file_extension)
+            except Exception as e:
+                logger.error(f"Could not copy '{unique_filename}' for frame pre-extraction: {e}")
+            file.file.seek(0)
+
         # For large files (>100MB), use multipart upload
         large_file_threshold = 100 * 1024 * 1024  # 100MB
 
@@ -262,19 +516,34 @@ async def upload_video_to_r2(file: UploadFile = File(...)):
         else:
             # For smaller files, use the simple upload method
             logger.info(f"Small file detected. Using simple upload.")
-            s3_client.upload_fileobj(
-                file.file,  # The file-like object from UploadFile
-                R2_BUCKET_NAME,
-                unique_filename,
-                ExtraArgs={
-                    "ContentType": file.content_type  # Set content type for proper serving
-                },
-            )
+            if video_path:
+                s3_client.upload_file(
+                    video_path,
+                    R2_BUCKET_NAME,
+                    unique_filename,
+                    ExtraArgs={"ContentType": file.content_type},
+                )
+            else:
+                s3_client.upload_fileobj(
+                    file.file,  # The file-like object from UploadFile
+                    R2_BUCKET_NAME,
+                    unique_filename,
+                    ExtraArgs={
+                        "ContentType": file.content_type  # Set content type for proper serving
+                    },
+                )
 
         logger.info(
             f"Successfully uploaded '{unique_filename}' to R2 bucket '{R2_BUCKET_NAME}'."
         )
 
+        # Check-video finds the manifest through the public URL, so only pre-extract when there is one;
+        # the task owns video_path from here on and removes it
+        if video_path:
+            schedule_frame_manifest(video_path, unique_filename)
+            video_path = None
+            logger.info(f"Started frame pre-extraction for '{unique_filename}'.")
+
         # Construct the public URL if the base URL is provided and the bucket is public
         file_url = None
         if R2_PUBLIC_URL_BASE:
@@ -305,6 +574,12 @@ async def upload_video_to_r2(file: UploadFile = File(...)):
             detail=f"An unexpected error occurred during upload: {e}",
         )
     finally:
+        # Remove the spooled copy if the upload failed before pre-extraction took it over
+        if video_path:
+            try:
+                os.remove(video_path)
+            except OSError:
+                pass
         # Ensure the file pointer is closed
         await file.close()
         logger.debug(f"Closed file stream for '{file.filename}'.")
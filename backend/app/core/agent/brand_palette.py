@@ -0,0 +1,252 @@
+import os
+import re
+import time
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from app.core.agent.palette import rgb_to_lab, rgb_to_hex, sample_pixels, bin_colors, MAX_SAMPLE_PIXELS
+
+# Colors within this CIEDE2000 distance of a brand color count as on-brand
+DEFAULT_TOLERANCE = float(os.getenv("BRAND_COLOR_TOLERANCE", 10))
+
+# Number of off-brand colors listed in a match result
+MAX_OFF_BRAND_COLORS = 5
+
+# Seconds a loaded palette (or the absence of one) is reused before it is reloaded, so
+# guidelines re-uploaded through another worker are picked up
+BRAND_PALETTE_TTL = float(os.getenv("BRAND_PALETTE_TTL", 300))
+
+# The line of a guideline page summary that lists the brand colors
+_COLORS_LINE = re.compile(r"^[\s*•-]*colou?rs\s*:(?P<colors>.*)$", re.IGNORECASE | re.MULTILINE)
+
+# "Name #RRGGBB" entries in the colors line; the name is optional
+_COLOR_ENTRY = re.compile(r"(?P<name>[A-Za-z][\w '&/-]{0,40}?)?\s*[:=(]?\s*#(?P<hex>[0-9a-fA-F]{6}|[0-9a-fA-F]{3})\b")
+
+
+def parse_hex(value: str) -> Tuple[int, int, int]:
+    """Parse #RRGGBB or #RGB into an RGB tuple."""
+    value = value.strip().lstrip("#")
+    if len(value) == 3:
+        value = "".join(c * 2 for c in value)
+    if len(value) != 6:
+        raise ValueError(f"Invalid hex color: #{value}")
+    return int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
+
+
+def parse_brand_colors(text: str) -> List[Dict[str, Any]]:
+    """Extract brand colors (hex codes with optional names) from the "Colors:" line of guideline text.
+
+    Hex codes elsewhere in the text (examples, off-brand colors shown on the
+    page) are ignored.
+
+    Args:
+        text: Text such as a guideline page summary
+
+    Returns:
+        List of unique colors, each with hex and name (None when not given)
+    """
+    colors = {}
+    entries = "\n".join(line.group("colors") for line in _COLORS_LINE.finditer(text or ""))
+    for match in _COLOR_ENTRY.finditer(entries):
+        hex_value = rgb_to_hex(parse_hex(match.group("hex")))
+        name = (match.group("name") or "").strip(" :-,") or None
+        if hex_value not in colors or (name and not colors[hex_value]["name"]):
+            colors[hex_value] = {"hex": hex_value, "name": name}
+    return list(colors.values())
+
+
+def delta_e_2000(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """Pairwise CIEDE2000 color differences.
+
+    Args:
+        lab1: Lab colors of shape (N, 3)
+        lab2: Lab colors of shape (M, 3)
+
+    Returns:
+        Distance matrix of shape (N, M)
+    """
+    L1, a1, b1 = (lab1[:, None, i] for i in range(3))
+    L2, a2, b2 = (lab2[None, :, i] for i in range(3))
+
+    C_bar = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    G = 0.5 * (1 - np.sqrt(C_bar ** 7 / (C_bar ** 7 + 25.0 ** 7)))
+    a1p, a2p = (1 + G) * a1, (1 + G) * a2
+    C1p, C2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+    chroma_zero = (C1p * C2p) == 0
+
+    dLp = L2 - L1
+    dCp = C2p - C1p
+    dhp = h2p - h1p
+    dhp = np.where(dhp > 180, dhp - 360, dhp)
+    dhp = np.where(dhp < -180, dhp + 360, dhp)
+    dhp = np.where(chroma_zero, 0, dhp)
+    dHp = 2 * np.sqrt(C1p * C2p) * np.sin(np.radians(dhp / 2))
+
+    L_bar = (L1 + L2) / 2
+    C_bar_p = (C1p + C2p) / 2
+    h_sum = h1p + h2p
+    h_bar = np.where(
+        chroma_zero, h_sum,
+        np.where(np.abs(h1p - h2p) <= 180, h_sum / 2,
+                 np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2))
+    )
+
+    T = (1 - 0.17 * np.cos(np.radians(h_bar - 30)) + 0.24 * np.cos(np.radians(2 * h_bar))
+         + 0.32 * np.cos(np.radians(3 * h_bar + 6)) - 0.20 * np.cos(np.radians(4 * h_bar - 63)))
+    d_theta = 30 * np.exp(-(((h_bar - 275) / 25) ** 2))
+    R_C = 2 * np.sqrt(C_bar_p ** 7 / (C_bar_p ** 7 + 25.0 ** 7))
+    S_L = 1 + 0.015 * (L_bar - 50) ** 2 / np.sqrt(20 + (L_bar - 50) ** 2)
+    S_C = 1 + 0.045 * C_bar_p
+    S_H = 1 + 0.015 * C_bar_p * T
+    R_T = -np.sin(np.radians(2 * d_theta)) * R_C
+
+    return np.sqrt(
+        (dLp / S_L) ** 2 + (dCp / S_C) ** 2 + (dHp / S_H) ** 2
+        + R_T * (dCp / S_C) * (dHp / S_H)
+    )
+
+
+class BrandPaletteIndex:
+    """Brand colors of one brand, precomputed in CIELAB for nearest-color matching."""
+
+    def __init__(self, brand_name: str, colors: List[Dict[str, Any]]):
+        unique = {}
+        for color in colors:
+            try:
+                hex_value = rgb_to_hex(parse_hex(color["hex"]))
+            except (KeyError, ValueError):
+                continue
+            if hex_value not in unique or (color.get("name") and not unique[hex_value].get("name")):
+                unique[hex_value] = {"hex": hex_value, "name": color.get("name")}
+
+        self.brand_name = brand_name
+        self.colors = list(unique.values())
+        self.rgb = np.array([parse_hex(c["hex"]) for c in self.colors], dtype=np.float64).reshape(-1, 3)
+        self.lab = rgb_to_lab(self.rgb)
+
+    def __len__(self) -> int:
+        return len(self.colors)
+
+    def nearest(self, rgb: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Find the nearest brand color for each RGB color.
+
+        Returns:
+            Tuple of (brand color indices, CIEDE2000 distances)
+        """
+        distances = delta_e_2000(rgb_to_lab(np.asarray(rgb, dtype=np.float64).reshape(-1, 3)), self.lab)
+        indices = distances.argmin(axis=1)
+        return indices, distances[np.arange(len(indices)), indices]
+
+    def match_colors(self, hex_colors: List[str], tolerance: float = DEFAULT_TOLERANCE) -> List[Dict[str, Any]]:
+        """Match given hex colors (e.g. from a palette tool) to the brand palette."""
+        parsed = [(value, parse_hex(value)) for value in hex_colors]
+        indices, distances = self.nearest(np.array([rgb for _, rgb in parsed]))
+        return [
+            {
+                "hex": rgb_to_hex(rgb),
+                "nearest_brand_color": self.colors[int(i)],
+                "delta_e": round(float(d), 2),
+                "on_brand": bool(d <= tolerance),
+            }
+            for (_, rgb), i, d in zip(parsed, indices, distances)
+        ]
+
+    def match_pixels(
+        self,
+        pixels: np.ndarray,
+        tolerance: float = DEFAULT_TOLERANCE,
+        max_pixels: int = MAX_SAMPLE_PIXELS
+    ) -> Dict[str, Any]:
+        """Map the pixels of an image or region to the brand palette.
+
+        Pixels are sampled and binned first, so distances are computed once per
+        distinct color rather than once per pixel.
+
+        Returns:
+            Dictionary with coverage per brand color, on/off-brand coverage and
+            the most common off-brand colors
+        """
+        colors, weights = bin_colors(sample_pixels(pixels, max_pixels))
+        if len(colors) == 0:
+            return {"brand_colors": [], "on_brand_coverage": 0.0, "off_brand_coverage": 0.0, "off_brand_colors": []}
+
+        indices, distances = self.nearest(colors)
+        total = weights.sum()
+        on_brand = distances <= tolerance
+        coverage = np.bincount(indices[on_brand], weights=weights[on_brand], minlength=len(self.colors))
+
+        off_brand = np.flatnonzero(~on_brand)
+        off_brand = off_brand[np.argsort(-weights[off_brand])][:MAX_OFF_BRAND_COLORS]
+        return {
+            "brand_colors": [
+                {**color, "coverage": round(float(coverage[i] / total * 100), 2)}
+                for i, color in enumerate(self.colors)
+            ],
+            "on_brand_coverage": round(float(weights[on_brand].sum() / total * 100), 2),
+            "off_brand_coverage": round(float(weights[~on_brand].sum() / total * 100), 2),
+            "off_brand_colors": [
+                {
+                    "hex": rgb_to_hex(np.round(colors[i])),
+                    "coverage": round(float(weights[i] / total * 100), 2),
+                    "nearest_brand_color": self.colors[int(indices[i])],
+                    "delta_e": round(float(distances[i]), 2),
+                }
+                for i in off_brand
+            ],
+        }
+
+
+class BrandPaletteRegistry:
+    """Per-brand palette indexes, built when guidelines are ingested.
+
+    Indexes are cached in process for ttl seconds; a brand that is not cached
+    (or whose entry expired) is loaded from the colors stored on its
+    guidelines. Brands without colors are cached as misses for the same time,
+    so they do not query the database on every call.
+    """
+
+    def __init__(self, ttl: float = BRAND_PALETTE_TTL):
+        self.ttl = ttl
+        # Brand key -> (index, or None for a brand without colors, time it was loaded)
+        self.indexes: Dict[str, Tuple[Optional[BrandPaletteIndex], float]] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(brand_name: str) -> str:
+        return brand_name.strip().lower()
+
+    def build(self, brand_name: str, colors: List[Dict[str, Any]]) -> Optional[BrandPaletteIndex]:
+        """Build and cache the index for a brand; returns None if there are no valid colors."""
+        index = BrandPaletteIndex(brand_name, colors)
+        with self.lock:
+            if not len(index):
+                self.indexes[self._key(brand_name)] = (None, time.time())
+                return None
+            self.indexes[self._key(brand_name)] = (index, time.time())
+        print(f"\033[94m[BRAND PALETTE] Indexed {len(index)} colors for {brand_name}\033[0m")
+        return index
+
+    def reload(self, brand_name: str) -> Optional[BrandPaletteIndex]:
+        """Rebuild a brand's index from the colors stored on its guidelines (blocking)."""
+        from app.db.firestore import get_brand_colors
+        return self.build(brand_name, get_brand_colors(brand_name))
+
+    def get(self, brand_name: str) -> Optional[BrandPaletteIndex]:
+        """Get a brand's index, loading it on first use or once the cached entry expires (blocking)."""
+        with self.lock:
+            entry = self.indexes.get(self._key(brand_name))
+        if entry is not None and time.time() - entry[1] < self.ttl:
+            return entry[0]
+        try:
+            return self.reload(brand_name)
+        except Exception as e:
+            print(f"\033[91m[ERROR] Failed to load brand colors for {brand_name}: {e}\033[0m")
+            return None
+
+
+# Shared registry for this process
+brand_palettes = BrandPaletteRegistry()
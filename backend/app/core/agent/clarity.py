@@ -0,0 +1,178 @@
+import os
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+# Regions accepted in one call
+MAX_CLARITY_REGIONS = int(os.getenv("CLARITY_MAX_REGIONS", 50))
+
+# Largest area covered by one shared set of maps (four float64 integral images);
+# regions spread over a larger area get maps of their own
+MAX_SHARED_MAP_PIXELS = int(os.getenv("CLARITY_MAX_SHARED_MAP_PIXELS", 4_000_000))
+
+# Gradient RMS that maps to a full high-frequency score
+GRADIENT_RMS_NORM = 25.0
+
+# Mean edge response that maps to a full edge score
+EDGE_MEAN_NORM = 50.0
+
+# Same weights as PIL's convert("L")
+_GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _integral(values: np.ndarray) -> np.ndarray:
+    """Summed-area table with a zero first row and column, in float64."""
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(values, axis=0, dtype=np.float64), axis=1, out=table[1:, 1:])
+    return table
+
+
+def _region_sum(table: np.ndarray, x1: int, y1: int, x2: int, y2: int) -> float:
+    return float(table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1])
+
+
+class ClarityMap:
+    """Sharpness maps of an image, built once and queried per region.
+
+    The grayscale image, its 2-D Laplacian, an 8-neighbour edge response and
+    the gradient energy are computed once over the area covered by the
+    requested regions. Their integral images then give each region's
+    statistics in constant time, however many regions are scored.
+    """
+
+    def __init__(self, pixels: np.ndarray, bounds: Tuple[int, int, int, int]):
+        """Build the maps for the bounds (x1, y1, x2, y2) that cover all regions."""
+        height, width = pixels.shape[:2]
+        x1, y1, x2, y2 = bounds
+        # One pixel of context so the kernels see real neighbours at region edges
+        self.x0, self.y0 = max(0, x1 - 1), max(0, y1 - 1)
+        ex, ey = min(width, x2 + 1), min(height, y2 + 1)
+        gray = pixels[self.y0:ey, self.x0:ex, :3].astype(np.float32) @ _GRAY_WEIGHTS
+
+        padded = np.pad(gray, 1, mode="edge")
+        center = padded[1:-1, 1:-1]
+        up, down = padded[:-2, 1:-1], padded[2:, 1:-1]
+        left, right = padded[1:-1, :-2], padded[1:-1, 2:]
+        diagonals = padded[:-2, :-2] + padded[:-2, 2:] + padded[2:, :-2] + padded[2:, 2:]
+
+        laplacian = up + down + left + right - 4 * center
+        # Equivalent to PIL's ImageFilter.FIND_EDGES, clipped like the 8-bit image it produces
+        edges = np.clip(8 * center - (up + down + left + right + diagonals), 0, 255)
+        gradient_energy = ((right - left) / 2) ** 2 + ((down - up) / 2) ** 2
+
+        self.laplacian_sum = _integral(laplacian)
+        self.laplacian_sq_sum = _integral(laplacian ** 2)
+        self.edge_sum = _integral(edges)
+        self.gradient_sum = _integral(gradient_energy)
+
+    def region_stats(self, x1: int, y1: int, x2: int, y2: int) -> Dict[str, float]:
+        """Laplacian variance, mean edge response and gradient RMS of a region in image coordinates."""
+        box = (x1 - self.x0, y1 - self.y0, x2 - self.x0, y2 - self.y0)
+        n = max(1, (x2 - x1) * (y2 - y1))
+        mean = _region_sum(self.laplacian_sum, *box) / n
+        return {
+            "laplacian_variance": max(0.0, _region_sum(self.laplacian_sq_sum, *box) / n - mean ** 2),
+            "edge_mean": _region_sum(self.edge_sum, *box) / n,
+            "gradient_rms": float(np.sqrt(max(0.0, _region_sum(self.gradient_sum, *box) / n))),
+        }
+
+
+def parse_region(region: Any, width: int, height: int) -> Tuple[int, int, int, int]:
+    """Parse 'x1,y1,x2,y2', a list, or a dict with x1..y2, clamped to the image.
+
+    Raises:
+        ValueError: If the coordinates are malformed or the region is empty
+    """
+    if isinstance(region, str):
+        coords = region.split(",")
+    elif isinstance(region, dict):
+        coords = [region.get(k) for k in ("x1", "y1", "x2", "y2")]
+    elif isinstance(region, (list, tuple)):
+        coords = list(region)
+    else:
+        raise ValueError(f"Unsupported region_coordinates format: {type(region)}")
+    if len(coords) != 4 or any(c is None for c in coords):
+        raise ValueError(f"Invalid region_coordinates format: {region}. Expected 'x1,y1,x2,y2'")
+
+    x1, y1, x2, y2 = (int(float(c)) for c in coords)
+    x1, x2 = max(0, min(x1, width)), max(0, min(x2, width))
+    y1, y2 = max(0, min(y1, height)), max(0, min(y2, height))
+    if x2 <= x1 or y2 <= y1:
+        raise ValueError(f"Region {region} is empty or outside the {width}x{height} image")
+    return x1, y1, x2, y2
+
+
+def assess_clarity(stats: Dict[str, float], element_type: str, min_clarity_score: int) -> Dict[str, Any]:
+    """Turn region statistics into a clarity score, verdict and recommendations."""
+    if element_type.lower() == "logo":
+        # Logos need very high clarity - be more strict
+        max_expected_variance = 400
+        edge_weight, laplacian_weight, high_freq_weight = 0.4, 0.4, 0.2
+        min_clarity_score = max(min_clarity_score, 85)
+    else:
+        max_expected_variance = 500
+        edge_weight, laplacian_weight, high_freq_weight = 0.3, 0.5, 0.2
+
+    laplacian_score = min(100, int(stats["laplacian_variance"] / max_expected_variance * 100))
+    edge_score = min(100, int(stats["edge_mean"] / EDGE_MEAN_NORM * 100))
+    high_freq_score = min(100, int(stats["gradient_rms"] / GRADIENT_RMS_NORM * 100))
+    clarity_score = int(
+        laplacian_score * laplacian_weight +
+        edge_score * edge_weight +
+        high_freq_score * high_freq_weight
+    )
+    meets_requirement = clarity_score >= min_clarity_score
+
+    result = {
+        "element_type": element_type,
+        "clarity_score": clarity_score,
+        "min_required": min_clarity_score,
+        "meets_requirement": meets_requirement,
+        "assessment": "Clear" if meets_requirement else "Blurry",
+        "detailed_metrics": {
+            "laplacian_score": laplacian_score,
+            "edge_detection_score": edge_score,
+            "high_frequency_score": high_freq_score
+        },
+        "recommendations": []
+    }
+
+    if not meets_requirement:
+        result["recommendations"].append("Increase the resolution of the image")
+        result["recommendations"].append(f"Ensure the {element_type} is not obscured or blurred")
+        if element_type.lower() == "logo":
+            result["recommendations"].append("⚠️ CRITICAL COMPLIANCE ISSUE: Logo blur detected")
+            result["recommendations"].append("Use the vector version of the logo if available")
+            result["recommendations"].append("Logo clarity is a mandatory brand requirement")
+            result["assessment"] = "⚠️ CRITICAL: Blurred Logo Detected"
+        elif element_type.lower() == "text":
+            result["recommendations"].append("Increase the font size or use a clearer font")
+    return result
+
+
+def score_regions(pixels: np.ndarray, regions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Score the clarity of many regions of one image in a single pass.
+
+    Args:
+        pixels: RGB pixel array of shape (height, width, 3)
+        regions: Dicts with bounds (x1, y1, x2, y2), element_type and min_clarity_score
+
+    Returns:
+        One assessment per region, in order
+    """
+    if not regions:
+        return []
+    bounds = (
+        min(r["x1"] for r in regions), min(r["y1"] for r in regions),
+        max(r["x2"] for r in regions), max(r["y2"] for r in regions)
+    )
+    shared = None
+    if (bounds[2] - bounds[0]) * (bounds[3] - bounds[1]) <= MAX_SHARED_MAP_PIXELS:
+        shared = ClarityMap(pixels, bounds)
+
+    results = []
+    for r in regions:
+        box = (r["x1"], r["y1"], r["x2"], r["y2"])
+        clarity_map = shared or ClarityMap(pixels, box)
+        results.append(assess_clarity(clarity_map.region_stats(*box), r["element_type"], r["min_clarity_score"]))
+    return results
@@ -0,0 +1,270 @@
+import os
+from collections import deque
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+from app.core.agent.palette import srgb_to_linear, rgb_to_hex, sample_pixels, bin_colors
+
+# WCAG 2.x minimum contrast ratios
+WCAG_THRESHOLDS = {
+    "AA": {"normal_text": 4.5, "large_text": 3.0},
+    "AAA": {"normal_text": 7.0, "large_text": 4.5},
+}
+
+# Region pairs accepted in one call
+MAX_CONTRAST_PAIRS = int(os.getenv("CONTRAST_MAX_PAIRS", 50))
+
+# Text regions returned by auto-detection, largest first
+MAX_TEXT_REGIONS = int(os.getenv("CONTRAST_MAX_TEXT_REGIONS", 20))
+
+# The image is split into about this many cells along its longer side for detection
+DETECTION_GRID = 96
+
+# Cells along the longer side of the heatmap
+HEATMAP_GRID = 16
+
+# Luminance standard deviation above which a cell is treated as having text or edges
+TEXT_LUMINANCE_STD = 0.05
+
+# Percentiles taken as the dark and light luminance of a region, ignoring outliers
+_LOW_PERCENTILE = 5
+_HIGH_PERCENTILE = 95
+
+_LUMINANCE_WEIGHTS = np.array([0.2126, 0.7152, 0.0722])
+
+
+def relative_luminance(rgb: np.ndarray) -> np.ndarray:
+    """WCAG relative luminance (0-1) of sRGB values (0-255, shape (..., 3)), as float32."""
+    return (srgb_to_linear(rgb) @ _LUMINANCE_WEIGHTS).astype(np.float32)
+
+
+def contrast_ratio(l1, l2):
+    """WCAG contrast ratio between luminances; the order of the arguments does not matter."""
+    lighter, darker = np.maximum(l1, l2), np.minimum(l1, l2)
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+def wcag_compliance(ratio: float) -> Dict[str, Dict[str, bool]]:
+    """AA/AAA verdicts for normal and large text at a contrast ratio."""
+    return {
+        level: {size: bool(ratio >= minimum) for size, minimum in sizes.items()}
+        for level, sizes in WCAG_THRESHOLDS.items()
+    }
+
+
+def dominant_color(pixels: np.ndarray) -> Tuple[int, int, int]:
+    """Most common color of a region (binned, so anti-aliasing and noise do not split it).
+
+    Raises:
+        ValueError: If the region has no pixels
+    """
+    flat = sample_pixels(pixels)
+    if len(flat) == 0:
+        raise ValueError("Cannot take the dominant color of an empty region")
+    colors, weights = bin_colors(flat)
+    return tuple(int(v) for v in np.round(colors[int(np.argmax(weights))]))
+
+
+def clamp_region(region: Dict[str, Any], width: int, height: int) -> Tuple[int, int, int, int]:
+    """Clamp a region dict (x1, y1, x2, y2) to the image, defaulting to the full image.
+
+    Raises:
+        ValueError: If the region is empty or lies outside the image
+    """
+    x1 = min(max(0, int(region.get("x1", 0))), width)
+    y1 = min(max(0, int(region.get("y1", 0))), height)
+    x2 = min(max(0, int(region.get("x2", width))), width)
+    y2 = min(max(0, int(region.get("y2", height))), height)
+    if x2 <= x1 or y2 <= y1:
+        raise ValueError(f"Region {region} is empty or outside the {width}x{height} image")
+    return x1, y1, x2, y2
+
+
+def _contrast_entry(fg: Tuple[int, int, int], bg: Tuple[int, int, int], ratio: float) -> Dict[str, Any]:
+    return {
+        "foreground_color": rgb_to_hex(fg),
+        "background_color": rgb_to_hex(bg),
+        "contrast_ratio": round(float(ratio), 2),
+        "wcag_compliance": wcag_compliance(round(float(ratio), 2)),
+    }
+
+
+def _cell_view(values: np.ndarray, cell: int) -> np.ndarray:
+    """Split an (H, W) array into (rows, cols, cell * cell) blocks, dropping partial edge cells."""
+    rows, cols = values.shape[0] // cell, values.shape[1] // cell
+    blocks = values[:rows * cell, :cols * cell].reshape(rows, cell, cols, cell)
+    return blocks.swapaxes(1, 2).reshape(rows, cols, cell * cell)
+
+
+def _label_cells(mask: np.ndarray) -> List[Tuple[int, int, int, int, int]]:
+    """Group 8-connected True cells.
+
+    Returns:
+        List of (row1, col1, row2, col2, cell count) bounding boxes, inclusive
+    """
+    seen = np.zeros_like(mask, dtype=bool)
+    rows, cols = mask.shape
+    groups = []
+    for r, c in zip(*np.nonzero(mask)):
+        if seen[r, c]:
+            continue
+        seen[r, c] = True
+        queue = deque([(r, c)])
+        r1, c1, r2, c2, count = r, c, r, c, 0
+        while queue:
+            y, x = queue.popleft()
+            count += 1
+            r1, c1, r2, c2 = min(r1, y), min(c1, x), max(r2, y), max(c2, x)
+            for ny in range(max(0, y - 1), min(rows, y + 2)):
+                for nx in range(max(0, x - 1), min(cols, x + 2)):
+                    if mask[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        queue.append((ny, nx))
+        groups.append((int(r1), int(c1), int(r2), int(c2), count))
+    return groups
+
+
+class ContrastAnalyzer:
+    """Contrast measurements over one image.
+
+    Relative luminance is computed for the whole image once, as an array, on
+    first use by text detection or the heatmap. Region pairs are measured on
+    their dominant colors, with all ratios computed in one vectorized pass.
+    """
+
+    def __init__(self, pixels: np.ndarray):
+        self.pixels = pixels
+        self.height, self.width = pixels.shape[:2]
+        self._luminance = None
+
+    @property
+    def luminance(self) -> np.ndarray:
+        if self._luminance is None:
+            self._luminance = relative_luminance(self.pixels)
+        return self._luminance
+
+    def measure_pairs(self, pairs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Contrast between the dominant colors of each foreground/background region pair.
+
+        Args:
+            pairs: Dicts with foreground_region, background_region and an optional label
+
+        Returns:
+            One result per pair, in order, with colors, ratio and WCAG verdicts
+
+        Raises:
+            ValueError: If a region is empty or outside the image
+        """
+        colors = []
+        regions = []
+        for number, pair in enumerate(pairs, 1):
+            try:
+                fg = clamp_region(pair.get("foreground_region") or {}, self.width, self.height)
+                bg = clamp_region(pair.get("background_region") or {}, self.width, self.height)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Pair {number}: {e}") from e
+            regions.append((fg, bg))
+            colors.append(dominant_color(self.pixels[fg[1]:fg[3], fg[0]:fg[2]]))
+            colors.append(dominant_color(self.pixels[bg[1]:bg[3], bg[0]:bg[2]]))
+
+        if not colors:
+            return []
+        luminance = relative_luminance(np.array(colors))
+        ratios = contrast_ratio(luminance[0::2], luminance[1::2])
+
+        results = []
+        for i, (pair, (fg, bg)) in enumerate(zip(pairs, regions)):
+            entry = _contrast_entry(colors[2 * i], colors[2 * i + 1], ratios[i])
+            if pair.get("label"):
+                entry["label"] = pair["label"]
+            entry["foreground_region"] = dict(zip(("x1", "y1", "x2", "y2"), fg))
+            entry["background_region"] = dict(zip(("x1", "y1", "x2", "y2"), bg))
+            results.append(entry)
+        return results
+
+    def detect_text_regions(self, max_regions: int = MAX_TEXT_REGIONS) -> List[Dict[str, Any]]:
+        """Find likely text regions and measure their contrast.
+
+        Cells with high luminance variance are grouped into regions. Within a
+        region, pixels are split at the midpoint between the dark and light
+        luminance percentiles; the smaller side is taken as the text and the
+        larger as its background.
+
+        Returns:
+            Regions ordered by area, each with its bounds, colors, ratio and WCAG verdicts
+        """
+        cell = max(4, -(-max(self.height, self.width) // DETECTION_GRID))
+        blocks = _cell_view(self.luminance, cell)
+        if blocks.size == 0:
+            return []
+        mask = blocks.std(axis=2) > TEXT_LUMINANCE_STD
+
+        groups = sorted(_label_cells(mask), key=lambda g: -g[4])
+        results = []
+        for r1, c1, r2, c2, count in groups:
+            if len(results) >= max_regions:
+                break
+            if count < 2:
+                continue
+            x1, y1, x2, y2 = c1 * cell, r1 * cell, (c2 + 1) * cell, (r2 + 1) * cell
+            luminance = self.luminance[y1:y2, x1:x2]
+            low, high = np.percentile(luminance, [_LOW_PERCENTILE, _HIGH_PERCENTILE])
+            if high - low < TEXT_LUMINANCE_STD:
+                continue
+            light = luminance > (low + high) / 2
+            text = light if light.mean() < 0.5 else ~light
+
+            region = self.pixels[y1:y2, x1:x2]
+            fg, bg = dominant_color(region[text]), dominant_color(region[~text])
+            ratio = contrast_ratio(*relative_luminance(np.array([fg, bg])))
+            results.append({
+                "region": {"x1": x1, "y1": y1, "x2": x2, "y2": y2},
+                **_contrast_entry(fg, bg, ratio),
+                "text_coverage": round(float(text.mean() * 100), 2),
+            })
+        return results
+
+    def heatmap(self, threshold: float = WCAG_THRESHOLDS["AA"]["normal_text"], grid: int = HEATMAP_GRID) -> Dict[str, Any]:
+        """Coarse map of local contrast, for spotting low-contrast areas.
+
+        Each cell holds the contrast between its dark and light luminance
+        percentiles, or None for flat cells without text or edges.
+
+        Returns:
+            Dictionary with cell size, the grid of ratios and the low-contrast cells
+        """
+        cell = max(1, -(-max(self.height, self.width) // grid))
+        blocks = _cell_view(self.luminance, cell)
+        if blocks.size == 0:
+            return {"cell_size": cell, "ratios": [], "low_contrast_cells": []}
+
+        low, high = np.percentile(blocks, [_LOW_PERCENTILE, _HIGH_PERCENTILE], axis=2)
+        ratios = contrast_ratio(low, high)
+        content = blocks.std(axis=2) > TEXT_LUMINANCE_STD
+
+        low_cells = [
+            {"x1": int(c * cell), "y1": int(r * cell), "x2": int((c + 1) * cell), "y2": int((r + 1) * cell),
+             "contrast_ratio": round(float(ratios[r, c]), 2)}
+            for r, c in zip(*np.nonzero(content & (ratios < threshold)))
+        ]
+        return {
+            "cell_size": cell,
+            "threshold": threshold,
+            "ratios": [
+                [round(float(ratios[r, c]), 1) if content[r, c] else None for c in range(ratios.shape[1])]
+                for r in range(ratios.shape[0])
+            ],
+            "low_contrast_cells": low_cells,
+        }
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Count how many measured pairs or regions pass each WCAG level."""
+    summary = {"total": len(results)}
+    for level, sizes in WCAG_THRESHOLDS.items():
+        for size in sizes:
+            summary[f"{level}_{size}_passing"] = sum(1 for r in results if r["wcag_compliance"][level][size])
+    ratios = [r["contrast_ratio"] for r in results]
+    summary["min_contrast_ratio"] = min(ratios) if ratios else None
+    return summary
@@ -0,0 +1,324 @@
+import os
+import base64
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Handles passed to tools in place of the base64 asset
+MEDIA_HANDLE_PREFIX = "media:sha256:"
+
+# Upper bound on decoded pixels held by the store; unreferenced entries are evicted first
+MAX_STORE_BYTES = int(os.getenv("MEDIA_STORE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Shared-memory assets a tool worker process keeps attached between calls
+MAX_ATTACHED_SHARED = int(os.getenv("MEDIA_STORE_MAX_ATTACHED", 4))
+
+
+def _decode_base64(image_base64: str) -> bytes:
+    """Decode a base64 asset, with or without a data URL prefix or padding."""
+    if image_base64.startswith("data:"):
+        image_base64 = image_base64.split(",", 1)[-1]
+    padding_needed = len(image_base64) % 4
+    if padding_needed != 0:
+        image_base64 += "=" * (4 - padding_needed)
+    return base64.b64decode(image_base64)
+
+
+class DecodedMedia:
+    """An asset decoded once: raw file bytes plus the RGB pixel array.
+
+    The pixel array is read-only and shared by every tool call; image()
+    returns a fresh PIL image so tools can crop, resize or draw freely.
+    """
+
+    def __init__(self, raw: bytes, image_base64: Optional[str] = None):
+        self.raw = raw
+        self.sha256 = hashlib.sha256(raw).hexdigest()
+        self._base64 = image_base64
+
+        with Image.open(BytesIO(raw)) as img:
+            self.format = img.format
+            self.mode = img.mode
+            self.info = dict(img.info)
+            self.array = np.asarray(img.convert("RGB"))
+        self.array.setflags(write=False)
+
+        # Shared memory copy for worker processes, created on first share()
+        self._shm: Optional[SharedMemory] = None
+        self._owns_shm = False
+
+    @classmethod
+    def from_base64(cls, image_base64: str) -> "DecodedMedia":
+        return cls(_decode_base64(image_base64), image_base64)
+
+    @classmethod
+    def from_shared(cls, descriptor: Dict[str, Any], shm: SharedMemory) -> "DecodedMedia":
+        """Map an asset shared by another process without copying or decoding it."""
+        media = cls.__new__(cls)
+        pixel_bytes = int(np.prod(descriptor["shape"]))
+        media.array = np.ndarray(descriptor["shape"], dtype=np.uint8, buffer=shm.buf)
+        media.array.setflags(write=False)
+        media.raw = shm.buf[pixel_bytes:pixel_bytes + descriptor["raw_bytes"]]
+        media.sha256 = descriptor["sha256"]
+        media.format = descriptor["format"]
+        media.mode = descriptor["mode"]
+        media.info = descriptor["info"]
+        media._base64 = None
+        media._shm = shm
+        media._owns_shm = False
+        return media
+
+    def share(self) -> Dict[str, Any]:
+        """Copy the pixels and raw bytes into shared memory once and describe them.
+
+        The descriptor is small and picklable, so worker processes can map the
+        asset with from_shared instead of receiving megabytes of base64.
+        """
+        if self._shm is None:
+            shm = SharedMemory(create=True, size=self.array.nbytes + len(self.raw))
+            pixels = np.ndarray(self.array.shape, dtype=np.uint8, buffer=shm.buf)
+            pixels[:] = self.array
+            del pixels
+            shm.buf[self.array.nbytes:self.array.nbytes + len(self.raw)] = self.raw
+            self._shm = shm
+            self._owns_shm = True
+        return {
+            "name": self._shm.name,
+            "sha256": self.sha256,
+            "shape": self.array.shape,
+            "raw_bytes": len(self.raw),
+            "format": self.format,
+            "mode": self.mode,
+            "info": self.info
+        }
+
+    def close(self) -> None:
+        """Release the shared memory segment, unlinking it if this process created it."""
+        shm, self._shm = self._shm, None
+        if shm is None:
+            return
+        if not self._owns_shm:
+            # Views into the mapping must go before it can be closed
+            self.array = None
+            self.raw = b""
+        try:
+            shm.close()
+        except BufferError:
+            pass
+        if self._owns_shm:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    @property
+    def handle(self) -> str:
+        return f"{MEDIA_HANDLE_PREFIX}{self.sha256}"
+
+    @property
+    def size(self):
+        """Image size as (width, height), like PIL."""
+        return self.array.shape[1], self.array.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.array.nbytes + len(self.raw)
+
+    @property
+    def base64(self) -> str:
+        """Base64 of the raw bytes, for tools that forward the asset to an external API."""
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.raw).decode("utf-8")
+        return self._base64
+
+    def image(self) -> Image.Image:
+        """Get an RGB PIL copy of the pixels, carrying the original metadata (e.g. DPI)."""
+        img = Image.fromarray(self.array, "RGB")
+        img.info = dict(self.info)
+        return img
+
+
+class MediaStore:
+    """Process-wide store of decoded assets keyed by content hash.
+
+    An analysis registers its asset once, passes the returned handle to its
+    tools and releases it when done. Concurrent analyses of the same asset
+    share one entry; an entry is dropped when its last analysis releases it.
+    """
+
+    def __init__(self, max_bytes: int = MAX_STORE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries: Dict[str, DecodedMedia] = {}
+        self.refs: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.stats = {
+            "decodes": 0,
+            "shared_registrations": 0,
+            "lookups": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(media.nbytes for media in self.entries.values())
+
+    def register(self, image_base64: str) -> str:
+        """Decode an asset (unless already stored) and take a reference to it.
+
+        This does the CPU-heavy decode, so async callers should run it in a thread.
+
+        Args:
+            image_base64: Base64 encoded asset, with or without a data URL prefix
+
+        Returns:
+            Handle to pass to tools as image_handle
+        """
+        raw = _decode_base64(image_base64)
+        digest = hashlib.sha256(raw).hexdigest()
+        with self.lock:
+            if digest in self.entries:
+                self.refs[digest] += 1
+                self.stats["shared_registrations"] += 1
+                return self.entries[digest].handle
+
+        media = DecodedMedia(raw, image_base64)
+        with self.lock:
+            if digest in self.entries:
+                # Another analysis decoded the same asset meanwhile
+                self.refs[digest] += 1
+                self.stats["shared_registrations"] += 1
+                return self.entries[digest].handle
+            self.entries[digest] = media
+            self.refs[digest] = 1
+            self.stats["decodes"] += 1
+            self._evict_unreferenced()
+        print(f"\033[94m[MEDIA STORE] Decoded {media.size[0]}x{media.size[1]} {media.format} asset "
+              f"({media.nbytes // 1024}KB) as {media.handle[:32]}...\033[0m")
+        return media.handle
+
+    def get(self, handle: str) -> DecodedMedia:
+        """Look up a decoded asset.
+
+        Raises:
+            KeyError: If the handle is unknown or has been released
+        """
+        digest = handle[len(MEDIA_HANDLE_PREFIX):] if handle.startswith(MEDIA_HANDLE_PREFIX) else handle
+        with self.lock:
+            self.stats["lookups"] += 1
+            media = self.entries.get(digest)
+            if media is None:
+                self.stats["misses"] += 1
+                raise KeyError(f"Media handle {handle} is not registered")
+            return media
+
+    def release(self, handle: str) -> None:
+        """Drop a reference taken by register; the entry is freed with its last reference."""
+        digest = handle[len(MEDIA_HANDLE_PREFIX):] if handle.startswith(MEDIA_HANDLE_PREFIX) else handle
+        with self.lock:
+            if digest not in self.refs:
+                return
+            self.refs[digest] -= 1
+            if self.refs[digest] <= 0:
+                del self.refs[digest]
+                media = self.entries.pop(digest, None)
+                if media is not None:
+                    media.close()
+
+    def share(self, handle: str) -> Dict[str, Any]:
+        """Get a shared-memory descriptor of a registered asset for a worker process."""
+        media = self.get(handle)
+        with self.lock:
+            return media.share()
+
+    def adopt(self, media: DecodedMedia) -> str:
+        """Store an asset decoded elsewhere (e.g. mapped from shared memory) and reference it."""
+        with self.lock:
+            self.entries.setdefault(media.sha256, media)
+            self.refs[media.sha256] = self.refs.get(media.sha256, 0) + 1
+            return self.entries[media.sha256].handle
+
+    def _evict_unreferenced(self) -> None:
+        # Entries are normally released with their analysis; this only guards against leaks
+        for digest in list(self.entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if self.refs.get(digest, 0) <= 0:
+                self.entries.pop(digest).close()
+                self.refs.pop(digest, None)
+                self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store statistics."""
+        with self.lock:
+            return {**self.stats, "entries": len(self.entries), "bytes": self.total_bytes}
+
+
+# Shared store for this process
+media_store = MediaStore()
+
+# Worker side: shared-memory assets attached by this process, least recently used first
+_attached: "OrderedDict[str, Tuple[SharedMemory, str]]" = OrderedDict()
+
+
+def attach_shared(descriptor: Dict[str, Any]) -> str:
+    """Map an asset shared by the parent process into this process's store.
+
+    Used by tool worker processes. The mapping is kept for later calls on the
+    same asset; the least recently used mappings are closed beyond a small cap.
+
+    Args:
+        descriptor: Descriptor returned by MediaStore.share
+
+    Returns:
+        Handle to pass to tools as image_handle
+    """
+    name = descriptor["name"]
+    if name in _attached:
+        _attached.move_to_end(name)
+        return _attached[name][1]
+
+    try:
+        shm = SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: stop the resource tracker from unlinking the parent's segment
+        shm = SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+
+    handle = media_store.adopt(DecodedMedia.from_shared(descriptor, shm))
+    _attached[name] = (shm, handle)
+    while len(_attached) > MAX_ATTACHED_SHARED:
+        _, (_, old_handle) = _attached.popitem(last=False)
+        media_store.release(old_handle)
+    return handle
+
+
+def has_image(data: Dict[str, Any]) -> bool:
+    """Check whether tool arguments carry an image, as a handle or as base64."""
+    return bool(data.get("image_handle") or data.get("image_base64"))
+
+
+def load_image(data: Dict[str, Any]) -> DecodedMedia:
+    """Resolve the image passed to a tool.
+
+    Tools receive an image_handle from the agent; callers that still pass
+    image_base64 get a one-off decode that is not stored.
+
+    Raises:
+        KeyError: If the handle has been released
+        ValueError: If no image was provided
+    """
+    handle = data.get("image_handle")
+    if handle:
+        return media_store.get(handle)
+    image_base64 = data.get("image_base64")
+    if image_base64:
+        return DecodedMedia.from_base64(image_base64)
+    raise ValueError("No image provided.")
@@ -0,0 +1,174 @@
+import os
+from typing import List, Dict, Any
+
+import numpy as np
+
+# Pixels sampled from an image before quantization; bounds the cost regardless of image size
+MAX_SAMPLE_PIXELS = int(os.getenv("PALETTE_MAX_SAMPLE_PIXELS", 65536))
+
+# Number of colors returned by default
+DEFAULT_PALETTE_SIZE = 10
+
+# Lloyd iterations of the Lab k-means refinement after the median cut
+KMEANS_ITERATIONS = 8
+
+# Colors are binned to this many bits per channel before clustering
+QUANTIZE_BITS = 5
+
+# D65 reference white
+_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+
+
+def srgb_to_linear(rgb: np.ndarray) -> np.ndarray:
+    """Convert sRGB values (0-255) to linear RGB (0-1)."""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """Convert sRGB values (0-255, shape (..., 3)) to CIELAB under D65."""
+    xyz = srgb_to_linear(rgb) @ _RGB_TO_XYZ.T / _WHITE
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+def rgb_to_hex(rgb) -> str:
+    r, g, b = (int(v) for v in rgb)
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def sample_pixels(pixels: np.ndarray, max_pixels: int = MAX_SAMPLE_PIXELS) -> np.ndarray:
+    """Take an evenly strided sample of at most max_pixels RGB pixels as an (N, 3) array."""
+    flat = np.asarray(pixels, dtype=np.uint8)[..., :3].reshape(-1, 3)
+    if len(flat) > max_pixels:
+        flat = flat[::-(-len(flat) // max_pixels)]
+    return flat
+
+
+def bin_colors(flat: np.ndarray):
+    """Bin pixels to QUANTIZE_BITS per channel.
+
+    Returns:
+        Tuple of (mean RGB per bin, pixel count per bin)
+    """
+    shift = 8 - QUANTIZE_BITS
+    q = (flat >> shift).astype(np.int64)
+    codes = (q[:, 0] << (2 * QUANTIZE_BITS)) | (q[:, 1] << QUANTIZE_BITS) | q[:, 2]
+    uniques, inverse, counts = np.unique(codes, return_inverse=True, return_counts=True)
+    sums = np.zeros((len(uniques), 3))
+    np.add.at(sums, inverse, flat)
+    return sums / counts[:, None], counts.astype(np.float64)
+
+
+def _median_cut(colors: np.ndarray, weights: np.ndarray, n: int) -> List[np.ndarray]:
+    """Split weighted colors into up to n boxes, returning the member indices of each box."""
+    boxes = [np.arange(len(colors))]
+    while len(boxes) < n:
+        # Split the box with the widest channel range, weighted by its pixel count
+        best, best_score = None, 0.0
+        for i, idx in enumerate(boxes):
+            if len(idx) < 2:
+                continue
+            spread = colors[idx].max(axis=0) - colors[idx].min(axis=0)
+            score = spread.max() * weights[idx].sum()
+            if score > best_score:
+                best, best_score = i, score
+        if best is None:
+            break
+
+        idx = boxes.pop(best)
+        channel = int(np.argmax(colors[idx].max(axis=0) - colors[idx].min(axis=0)))
+        order = idx[np.argsort(colors[idx, channel], kind="stable")]
+        cumulative = np.cumsum(weights[order])
+        cut = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+        cut = min(max(cut, 1), len(order) - 1)
+        boxes.extend([order[:cut], order[cut:]])
+    return boxes
+
+
+def extract_palette(
+    pixels: np.ndarray,
+    n_colors: int = DEFAULT_PALETTE_SIZE,
+    max_pixels: int = MAX_SAMPLE_PIXELS
+) -> List[Dict[str, Any]]:
+    """Extract the dominant colors of an image with their pixel coverage.
+
+    Pixels are sampled and binned, split with a weighted median cut and
+    refined with k-means in CIELAB, so clusters follow perceived color
+    differences. The cost depends on max_pixels, not on the image size.
+
+    Args:
+        pixels: RGB pixel array of shape (height, width, 3) or (N, 3)
+        n_colors: Maximum number of colors to return
+        max_pixels: Maximum number of pixels sampled
+
+    Returns:
+        Colors ordered by coverage, each with hex, rgb and coverage (percent of pixels)
+    """
+    flat = sample_pixels(pixels, max_pixels)
+    if len(flat) == 0:
+        return []
+
+    colors, weights = bin_colors(flat)
+    lab = rgb_to_lab(colors)
+    boxes = _median_cut(colors, weights, max(1, n_colors))
+    centers = np.array([np.average(lab[idx], axis=0, weights=weights[idx]) for idx in boxes])
+
+    for _ in range(KMEANS_ITERATIONS):
+        distances = ((lab[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        totals = np.bincount(labels, weights=weights, minlength=len(centers))
+        new_centers = centers.copy()
+        for axis in range(3):
+            sums = np.bincount(labels, weights=weights * lab[:, axis], minlength=len(centers))
+            np.divide(sums, totals, out=new_centers[:, axis], where=totals > 0)
+        if np.allclose(new_centers, centers, atol=0.5):
+            centers = new_centers
+            break
+        centers = new_centers
+
+    labels = ((lab[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    totals = np.bincount(labels, weights=weights, minlength=len(centers))
+    palette = []
+    for k in np.argsort(-totals):
+        if totals[k] <= 0:
+            continue
+        members = labels == k
+        rgb = np.clip(np.round(np.average(colors[members], axis=0, weights=weights[members])), 0, 255).astype(int)
+        palette.append({
+            "hex": rgb_to_hex(rgb),
+            "rgb": [int(v) for v in rgb],
+            "coverage": round(float(totals[k] / weights.sum() * 100), 2)
+        })
+    return palette
+
+
+def extract_palettes(
+    frames: List[np.ndarray],
+    n_colors: int = DEFAULT_PALETTE_SIZE,
+    max_pixels: int = MAX_SAMPLE_PIXELS
+) -> Dict[str, Any]:
+    """Extract per-frame palettes and one palette across all frames.
+
+    The combined palette samples every frame equally, so the total work stays
+    within max_pixels per frame plus max_pixels overall.
+
+    Returns:
+        Dictionary with the combined palette and the list of per-frame palettes
+    """
+    per_frame = max(1, max_pixels // max(1, len(frames)))
+    combined = np.concatenate([sample_pixels(frame, per_frame) for frame in frames]) if frames else np.empty((0, 3), dtype=np.uint8)
+    return {
+        "palette": extract_palette(combined, n_colors, max_pixels),
+        "frame_palettes": [extract_palette(frame, n_colors, max_pixels) for frame in frames]
+    }
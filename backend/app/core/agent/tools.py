@@ -317,6 +317,7 @@ claude_tools = [
             Analyze the image for color contrast accessibility compliance.
             This tool checks color contrast ratios between text and background colors
             to ensure the design meets WCAG accessibility standards, which is often a requirement in brand guidelines.
+            Several pairs can be checked in one call with pairs, and auto_detect finds text regions automatically.
         """,
         "input_schema": {
             "type": "object",
@@ -343,6 +344,19 @@ claude_tools = [
                     },
                     "required": ["x1", "y1", "x2", "y2"],
                 },
+                "pairs": {
+                    "type": "array",
+                    "description": "Foreground/background region pairs to check in one call, each with foreground_region, background_region and an optional label",
+                    "items": {"type": "object"},
+                },
+                "auto_detect": {
+                    "type": "boolean",
+                    "description": "Detect likely text regions and measure the contrast of each",
+                },
+                "heatmap": {
+                    "type": "boolean",
+                    "description": "Include a coarse grid of local contrast ratios",
+                },
                 "tool_name": {
                     "type": "string",
                     "description": "The exact name of this tool that you are using",
@@ -354,8 +368,6 @@ claude_tools = [
                 },
             },
             "required": [
-                "foreground_region",
-                "background_region",
                 "tool_name",
                 "task_detail",
             ],
@@ -456,6 +468,7 @@ claude_tools = [
             Analyze the clarity and sharpness of a specific region in an image.
             This tool checks if elements like logos, text, or other brand assets are displayed with sufficient clarity.
             It's particularly useful for checking if logos or text are blurred, pixelated, or otherwise unclear.
+            Several elements can be scored in one call with regions.
         """,
         "input_schema": {
             "type": "object",
@@ -476,6 +489,15 @@ claude_tools = [
                     "type": "integer",
                     "description": "Minimum acceptable clarity score (0-100).",
                 },
+                "regions": {
+                    "type": "array",
+                    "description": "Regions to score in one call, each with region_coordinates, element_type, an optional min_clarity_score and an optional label",
+                    "items": {"type": "object"},
+                },
+                "include_region_image": {
+                    "type": "boolean",
+                    "description": "Include each cropped region as base64 PNG in the result (off by default).",
+                },
                 "tool_name": {
                     "type": "string",
                     "description": "The exact name of this tool that you are using",
@@ -486,7 +508,7 @@ claude_tools = [
                     "description": "A quick title about the task you are doing",
                 },
             },
-            "required": ["region_coordinates", "element_type", "tool_name", "task_detail"],
+            "required": ["tool_name", "task_detail"],
             "additionalProperties": True,
         },
     },
@@ -576,6 +598,7 @@ def get_tool_function(tool_name: str):
         "check_video_frame_specs": check_video_frame_specs,
         "extract_verbal_content": extract_verbal_content,
         "get_region_color_scheme": get_region_color_scheme,
+        "match_brand_colors": match_brand_colors,
         "check_color_contrast": check_color_contrast,
         "check_image_specs": check_image_specs,
         "check_element_placement": check_element_placement,
@@ -605,6 +628,13 @@ import requests
 import os
 from dotenv import load_dotenv
 
+from app.core.agent.media_store import has_image, load_image
+from app.core.agent.palette import extract_palette
+from app.core.agent.contrast import ContrastAnalyzer, summarize, MAX_CONTRAST_PAIRS
+from app.core.agent.clarity import score_regions, parse_region, MAX_CLARITY_REGIONS
+from app.core.agent.brand_palette import brand_palettes, DEFAULT_TOLERANCE
+import asyncio
+
 # Load environment variables
 load_dotenv()
 
@@ -612,43 +642,26 @@ load_dotenv()
 async def get_image_color_scheme(data):
     """Get the color scheme of the original image that the user wants to check compliance for."""
 
-    image_base64 = data.get("image_base64")
-
-    # Check if the base64 string exists
-    if not image_base64:
+    # Check if an image was provided
+    if not has_image(data):
         return json.dumps({"error": "No image provided."})
 
     try:
-        # Ensure correct padding for base64 string
-        padding_needed = len(image_base64) % 4
-        if padding_needed != 0:
-            image_base64 += "=" * (4 - padding_needed)  # Add padding if necessary
-
-        # Decode the base64 string into binary data
-        image_data = base64.b64decode(image_base64)
-
-        # Open the image using PIL
-        with Image.open(BytesIO(image_data)) as img:
-            # Convert image to RGB if it's not already
-            img = img.convert("RGB")
-
-            # Get the color palette of the image
-            colors = img.getcolors(
-                maxcolors=1000000
-            )  # Increase maxcolors to cover all colors
-
-            if not colors:
-                return json.dumps({"error": "No colors found in image."})
-
-            # Convert RGB tuples to hex format and remove duplicates
-            color_palette = list(
-                set([f"#{r:02x}{g:02x}{b:02x}" for count, (r, g, b) in colors])
-            )
+        # Use the asset decoded once for this analysis
+        media = load_image(data)
+
+        # Dominant colors with the share of the image each one covers
+        palette = extract_palette(media.array)
 
-            # Limit the palette to 10 colors
-            color_palette = color_palette[:10]
+        if not palette:
+            return json.dumps({"error": "No colors found in image."})
 
-            return json.dumps({"color_palette": color_palette})
+        return json.dumps(
+            {
+                "color_palette": [color["hex"] for color in palette],
+                "color_coverage": palette,
+            }
+        )
 
     except Exception as e:
         return json.dumps({"error": f"Failed to process image: {str(e)}"})
@@ -1095,7 +1108,6 @@ async def read_guideline_page(data):
 async def get_region_color_scheme(data):
     """Get the color scheme of a specific region within the image."""
 
-    image_base64 = data.get("image_base64")
     # Ensure coordinates are integers
     try:
         x1 = int(data.get("x1", 0))
@@ -1105,8 +1117,8 @@ async def get_region_color_scheme(data):
     except Exception as e:
         return json.dumps({"error": f"Invalid coordinate type: {str(e)}"})
 
-    # Check if the base64 string exists
-    if not image_base64:
+    # Check if an image was provided
+    if not has_image(data):
         return json.dumps({"error": "No image provided."})
 
     # Validate coordinates
@@ -1118,91 +1130,119 @@ async def get_region_color_scheme(data):
         )
 
     try:
-        # Ensure correct padding for base64 string
-        padding_needed = len(image_base64) % 4
-        if padding_needed != 0:
-            image_base64 += "=" * (4 - padding_needed)  # Add padding if necessary
+        # Use the asset decoded once for this analysis
+        media = load_image(data)
 
-        # Decode the base64 string into binary data
-        image_data = base64.b64decode(image_base64)
+        # Get image dimensions
+        width, height = media.size
 
-        # Open the image using PIL
-        with Image.open(BytesIO(image_data)) as img:
-            # Convert image to RGB if it's not already
-            img = img.convert("RGB")
-
-            # Get image dimensions
-            width, height = img.size
+        # Validate coordinates against image dimensions
+        if x2 > width or y2 > height:
+            return json.dumps(
+                {
+                    "error": f"Region coordinates exceed image dimensions. Image size is {width}x{height}.",
+                    "image_dimensions": {"width": width, "height": height},
+                }
+            )
 
-            # Validate coordinates against image dimensions
-            if x2 > width or y2 > height:
-                return json.dumps(
-                    {
-                        "error": f"Region coordinates exceed image dimensions. Image size is {width}x{height}.",
-                        "image_dimensions": {"width": width, "height": height},
-                    }
-                )
+        # Dominant colors of the region, sliced from the pixel array without copying
+        palette = extract_palette(media.array[y1:y2, x1:x2])
 
-            # Crop the image to the specified region
-            region = img.crop((x1, y1, x2, y2))
+        if not palette:
+            return json.dumps({"error": "No colors found in the specified region."})
 
-            # Get the color palette of the region
-            colors = region.getcolors(
-                maxcolors=1000000
-            )  # Increase maxcolors to cover all colors
+        return json.dumps(
+            {
+                "region": {
+                    "x1": x1,
+                    "y1": y1,
+                    "x2": x2,
+                    "y2": y2,
+                    "width": x2 - x1,
+                    "height": y2 - y1,
+                },
+                "color_palette": [color["hex"] for color in palette],
+                "color_coverage": palette,
+            }
+        )
 
-            if not colors:
-                return json.dumps({"error": "No colors found in the specified region."})
+    except Exception as e:
+        return json.dumps({"error": f"Failed to process image region: {str(e)}"})
 
-            # Convert RGB tuples to hex format and remove duplicates
-            color_palette = list(
-                set([f"#{r:02x}{g:02x}{b:02x}" for count, (r, g, b) in colors])
-            )
 
-            # Limit the palette to 10 colors
-            color_palette = color_palette[:10]
+async def match_brand_colors(data):
+    """Match the colors of the image, a region, or a list of hex colors to the brand palette."""
 
-            # Create a visual representation of the region (optional)
-            region_preview = region.copy()
-            region_preview.thumbnail((200, 200))  # Resize for preview
+    brand_name = data.get("brand_name")
+    if not brand_name:
+        return json.dumps({"error": "No brand name provided."})
 
-            # Convert region preview to base64 for visualization
-            buffer = BytesIO()
-            region_preview.save(buffer, format="PNG")
-            region_preview_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    try:
+        tolerance = float(data.get("tolerance", DEFAULT_TOLERANCE))
+    except (TypeError, ValueError):
+        return json.dumps({"error": "Invalid tolerance, expected a number."})
 
+    try:
+        # The index is built when guidelines are ingested; loading it may query the database
+        index = await asyncio.to_thread(brand_palettes.get, brand_name)
+        if index is None:
             return json.dumps(
                 {
-                    "region": {
-                        "x1": x1,
-                        "y1": y1,
-                        "x2": x2,
-                        "y2": y2,
-                        "width": x2 - x1,
-                        "height": y2 - y1,
-                    },
-                    "color_palette": color_palette,
+                    "error": f"No brand colors are indexed for {brand_name}. "
+                    "Read the color pages of the brand guidelines instead."
                 }
             )
 
+        result = {
+            "brand_name": brand_name,
+            "tolerance": tolerance,
+            "brand_palette": index.colors,
+        }
+
+        # Explicit colors, e.g. the palette returned by get_region_color_scheme
+        colors = data.get("colors")
+        if colors:
+            if isinstance(colors, str):
+                colors = [c for c in colors.replace(";", ",").split(",") if c.strip()]
+            result["color_matches"] = index.match_colors(colors, tolerance)
+            return json.dumps(result)
+
+        # Otherwise match every pixel of the region (or of the whole image)
+        if not has_image(data):
+            return json.dumps({"error": "No image provided."})
+
+        media = load_image(data)
+        width, height = media.size
+        pixels = media.array
+        if all(data.get(k) is not None for k in ("x1", "y1", "x2", "y2")):
+            x1, y1, x2, y2 = (int(data[k]) for k in ("x1", "y1", "x2", "y2"))
+            if x1 < 0 or y1 < 0 or x2 <= x1 or y2 <= y1 or x2 > width or y2 > height:
+                return json.dumps(
+                    {
+                        "error": f"Invalid region coordinates. Image size is {width}x{height}.",
+                        "image_dimensions": {"width": width, "height": height},
+                    }
+                )
+            pixels = pixels[y1:y2, x1:x2]
+            result["region"] = {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
+
+        result.update(index.match_pixels(pixels, tolerance))
+        return json.dumps(result)
+
     except Exception as e:
-        return json.dumps({"error": f"Failed to process image region: {str(e)}"})
+        return json.dumps({"error": f"Failed to match brand colors: {str(e)}"})
 
 
 async def get_image_fonts(data):
     """Identify fonts used in the original image using the WhatFontIs API."""
 
-    image_base64 = data.get("image_base64")
-
-    # Check if the base64 string exists
-    if not image_base64:
+    # Check if an image was provided
+    if not has_image(data):
         return json.dumps({"error": "No image provided."})
 
     try:
-        # Ensure correct padding for base64 string
-        padding_needed = len(image_base64) % 4
-        if padding_needed != 0:
-            image_base64 += "=" * (4 - padding_needed)  # Add padding if necessary
+        # The API takes the asset as base64
+        image_base64 = load_image(data).base64
 
         # Get API key from environment variables
         api_key = os.getenv("WHATFONTIS_API_KEY")
@@ -1248,153 +1288,69 @@ async def get_image_fonts(data):
 
 
 async def check_color_contrast(data):
-    """Analyze the image for color contrast accessibility compliance."""
+    """Analyze the image for color contrast accessibility compliance.
+
+    Accepts a single foreground_region/background_region pair, a list of
+    pairs, and/or auto_detect to find text regions, so one call replaces one
+    call per element. heatmap adds a coarse grid of local contrast with the
+    cells below the AA threshold.
+    """
 
-    image_base64 = data.get("image_base64")
     foreground_region = data.get("foreground_region", {})
     background_region = data.get("background_region", {})
+    pairs = list(data.get("pairs") or [])
+    auto_detect = bool(data.get("auto_detect", False))
+    include_heatmap = bool(data.get("heatmap", False))
 
-    # Check if the base64 string exists
-    if not image_base64:
+    # Check if an image was provided
+    if not has_image(data):
         return json.dumps({"error": "No image provided."})
 
+    # A single pair keeps the original response shape
+    single = not pairs and not auto_detect and not include_heatmap
+    if foreground_region or background_region:
+        if not foreground_region or not background_region:
+            return json.dumps(
+                {"error": "Both foreground and background regions must be provided."}
+            )
+        pairs.insert(0, {"foreground_region": foreground_region, "background_region": background_region})
+
     # Validate regions
-    if not foreground_region or not background_region:
+    if not pairs and not auto_detect and not include_heatmap:
         return json.dumps(
             {"error": "Both foreground and background regions must be provided."}
         )
+    if len(pairs) > MAX_CONTRAST_PAIRS:
+        return json.dumps({"error": f"Too many region pairs, at most {MAX_CONTRAST_PAIRS} are allowed."})
+    if any(not isinstance(p, dict) or not p.get("foreground_region") or not p.get("background_region") for p in pairs):
+        return json.dumps({"error": "Every pair needs a foreground_region and a background_region."})
 
     try:
-        # Ensure correct padding for base64 string
-        padding_needed = len(image_base64) % 4
-        if padding_needed != 0:
-            image_base64 += "=" * (4 - padding_needed)  # Add padding if necessary
-
-        # Decode the base64 string into binary data
-        image_data = base64.b64decode(image_base64)
+        # Use the asset decoded once for this analysis
+        media = load_image(data)
+        analyzer = ContrastAnalyzer(media.array)
 
-        # Open the image using PIL
-        with Image.open(BytesIO(image_data)) as img:
-            # Convert image to RGB if it's not already
-            img = img.convert("RGB")
-
-            # Get image dimensions
-            width, height = img.size
-
-            # Extract regions
-            fg_x1 = max(0, foreground_region.get("x1", 0))
-            fg_y1 = max(0, foreground_region.get("y1", 0))
-            fg_x2 = min(width, foreground_region.get("x2", width))
-            fg_y2 = min(height, foreground_region.get("y2", height))
-
-            bg_x1 = max(0, background_region.get("x1", 0))
-            bg_y1 = max(0, background_region.get("y1", 0))
-            bg_x2 = min(width, background_region.get("x2", width))
-            bg_y2 = min(height, background_region.get("y2", height))
-
-            # Crop the regions
-            foreground_img = img.crop((fg_x1, fg_y1, fg_x2, fg_y2))
-            background_img = img.crop((bg_x1, bg_y1, bg_x2, bg_y2))
-
-            # Get the dominant color from each region
-            def get_dominant_color(image):
-                # Resize image to speed up processing
-                image = image.resize((100, 100))
-                # Get colors from the image
-                colors = image.getcolors(10000)  # Get all colors
-                if not colors:
-                    return (0, 0, 0)  # Default to black if no colors found
-                # Sort by count and get the most common
-                sorted_colors = sorted(colors, key=lambda x: x[0], reverse=True)
-                return sorted_colors[0][1]  # Return the RGB value
-
-            foreground_color = get_dominant_color(foreground_img)
-            background_color = get_dominant_color(background_img)
-
-            # Calculate relative luminance for each color
-            def get_luminance(rgb):
-                r, g, b = rgb
-                # Convert RGB to sRGB
-                r_srgb = r / 255
-                g_srgb = g / 255
-                b_srgb = b / 255
-
-                # Convert sRGB to linear RGB
-                r_linear = (
-                    r_srgb / 12.92
-                    if r_srgb <= 0.04045
-                    else ((r_srgb + 0.055) / 1.055) ** 2.4
-                )
-                g_linear = (
-                    g_srgb / 12.92
-                    if g_srgb <= 0.04045
-                    else ((g_srgb + 0.055) / 1.055) ** 2.4
-                )
-                b_linear = (
-                    b_srgb / 12.92
-                    if b_srgb <= 0.04045
-                    else ((b_srgb + 0.055) / 1.055) ** 2.4
-                )
-
-                # Calculate relative luminance
-                return 0.2126 * r_linear + 0.7152 * g_linear + 0.0722 * b_linear
-
-            # Calculate contrast ratio
-            l1 = get_luminance(foreground_color)
-            l2 = get_luminance(background_color)
-
-            # Ensure l1 is the lighter color
-            if l1 <= l2:
-                l1, l2 = l2, l1
-
-            contrast_ratio = (l1 + 0.05) / (l2 + 0.05)
-
-            # WCAG 2.0 levels
-            wcag_aa_normal = contrast_ratio >= 4.5
-            wcag_aa_large = contrast_ratio >= 3.0
-            wcag_aaa_normal = contrast_ratio >= 7.0
-            wcag_aaa_large = contrast_ratio >= 4.5
-
-            # Create a visual representation
-            result_img = img.copy()
-            from PIL import ImageDraw
-
-            draw = ImageDraw.Draw(result_img)
-
-            # Draw rectangles around the regions
-            draw.rectangle([(fg_x1, fg_y1), (fg_x2, fg_y2)], outline="red", width=2)
-            draw.rectangle([(bg_x1, bg_y1), (bg_x2, bg_y2)], outline="blue", width=2)
-
-            # Convert the result image to base64
-            buffer = BytesIO()
-            result_img.save(buffer, format="PNG")
-            result_img_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-            # Convert RGB to hex for display
-            def rgb_to_hex(rgb):
-                return f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"
+        try:
+            pair_results = analyzer.measure_pairs(pairs)
+        except ValueError as region_error:
+            return json.dumps({"error": f"Error parsing region coordinates: {str(region_error)}"})
+        if single:
+            result = pair_results[0]
+            result.pop("foreground_region")
+            result.pop("background_region")
+            return json.dumps(result)
 
-            foreground_hex = rgb_to_hex(foreground_color)
-            background_hex = rgb_to_hex(background_color)
-
-            return json.dumps(
-                {
-                    "foreground_color": foreground_hex,
-                    "background_color": background_hex,
-                    "contrast_ratio": round(contrast_ratio, 2),
-                    "wcag_compliance": {
-                        "AA": {
-                            "normal_text": wcag_aa_normal,
-                            "large_text": wcag_aa_large,
-                        },
-                        "AAA": {
-                            "normal_text": wcag_aaa_normal,
-                            "large_text": wcag_aaa_large,
-                        },
-                    },
-                    # "visualization_base64": result_img_base64,
-                }
-            )
+        result = {"image_dimensions": {"width": analyzer.width, "height": analyzer.height}}
+        if pairs:
+            result["pairs"] = pair_results
+            result["summary"] = summarize(pair_results)
+        if auto_detect:
+            text_regions = analyzer.detect_text_regions()
+            result["text_regions"] = text_regions
+            result["text_region_summary"] = summarize(text_regions)
+        if include_heatmap:
+            result["heatmap"] = analyzer.heatmap()
+        return json.dumps(result)
 
     except Exception as e:
         return json.dumps({"error": f"Failed to analyze color contrast: {str(e)}"})
@@ -1403,30 +1359,23 @@ async def check_color_contrast(data):
 async def check_image_specs(data):
     """Analyze the image specifications for compliance with brand guidelines."""
 
-    image_base64 = data.get("image_base64")
     required_width = data.get("required_width", 0)
     required_height = data.get("required_height", 0)
     min_resolution = data.get("min_resolution", 0)
     aspect_ratio = data.get("aspect_ratio", "any")
 
-    # Check if the base64 string exists
-    if not image_base64:
+    # Check if an image was provided
+    if not has_image(data):
         return json.dumps({"error": "No image provided."})
 
     try:
-        # Ensure correct padding for base64 string
-        padding_needed = len(image_base64) % 4
-        if padding_needed != 0:
-            image_base64 += "=" * (4 - padding_needed)  # Add padding if necessary
-
-        # Decode the base64 string into binary data
-        image_data = base64.b64decode(image_base64)
+        # Use the asset decoded once for this analysis
+        media = load_image(data)
 
         # Get file size in KB
-        file_size_kb = len(image_data) / 1024
+        file_size_kb = len(media.raw) / 1024
 
-        # Open the image using PIL
-        with Image.open(BytesIO(image_data)) as img:
+        with media.image() as img:
             # Get image dimensions
             width, height = img.size
 
@@ -1513,7 +1462,6 @@ async def check_image_specs(data):
 async def check_element_placement(data):
     """Analyze the placement, spacing, and alignment of elements in the image."""
 
-    image_base64 = data.get("image_base64")
     output_dir = data.get("output_directory", "compliance_results")
     min_spacing = data.get("min_spacing", 20)
     alignment_tolerance = data.get("alignment_tolerance", 5)
@@ -1582,8 +1530,8 @@ async def check_element_placement(data):
                 {"error": "Invalid safe zone format. Expected 'top,right,bottom,left'"}
             )
 
-    # Check if the base64 string exists
-    if not image_base64:
+    # Check if an image was provided
+    if not has_image(data):
         return json.dumps({"error": "No image provided."})
 
     # Validate primary element
@@ -1591,16 +1539,9 @@ async def check_element_placement(data):
         return json.dumps({"error": "Primary element region must be provided."})
 
     try:
-        # Ensure correct padding for base64 string
-        padding_needed = len(image_base64) % 4
-        if padding_needed != 0:
-            image_base64 += "=" * (4 - padding_needed)  # Add padding if necessary
-
-        # Decode the base64 string into binary data
-        image_data = base64.b64decode(image_base64)
-
-        # Open the image using PIL
-        with Image.open(BytesIO(image_data)) as img:
+        # Use the asset decoded once for this analysis
+        media = load_image(data)
+        with media.image() as img:
             # Get image dimensions
             width, height = img.size
 
@@ -1808,7 +1749,6 @@ async def check_element_placement(data):
 async def check_layout_consistency(data):
     """Analyze the layout consistency of an image against a grid system or template."""
 
-    image_base64 = data.get("image_base64")
     output_dir = data.get("output_directory", "compliance_results")
     alignment_tolerance = data.get("alignment_tolerance", 5)
 
@@ -1861,8 +1801,8 @@ async def check_layout_consistency(data):
                 }
             )
 
-    # Check if the base64 string exists
-    if not image_base64:
+    # Check if an image was provided
+    if not has_image(data):
         return json.dumps({"error": "No image provided."})
 
     # Validate elements
@@ -1870,16 +1810,9 @@ async def check_layout_consistency(data):
         return json.dumps({"error": "No elements provided to check against the grid."})
 
     try:
-        # Ensure correct padding for base64 string
-        padding_needed = len(image_base64) % 4
-        if padding_needed != 0:
-            image_base64 += "=" * (4 - padding_needed)  # Add padding if necessary
-
-        # Decode the base64 string into binary data
-        image_data = base64.b64decode(image_base64)
-
-        # Open the image using PIL
-        with Image.open(BytesIO(image_data)) as img:
+        # Use the asset decoded once for this analysis
+        media = load_image(data)
+        with media.image() as img:
             # Get image dimensions
             width, height = img.size
 
@@ -2111,162 +2044,86 @@ async def check_layout_consistency(data):
 
 async def check_image_clarity(data):
     """
-    Analyze the clarity and sharpness of a specific region in an image.
+    Analyze the clarity and sharpness of one or more regions in an image.
     This tool checks if elements like logos, text, or other brand assets are displayed with sufficient clarity.
+    Pass regions to score many elements in one call; the sharpness maps are computed once for all of them.
     """
     try:
         # Extract parameters
         region_coordinates = data.get("region_coordinates", "")
         element_type = data.get("element_type", "unknown")
         min_clarity_score = int(data.get("min_clarity_score", 80))  # Default to 80 if not provided
+        regions = data.get("regions") or []
+        include_region_image = bool(data.get("include_region_image", False))
 
-        # Get the image data
-        image_base64 = data.get("image_base64")
-        if not image_base64:
+        # Check the image data
+        if not has_image(data):
             return json.dumps({
                 "error": "No image data provided"
             })
 
-        # Parse region coordinates
-        try:
-            # Handle different coordinate formats
-            if isinstance(region_coordinates, str):
-                # Format: "x1,y1,x2,y2"
-                coords = region_coordinates.split(",")
-                if len(coords) == 4:
-                    x1, y1, x2, y2 = map(int, coords)
-                else:
-                    return json.dumps({
-                        "error": f"Invalid region_coordinates format: {region_coordinates}. Expected 'x1,y1,x2,y2'"
-                    })
-            else:
-                # If coordinates are provided in a different format, handle accordingly
-                return json.dumps({
-                    "error": f"Unsupported region_coordinates format: {type(region_coordinates)}"
-                })
-        except Exception as coord_error:
+        # A single region keeps the original response shape
+        single = not regions
+        if single:
+            regions = [{
+                "region_coordinates": region_coordinates,
+                "element_type": element_type,
+                "min_clarity_score": min_clarity_score
+            }]
+        if len(regions) > MAX_CLARITY_REGIONS:
             return json.dumps({
-                "error": f"Error parsing region coordinates: {str(coord_error)}"
+                "error": f"Too many regions, at most {MAX_CLARITY_REGIONS} are allowed."
             })
 
-        # Ensure the image is properly padded for base64 decoding
-        padding_needed = len(image_base64) % 4
-        if padding_needed != 0:
-            image_base64 += "=" * (4 - padding_needed)
-
-        # Decode the base64 image
+        # Use the asset decoded once for this analysis
         try:
-            image_data = base64.b64decode(image_base64)
-            from PIL import Image, ImageFilter
-            import numpy as np
-            from io import BytesIO
-
-            # Open the image
-            img = Image.open(BytesIO(image_data))
-
-            # Crop to the region of interest
-            region = img.crop((x1, y1, x2, y2))
-
-            # Save the region for result
-            buffer = BytesIO()
-            region.save(buffer, format="PNG")
-            region_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-            # Calculate multiple clarity metrics for more accurate assessment
-
-            # 1. Laplacian variance (higher variance = sharper image)
-            np_region = np.array(region.convert("L"))  # Convert to grayscale numpy array
-            laplacian = np.array([[0, 1, 0], [1, -4, 1], [0, 1, 0]])
-            conv = np.abs(np.convolve(np_region.flatten(), laplacian.flatten(), mode="same"))
-            laplacian_variance = np.var(conv)
-
-            # 2. Edge detection - more edges usually means sharper image
-            edge_image = region.filter(ImageFilter.FIND_EDGES)
-            edge_data = np.array(edge_image.convert("L"))
-            edge_mean = np.mean(edge_data)
-
-            # 3. High-frequency content analysis using FFT
-            from scipy import fftpack
-            f = np.fft.fft2(np_region)
-            fshift = np.fft.fftshift(f)
-            magnitude_spectrum = 20*np.log(np.abs(fshift))
-            # Calculate high frequency energy (higher frequencies are further from center)
-            h, w = magnitude_spectrum.shape
-            center_y, center_x = h//2, w//2
-            # Create a mask that weights pixels by distance from center
-            y, x = np.ogrid[:h, :w]
-            dist_from_center = np.sqrt((x - center_x)**2 + (y - center_y)**2)
-            # Normalize distances
-            max_dist = np.sqrt(center_x**2 + center_y**2)
-            normalized_dist = dist_from_center / max_dist
-            # Weight the magnitude spectrum by distance
-            weighted_spectrum = magnitude_spectrum * normalized_dist
-            high_freq_energy = np.sum(weighted_spectrum) / (h * w)
-
-            # Combine metrics with appropriate weights
-            # Adjust these weights based on testing with your specific images
-            if element_type.lower() == "logo":
-                # Logos need very high clarity - be more strict
-                max_expected_variance = 400  # Lower threshold for logos
-                edge_weight = 0.4
-                laplacian_weight = 0.4
-                high_freq_weight = 0.2
-
-                # For logos, we need to be more strict about the minimum score
-                if min_clarity_score < 85:
-                    min_clarity_score = 85  # Override to ensure logos are very clear
-            else:
-                # Other elements can be slightly less strict
-                max_expected_variance = 500
-                edge_weight = 0.3
-                laplacian_weight = 0.5
-                high_freq_weight = 0.2
-
-            # Calculate weighted clarity score (0-100)
-            laplacian_score = min(100, int((laplacian_variance / max_expected_variance) * 100))
-            edge_score = min(100, int((edge_mean / 50) * 100))  # Normalize to 0-100
-            high_freq_score = min(100, int((high_freq_energy / 30) * 100))  # Normalize to 0-100
-
-            clarity_score = int(
-                laplacian_score * laplacian_weight +
-                edge_score * edge_weight +
-                high_freq_score * high_freq_weight
-            )
+            media = load_image(data)
+            width, height = media.size
+
+            # Parse region coordinates
+            parsed = []
+            for region in regions:
+                if not isinstance(region, dict):
+                    region = {"region_coordinates": region}
+                try:
+                    x1, y1, x2, y2 = parse_region(region.get("region_coordinates", region), width, height)
+                    parsed.append({
+                        "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+                        "label": region.get("label"),
+                        "element_type": region.get("element_type", element_type),
+                        "min_clarity_score": int(region.get("min_clarity_score", min_clarity_score))
+                    })
+                except (TypeError, ValueError) as coord_error:
+                    return json.dumps({
+                        "error": f"Error parsing region coordinates: {str(coord_error)}"
+                    })
 
-            # Determine if the clarity meets the minimum requirement
-            meets_requirement = clarity_score >= min_clarity_score
+            results = []
+            for region, result in zip(parsed, score_regions(media.array, parsed)):
+                x1, y1, x2, y2 = region["x1"], region["y1"], region["x2"], region["y2"]
+                if region["label"]:
+                    result["label"] = region["label"]
+                result["region"] = f"({x1},{y1}) to ({x2},{y2})"
 
-            # Prepare the result
-            result = {
-                "element_type": element_type,
-                "region": f"({x1},{y1}) to ({x2},{y2})",
-                "clarity_score": clarity_score,
-                "min_required": min_clarity_score,
-                "meets_requirement": meets_requirement,
-                "assessment": "Clear" if meets_requirement else "Blurry",
-                "detailed_metrics": {
-                    "laplacian_score": laplacian_score,
-                    "edge_detection_score": edge_score,
-                    "high_frequency_score": high_freq_score
-                },
-                "region_image_base64": region_base64,
-                "recommendations": []
-            }
+                # The cropped region is only encoded when asked for
+                if include_region_image:
+                    from PIL import Image
+                    buffer = BytesIO()
+                    Image.fromarray(media.array[y1:y2, x1:x2], "RGB").save(buffer, format="PNG")
+                    result["region_image_base64"] = base64.b64encode(buffer.getvalue()).decode("utf-8")
+                results.append(result)
 
-            # Add recommendations if clarity is insufficient
-            if not meets_requirement:
-                result["recommendations"].append("Increase the resolution of the image")
-                result["recommendations"].append(f"Ensure the {element_type} is not obscured or blurred")
-                if element_type.lower() == "logo":
-                    result["recommendations"].append("⚠️ CRITICAL COMPLIANCE ISSUE: Logo blur detected")
-                    result["recommendations"].append("Use the vector version of the logo if available")
-                    result["recommendations"].append("Logo clarity is a mandatory brand requirement")
-                    # Add a more prominent warning in the assessment
-                    result["assessment"] = "⚠️ CRITICAL: Blurred Logo Detected"
-                elif element_type.lower() == "text":
-                    result["recommendations"].append("Increase the font size or use a clearer font")
+            if single:
+                return json.dumps(results[0])
 
-            return json.dumps(result)
+            return json.dumps({
+                "regions": results,
+                "summary": {
+                    "total": len(results),
+                    "meeting_requirement": sum(1 for r in results if r["meets_requirement"]),
+                    "min_clarity_score": min(r["clarity_score"] for r in results)
+                }
+            })
 
         except Exception as img_error:
             return json.dumps({
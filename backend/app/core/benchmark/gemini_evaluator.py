@@ -9,10 +9,13 @@ import json
 import time
 import asyncio
 import re
-import aiohttp
 from typing import Dict, List, Optional, Any
 import logging
 
+from openai import APIStatusError
+
+from app.core.openrouter_agent.client_registry import get_openrouter_client
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -112,9 +115,6 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 # Gemini model via OpenRouter
 GEMINI_MODEL = "anthropic/claude-3.7-sonnet"
 
-# OpenRouter API endpoint
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
-
 async def evaluate_with_gemini(
     expected_results: str,
     actual_results: str,
@@ -243,7 +243,7 @@ Incorrect font usage
                     }
                 })
 
-    # Call OpenRouter API directly using aiohttp
+    # Call OpenRouter API
     try:
         start_time = time.time()
 
@@ -260,155 +260,148 @@ Incorrect font usage
             # that's easier to parse reliably
         }
 
-        # Make the API call
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                OPENROUTER_API_URL,
-                headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json=payload
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"OpenRouter API error: {response.status} - {error_text}")
-                    return {
-                        "score": 0,
-                        "feedback": f"Evaluation failed: OpenRouter API error {response.status}",
-                        "missed_issues": [],
-                        "false_positives": [],
-                        "evaluation_time": time.time() - start_time
-                    }
+        # Make the API call on the shared, pooled OpenRouter client
+        client = get_openrouter_client(OPENROUTER_API_KEY)
+        try:
+            response = await client.chat.completions.create(**payload)
+        except APIStatusError as status_error:
+            logger.error(f"OpenRouter API error: {status_error.status_code} - {status_error.message}")
+            return {
+                "score": 0,
+                "feedback": f"Evaluation failed: OpenRouter API error {status_error.status_code}",
+                "missed_issues": [],
+                "false_positives": [],
+                "evaluation_time": time.time() - start_time
+            }
 
-                # Parse the response
-                result = await response.json()
+        # Parse the response
+        result = response.model_dump()
 
-                # Log the successful API call
-                logger.info(f"OpenRouter API call successful, received response")
+        # Log the successful API call
+        logger.info(f"OpenRouter API call successful, received response")
 
-                # Save the full response.json() in a txt file
-                # Create the file if it doesn't exist
-                with open("response.txt", "w+") as f:
-                    json.dump(result, f)
+        # Save the full response.json() in a txt file
+        # Create the file if it doesn't exist
+        with open("response.txt", "w+") as f:
+            json.dump(result, f)
 
-                # Extract the content from the response exactly as shown in the OpenRouter example
-                content = result["choices"][0]["message"]["content"]
+        # Extract the content from the response exactly as shown in the OpenRouter example
+        content = result["choices"][0]["message"]["content"]
 
-                # Log token usage if available
-                if "usage" in result:
-                    prompt_tokens = result["usage"].get("prompt_tokens", 0)
-                    completion_tokens = result["usage"].get("completion_tokens", 0)
-                    total_tokens = result["usage"].get("total_tokens", 0)
-                    logger.info(f"Token usage - Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {total_tokens}")
+        # Log token usage if available
+        if "usage" in result:
+            prompt_tokens = result["usage"].get("prompt_tokens", 0)
+            completion_tokens = result["usage"].get("completion_tokens", 0)
+            total_tokens = result["usage"].get("total_tokens", 0)
+            logger.info(f"Token usage - Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {total_tokens}")
 
-                # Parse the custom format response
-                try:
-                    # Log the content for debugging
-                    logger.info(f"Response content: {content[:200]}...")
+        # Parse the custom format response
+        try:
+            # Log the content for debugging
+            logger.info(f"Response content: {content[:200]}...")
 
-                    # Validate that content is a string
-                    if not isinstance(content, str):
-                        logger.warning(f"Content is not a string but {type(content)}. Converting to string.")
-                        content = str(content)
+            # Validate that content is a string
+            if not isinstance(content, str):
+                logger.warning(f"Content is not a string but {type(content)}. Converting to string.")
+                content = str(content)
 
-                    # Check if content is empty
-                    if not content or content.isspace():
-                        logger.error("Content is empty or whitespace")
-                        raise ValueError("Empty content")
+            # Check if content is empty
+            if not content or content.isspace():
+                logger.error("Content is empty or whitespace")
+                raise ValueError("Empty content")
 
-                    # Parse the custom format with sections separated by "----------"
-                    # We know exactly what sections to expect in what order
-                    sections = content.split("----------")
+            # Parse the custom format with sections separated by "----------"
+            # We know exactly what sections to expect in what order
+            sections = content.split("----------")
 
-                    # Initialize the evaluation dictionary
-                    evaluation = {
-                        "score": 0,
-                        "feedback": "",
-                        "missed_issues": [],
-                        "false_positives": []
-                    }
+            # Initialize the evaluation dictionary
+            evaluation = {
+                "score": 0,
+                "feedback": "",
+                "missed_issues": [],
+                "false_positives": []
+            }
 
-                    # We should have 4 sections: score, feedback, missed_issues, false_positives
-                    if len(sections) >= 4:
-                        # Extract score (first section)
-                        score_section = sections[0].strip()
-                        if "score:" in score_section.lower():
-                            score_text = score_section.split("score:", 1)[1].strip()
-                            try:
-                                evaluation["score"] = int(float(score_text))
-                            except (ValueError, TypeError):
-                                # If direct conversion fails, try to find any number in the text
-                                import re
-                                score_match = re.search(r'\d+', score_text)
-                                if score_match:
-                                    evaluation["score"] = int(score_match.group())
-
-                        # Extract feedback (second section)
-                        feedback_section = sections[1].strip()
-                        if "feedback:" in feedback_section.lower():
-                            evaluation["feedback"] = feedback_section.split("feedback:", 1)[1].strip()
-
-                        # Extract missed issues (third section)
-                        missed_section = sections[2].strip()
-                        if "missed_issues:" in missed_section.lower():
-                            missed_text = missed_section.split("missed_issues:", 1)[1].strip()
-                            if missed_text.lower() != "none":
-                                evaluation["missed_issues"] = [issue.strip() for issue in missed_text.split("\n") if issue.strip()]
-
-                        # Extract false positives (fourth section)
-                        if len(sections) > 3:
-                            false_pos_section = sections[3].strip()
-                            if "false_positives:" in false_pos_section.lower():
-                                false_pos_text = false_pos_section.split("false_positives:", 1)[1].strip()
-                                if false_pos_text.lower() != "none":
-                                    evaluation["false_positives"] = [issue.strip() for issue in false_pos_text.split("\n") if issue.strip()]
-
-                    logger.info(f"Successfully parsed custom format response: score={evaluation['score']}, feedback length={len(evaluation['feedback'])}, missed_issues={len(evaluation['missed_issues'])}, false_positives={len(evaluation['false_positives'])}")
+            # We should have 4 sections: score, feedback, missed_issues, false_positives
+            if len(sections) >= 4:
+                # Extract score (first section)
+                score_section = sections[0].strip()
+                if "score:" in score_section.lower():
+                    score_text = score_section.split("score:", 1)[1].strip()
+                    try:
+                        evaluation["score"] = int(float(score_text))
+                    except (ValueError, TypeError):
+                        # If direct conversion fails, try to find any number in the text
+                        import re
+                        score_match = re.search(r'\d+', score_text)
+                        if score_match:
+                            evaluation["score"] = int(score_match.group())
+
+                # Extract feedback (second section)
+                feedback_section = sections[1].strip()
+                if "feedback:" in feedback_section.lower():
+                    evaluation["feedback"] = feedback_section.split("feedback:", 1)[1].strip()
+
+                # Extract missed issues (third section)
+                missed_section = sections[2].strip()
+                if "missed_issues:" in missed_section.lower():
+                    missed_text = missed_section.split("missed_issues:", 1)[1].strip()
+                    if missed_text.lower() != "none":
+                        evaluation["missed_issues"] = [issue.strip() for issue in missed_text.split("\n") if issue.strip()]
+
+                # Extract false positives (fourth section)
+                if len(sections) > 3:
+                    false_pos_section = sections[3].strip()
+                    if "false_positives:" in false_pos_section.lower():
+                        false_pos_text = false_pos_section.split("false_positives:", 1)[1].strip()
+                        if false_pos_text.lower() != "none":
+                            evaluation["false_positives"] = [issue.strip() for issue in false_pos_text.split("\n") if issue.strip()]
+
+            logger.info(f"Successfully parsed custom format response: score={evaluation['score']}, feedback length={len(evaluation['feedback'])}, missed_issues={len(evaluation['missed_issues'])}, false_positives={len(evaluation['false_positives'])}")
+
+            # Add evaluation time
+            evaluation["evaluation_time"] = time.time() - start_time
+
+            # Add token usage if available
+            if "usage" in result:
+                evaluation["token_usage"] = result["usage"]
+
+            return evaluation
+
+        except Exception as e:
+            logger.error(f"Failed to parse custom format response: {str(e)}")
+
+            # Try JSON parsing as a fallback
+            try:
+                # Try to parse as JSON first
+                evaluation = json.loads(content)
+                logger.info("Successfully parsed as JSON content")
+
+                # Add evaluation time
+                evaluation["evaluation_time"] = time.time() - start_time
+
+                return evaluation
+            except json.JSONDecodeError:
+                # Try our safe_json_loads function as a second fallback
+                try:
+                    evaluation = safe_json_loads(content)
+                    logger.info("Successfully parsed using safe_json_loads")
 
                     # Add evaluation time
                     evaluation["evaluation_time"] = time.time() - start_time
 
-                    # Add token usage if available
-                    if "usage" in result:
-                        evaluation["token_usage"] = result["usage"]
-
                     return evaluation
+                except Exception as e2:
+                    logger.error(f"All parsing attempts failed: {str(e2)}")
 
-                except Exception as e:
-                    logger.error(f"Failed to parse custom format response: {str(e)}")
-
-                    # Try JSON parsing as a fallback
-                    try:
-                        # Try to parse as JSON first
-                        evaluation = json.loads(content)
-                        logger.info("Successfully parsed as JSON content")
-
-                        # Add evaluation time
-                        evaluation["evaluation_time"] = time.time() - start_time
-
-                        return evaluation
-                    except json.JSONDecodeError:
-                        # Try our safe_json_loads function as a second fallback
-                        try:
-                            evaluation = safe_json_loads(content)
-                            logger.info("Successfully parsed using safe_json_loads")
-
-                            # Add evaluation time
-                            evaluation["evaluation_time"] = time.time() - start_time
-
-                            return evaluation
-                        except Exception as e2:
-                            logger.error(f"All parsing attempts failed: {str(e2)}")
-
-                            # Return a basic evaluation
-                            return {
-                                "score": 0,
-                                "feedback": f"Failed to parse evaluation: {content[:500]}...",
-                                "missed_issues": [],
-                                "false_positives": [],
-                                "evaluation_time": time.time() - start_time
-                            }
+                    # Return a basic evaluation
+                    return {
+                        "score": 0,
+                        "feedback": f"Failed to parse evaluation: {content[:500]}...",
+                        "missed_issues": [],
+                        "false_positives": [],
+                        "evaluation_time": time.time() - start_time
+                    }
 
     except Exception as e:
         logger.error(f"Error evaluating with Gemini: {str(e)}")
@@ -0,0 +1,187 @@
+import os
+import time
+import asyncio
+import hashlib
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+
+OPENROUTER_HEADERS = {
+    "HTTP-Referer": "https://brandguideline.ai",
+    "X-Title": "Brand Compliance AI"
+}
+
+# Connection pool tuning, shared by every client in the registry
+POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", 100))
+POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", 20))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", 120))
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 10))
+# Streaming responses can pause for a long time between chunks; per-call timeouts still apply
+READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 600))
+
+ClientKey = Tuple[str, str, Tuple[Tuple[str, str], ...]]
+
+
+class LLMClientRegistry:
+    """Process-wide registry of long-lived AsyncOpenAI clients.
+
+    Clients are keyed by base URL, API key and default headers, and each one
+    owns a keep-alive httpx connection pool, so agents and helper calls reuse
+    warm TLS connections instead of building a client per request. Clients are
+    bound to the event loop that created them; a call from a different loop
+    (e.g. a script using asyncio.run repeatedly) gets a fresh client, and the
+    client it replaces is closed on its own loop, or at shutdown if that loop
+    is no longer running.
+    """
+
+    def __init__(self):
+        self.clients: Dict[ClientKey, Dict[str, Any]] = {}
+        # Replaced clients whose loop had stopped, closed in aclose()
+        self.retired: List[Dict[str, Any]] = []
+        self.stats = {
+            "clients_created": 0,
+            "clients_retired": 0,
+            "client_hits": 0,
+            "requests": 0,
+            "responses": 0,
+            "errors": 0
+        }
+
+    @staticmethod
+    def _make_key(base_url: str, api_key: Optional[str], headers: Optional[Dict[str, str]]) -> ClientKey:
+        key_hash = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+        return base_url, key_hash, tuple(sorted((headers or {}).items()))
+
+    @staticmethod
+    def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self.stats["requests"] += 1
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        self.stats["responses"] += 1
+        if response.status_code >= 400:
+            self.stats["errors"] += 1
+
+    def _create_http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]}
+        )
+
+    def _retire(self, entry: Dict[str, Any]) -> None:
+        """Close a client replaced by one for another event loop."""
+        self.stats["clients_retired"] += 1
+        old_loop = entry["loop"]
+        if old_loop is not None and old_loop.is_running() and not old_loop.is_closed():
+            # Its connections belong to the old loop, so close them there
+            asyncio.run_coroutine_threadsafe(entry["http_client"].aclose(), old_loop)
+        else:
+            self.retired.append(entry)
+
+    def get_client(
+        self,
+        api_key: Optional[str],
+        base_url: str = OPENROUTER_BASE_URL,
+        default_headers: Optional[Dict[str, str]] = None
+    ) -> AsyncOpenAI:
+        """Get the shared client for a base URL and credentials, creating it on first use.
+
+        Args:
+            api_key: API key for the service
+            base_url: Base URL of the OpenAI-compatible API
+            default_headers: Headers sent with every request
+
+        Returns:
+            Shared AsyncOpenAI client
+        """
+        key = self._make_key(base_url, api_key, default_headers)
+        loop = self._current_loop()
+        entry = self.clients.get(key)
+        if entry and (entry["loop"] is None or loop is None or entry["loop"] is loop):
+            if entry["loop"] is None:
+                entry["loop"] = loop
+            self.stats["client_hits"] += 1
+            return entry["client"]
+        if entry:
+            self._retire(entry)
+
+        http_client = self._create_http_client()
+        client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            default_headers=default_headers,
+            http_client=http_client
+        )
+        self.clients[key] = {
+            "client": client,
+            "http_client": http_client,
+            "loop": loop,
+            "base_url": base_url,
+            "created_at": time.time()
+        }
+        self.stats["clients_created"] += 1
+        print(f"\033[94m[LOG] LLMClientRegistry: Created pooled client for {base_url}\033[0m")
+        return client
+
+    async def startup(self) -> None:
+        """Create the clients used on the request path so the first request finds them ready."""
+        api_key = os.getenv("OPENROUTER_API_KEY")
+        if api_key:
+            self.get_client(api_key, default_headers=OPENROUTER_HEADERS)
+        google_api_key = os.getenv("GOOGLE_API_KEY")
+        if google_api_key:
+            self.get_client(google_api_key, base_url=GEMINI_BASE_URL)
+
+    async def aclose(self) -> None:
+        """Close every client and its connection pool."""
+        entries = list(self.clients.values()) + self.retired
+        self.clients.clear()
+        self.retired = []
+        for entry in entries:
+            try:
+                await entry["http_client"].aclose()
+            except Exception as e:
+                print(f"\033[91m[ERROR] Failed to close LLM client for {entry['base_url']}: {e}\033[0m")
+
+    def get_pool_metrics(self) -> Dict[str, Any]:
+        """Get registry counters and per-client connection pool state."""
+        pools = []
+        for entry in self.clients.values():
+            # httpx does not expose pool state publicly; read it from the transport when available
+            pool = getattr(getattr(entry["http_client"], "_transport", None), "_pool", None)
+            connections = list(getattr(pool, "connections", []) or [])
+            pools.append({
+                "base_url": entry["base_url"],
+                "age_seconds": round(time.time() - entry["created_at"], 1),
+                "connections": len(connections),
+                "idle_connections": sum(1 for c in connections if getattr(c, "is_idle", lambda: False)()),
+            })
+        return {**self.stats, "clients": len(self.clients), "pools": pools}
+
+
+# Shared registry for this process
+llm_clients = LLMClientRegistry()
+
+
+def get_openrouter_client(api_key: Optional[str]) -> AsyncOpenAI:
+    """Get the shared OpenRouter client for an API key."""
+    return llm_clients.get_client(api_key, default_headers=OPENROUTER_HEADERS)
+
+
+def get_gemini_client(api_key: Optional[str] = None) -> AsyncOpenAI:
+    """Get the shared client for Google's OpenAI-compatible Gemini endpoint."""
+    return llm_clients.get_client(api_key or os.getenv("GOOGLE_API_KEY"), base_url=GEMINI_BASE_URL)
@@ -0,0 +1,296 @@
+import json
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+# Empirical ratio for Claude models: 8468 chars = 1864 tokens
+CHARS_PER_TOKEN = 4.54
+
+# Bounds for the token cost of a single image
+MIN_IMAGE_TOKENS = 300
+MAX_IMAGE_TOKENS = 1500
+
+# Context window sizes by model prefix (first match wins)
+MODEL_CONTEXT_WINDOWS = [
+    ("anthropic/", 200000),
+    ("google/gemini", 1000000),
+    ("openai/o3", 200000),
+    ("openai/gpt-4o", 128000),
+    ("cohere/command-r", 128000),
+]
+DEFAULT_CONTEXT_WINDOW = 128000
+
+# Fraction of the context window kept free to absorb estimation error
+SAFETY_MARGIN = 0.1
+
+
+def get_context_window(model: Optional[str]) -> int:
+    """Get the context window size in tokens for a model."""
+    for prefix, window in MODEL_CONTEXT_WINDOWS:
+        if model and model.startswith(prefix):
+            return window
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def estimate_image_tokens(image_part: Dict[str, Any]) -> int:
+    """Estimate the token cost of a single image_url content part."""
+    url = image_part.get("image_url", {}).get("url", "")
+    if "base64," not in url:
+        # URL only, much smaller
+        return int(len(url) / CHARS_PER_TOKEN)
+
+    base64_part = url.split("base64,")[-1]
+    image_tokens = int(len(base64_part) * 0.05)  # ~1/20th of base64 length
+    return max(MIN_IMAGE_TOKENS, min(image_tokens, MAX_IMAGE_TOKENS))
+
+
+def estimate_message_tokens(message: Dict[str, Any]) -> int:
+    """Estimate the token cost of a single conversation message.
+
+    Every image in the message is counted, since every image is sent.
+    Tool call and tool response messages (dict content) are counted by
+    their serialized size.
+
+    Args:
+        message: Message in MessageHandler format
+
+    Returns:
+        Estimated token count
+    """
+    content = message.get("content")
+    total_chars = 0
+    image_tokens = 0
+
+    if isinstance(content, str):
+        total_chars += len(content)
+    elif isinstance(content, list):
+        for item in content:
+            if not isinstance(item, dict):
+                total_chars += len(str(item))
+            elif item.get("type") == "image_url":
+                image_tokens += estimate_image_tokens(item)
+            else:
+                total_chars += len(item.get("text", ""))
+    elif content is not None:
+        total_chars += len(json.dumps(content, default=str))
+
+    return int(total_chars / CHARS_PER_TOKEN) + image_tokens
+
+
+def _has_images(message: Dict[str, Any]) -> bool:
+    content = message.get("content")
+    return isinstance(content, list) and any(
+        isinstance(item, dict) and item.get("type") == "image_url" for item in content
+    )
+
+
+def _tool_call_ids(message: Dict[str, Any]) -> Optional[set]:
+    """Return the tool call IDs of an assistant tool_calls message, or None."""
+    content = message.get("content")
+    if message.get("role") == "assistant" and isinstance(content, dict) and "tool_calls" in content:
+        return {tc.get("id") for tc in content.get("tool_calls") or []}
+    return None
+
+
+class ContextManager:
+    """Token-budgeted view of the conversation for the OpenRouter agent.
+
+    Token costs are estimated once per message when it is added, so the running
+    total is maintained in O(1) per add instead of rescanning the history. When
+    the history exceeds the prompt budget, messages are evicted by policy:
+
+    1. Oldest tool_call/tool result groups (the most recent group is kept)
+    2. Large binary payloads - multi-image messages are thinned, keeping the
+       first and last image
+    3. Oldest remaining messages, keeping the first user message and the latest one
+
+    An assistant tool_calls message and its tool replies are always kept or
+    evicted together, so tool results are never orphaned.
+    """
+
+    def __init__(self, model: Optional[str] = None, reserved_output_tokens: int = 4000):
+        """Initialize the context manager.
+
+        Args:
+            model: Model identifier used to look up the context window
+            reserved_output_tokens: Tokens kept free for the model's response
+        """
+        self.token_counts: List[int] = []
+        self.total_tokens = 0
+        self.budget_scale = 1.0
+        self.set_model(model, reserved_output_tokens)
+
+    def set_model(self, model: Optional[str], reserved_output_tokens: Optional[int] = None, fallbacks: Sequence[str] = ()) -> None:
+        """Update the model (and optionally the output reservation) the budget is computed for.
+
+        Args:
+            model: Model identifier used to look up the context window
+            reserved_output_tokens: Tokens kept free for the model's response
+            fallbacks: Other models that may serve the request; the budget fits the smallest window
+        """
+        self.model = model
+        self.context_window = min(get_context_window(m) for m in [model, *fallbacks])
+        if reserved_output_tokens is not None:
+            self.reserved_output_tokens = reserved_output_tokens
+
+    def add(self, message: Dict[str, Any]) -> int:
+        """Account for a newly added message.
+
+        Args:
+            message: Message in MessageHandler format
+
+        Returns:
+            Estimated token cost of the message
+        """
+        tokens = estimate_message_tokens(message)
+        self.token_counts.append(tokens)
+        self.total_tokens += tokens
+        return tokens
+
+    @property
+    def budget(self) -> int:
+        """Token budget available for the prompt."""
+        usable = self.context_window * (1 - SAFETY_MARGIN) - self.reserved_output_tokens
+        return max(0, int(usable * self.budget_scale))
+
+    @property
+    def remaining(self) -> int:
+        """Tokens left in the budget before eviction starts."""
+        return self.budget - self.total_tokens
+
+    def shrink(self, factor: float = 0.75) -> int:
+        """Reduce the budget after a context-overflow error from the provider.
+
+        Args:
+            factor: Multiplier applied to the current budget scale
+
+        Returns:
+            The new budget in tokens
+        """
+        self.budget_scale = max(0.1, self.budget_scale * factor)
+        print(f"\033[93m[CONTEXT] Budget reduced to {self.budget} tokens ({self.budget_scale:.0%} of usable context)\033[0m")
+        return self.budget
+
+    def _group_units(self, messages: List[Dict[str, Any]]) -> List[Tuple[str, List[int]]]:
+        """Group message indices into eviction units.
+
+        Returns:
+            List of (kind, indices) where kind is system, tool_group or message
+        """
+        units = []
+        i = 0
+        while i < len(messages):
+            message = messages[i]
+            if message.get("role") == "system":
+                units.append(("system", [i]))
+                i += 1
+                continue
+
+            ids = _tool_call_ids(message)
+            if ids is not None:
+                indices = [i]
+                i += 1
+                while i < len(messages) and messages[i].get("role") == "tool":
+                    indices.append(i)
+                    i += 1
+                units.append(("tool_group", indices))
+                continue
+
+            if message.get("role") == "tool" and units and units[-1][0] == "tool_group":
+                # Stray tool reply following a group - keep it with that group
+                units[-1][1].append(i)
+            else:
+                units.append(("tool_group" if message.get("role") == "tool" else "message", [i]))
+            i += 1
+        return units
+
+    def select(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Select the messages to send so the prompt fits the token budget.
+
+        Args:
+            messages: Full conversation in MessageHandler format, aligned with
+                the messages passed to add()
+
+        Returns:
+            Messages to send, in conversation order. Thinned messages are copies;
+            the input list is not modified.
+        """
+        budget = self.budget
+        total = self.total_tokens
+        if total <= budget or len(self.token_counts) != len(messages):
+            return list(messages)
+
+        units = self._group_units(messages)
+        unit_tokens = [sum(self.token_counts[i] for i in indices) for _, indices in units]
+        dropped = set()
+        replaced: Dict[int, Dict[str, Any]] = {}
+
+        # 1. Oldest tool results first, keeping the most recent group
+        tool_units = [n for n, (kind, _) in enumerate(units) if kind == "tool_group"]
+        for n in tool_units[:-1]:
+            if total <= budget:
+                break
+            dropped.add(n)
+            total -= unit_tokens[n]
+
+        # 2. Thin large binary payloads, largest first
+        if total > budget:
+            image_indices = [
+                i for n, (kind, indices) in enumerate(units) if n not in dropped
+                for i in indices if _has_images(messages[i])
+            ]
+            for i in sorted(image_indices, key=lambda idx: self.token_counts[idx], reverse=True):
+                if total <= budget:
+                    break
+                thinned, saved = self._thin_images(messages[i], total - budget)
+                if saved:
+                    replaced[i] = thinned
+                    total -= saved
+
+        # 3. Oldest remaining messages, keeping the first user message and the latest unit
+        if total > budget:
+            first_user = next((n for n, (kind, indices) in enumerate(units)
+                               if kind == "message" and messages[indices[0]].get("role") == "user"), None)
+            candidates = [n for n, (kind, _) in enumerate(units)
+                          if kind != "system" and n not in dropped and n != first_user]
+            for n in candidates[:-1]:
+                if total <= budget:
+                    break
+                dropped.add(n)
+                total -= sum(
+                    estimate_message_tokens(replaced[i]) if i in replaced else self.token_counts[i]
+                    for i in units[n][1]
+                )
+
+        evicted = sum(len(units[n][1]) for n in dropped)
+        print(f"\033[93m[CONTEXT] History of {self.total_tokens} tokens exceeds budget of {budget}; "
+              f"evicted {evicted} messages, thinned {len(replaced)}, sending ~{total} tokens\033[0m")
+
+        selected = []
+        for n, (_, indices) in enumerate(units):
+            if n in dropped:
+                continue
+            for i in indices:
+                selected.append(replaced.get(i, messages[i]))
+        return selected
+
+    def _thin_images(self, message: Dict[str, Any], excess: int) -> Tuple[Dict[str, Any], int]:
+        """Drop every other image from a multi-image message until the excess is covered.
+
+        The first and last images are always kept.
+
+        Returns:
+            Tuple of (thinned message copy, tokens saved)
+        """
+        content = list(message["content"])
+        image_positions = [p for p, item in enumerate(content)
+                           if isinstance(item, dict) and item.get("type") == "image_url"]
+        saved = 0
+        while len(image_positions) > 2 and saved < excess:
+            removable = image_positions[1:-1:2]
+            for p in removable:
+                saved += estimate_image_tokens(content[p])
+            removable_set = set(removable)
+            content = [item for p, item in enumerate(content) if p not in removable_set]
+            image_positions = [p for p, item in enumerate(content)
+                               if isinstance(item, dict) and item.get("type") == "image_url"]
+
+        return {**message, "content": content}, saved
@@ -0,0 +1,194 @@
+import json
+import queue
+import atexit
+import base64
+import hashlib
+import binascii
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+# Directory for the per-conversation JSONL journals
+JOURNAL_DIR = Path("logs/conversations")
+
+# Side store for binary payloads, addressed by the SHA-256 of the decoded bytes
+BLOB_DIR = Path("logs/blobs")
+
+# Keys whose string values carry base64 media
+BINARY_KEYS = {"image_base64", "images_base64", "image_data", "images_data", "base64"}
+
+# Strings shorter than this are kept inline even under a binary key
+BLOB_MIN_CHARS = 1024
+
+# Maximum number of records waiting for the writer before new ones are dropped
+MAX_PENDING_RECORDS = 10000
+
+
+def snapshot(value: Any) -> Any:
+    """Copy the container structure of a value.
+
+    Strings are immutable and shared, so this is cheap and protects the
+    journal record from later in-place edits of the conversation.
+    """
+    if isinstance(value, dict):
+        return {k: snapshot(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [snapshot(v) for v in value]
+    return value
+
+
+def _split_data_url(value: str) -> Tuple[Optional[str], str]:
+    """Split a data URL into (media type, base64 payload); media type is None for bare base64."""
+    if value.startswith("data:") and ";base64," in value[:100]:
+        header, payload = value.split(",", 1)
+        return header[5:].split(";")[0], payload
+    return None, value
+
+
+class JournalWriter:
+    """Background thread that appends journal records to disk.
+
+    Records are queued from the event loop without blocking and written by a
+    single daemon thread. Base64 payloads are decoded, stored once in the blob
+    store and replaced by content-hash references.
+    """
+
+    def __init__(self, blob_dir: Path = BLOB_DIR, max_pending: int = MAX_PENDING_RECORDS):
+        self.blob_dir = blob_dir
+        self.queue: "queue.Queue[Optional[Tuple[Path, Dict[str, Any]]]]" = queue.Queue(maxsize=max_pending)
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.stats = {
+            "records_written": 0,
+            "records_dropped": 0,
+            "blobs_written": 0,
+            "blob_bytes_written": 0,
+            "errors": 0
+        }
+
+    def _ensure_started(self) -> None:
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="conversation-journal", daemon=True)
+                self.thread.start()
+
+    def submit(self, path: Path, record: Dict[str, Any]) -> bool:
+        """Queue a record for appending to a journal file.
+
+        Returns:
+            True if queued, False if the queue is full and the record was dropped
+        """
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((path, record))
+            return True
+        except queue.Full:
+            self.stats["records_dropped"] += 1
+            print(f"\033[93m[WARNING] Conversation journal queue full, dropping record for {path.name}\033[0m")
+            return False
+
+    def _store_blob(self, value: str) -> Any:
+        """Store a base64 payload in the blob store and return a reference to it."""
+        media_type, payload = _split_data_url(value)
+        try:
+            data = base64.b64decode(payload + "=" * (-len(payload) % 4))
+        except (binascii.Error, ValueError):
+            return value
+
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self.blob_dir / digest
+        if not blob_path.exists():
+            self.blob_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob_path.with_suffix(".tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(blob_path)
+            self.stats["blobs_written"] += 1
+            self.stats["blob_bytes_written"] += len(data)
+
+        ref = {"$blob": f"sha256:{digest}", "bytes": len(data)}
+        if media_type:
+            ref["media_type"] = media_type
+        return ref
+
+    def _externalize(self, value: Any, key: Optional[str] = None) -> Any:
+        """Replace base64 payloads in a record with blob references."""
+        if isinstance(value, dict):
+            return {k: self._externalize(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._externalize(v, key) for v in value]
+        if isinstance(value, str) and len(value) >= BLOB_MIN_CHARS:
+            if (key in BINARY_KEYS) or value.startswith("data:"):
+                return self._store_blob(value)
+        return value
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            path, record = item
+            try:
+                line = json.dumps(self._externalize(record), default=str)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a") as f:
+                    f.write(line + "\n")
+                self.stats["records_written"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"\033[91m[ERROR] Failed to write conversation journal record: {e}\033[0m")
+            finally:
+                self.queue.task_done()
+
+    def flush(self) -> None:
+        """Block until all queued records have been written."""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    def close(self) -> None:
+        """Flush pending records and stop the writer thread."""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=10)
+        self.thread = None
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get writer statistics."""
+        return {**self.stats, "pending": self.queue.qsize()}
+
+
+# Shared writer for all conversations in this process
+journal_writer = JournalWriter()
+atexit.register(journal_writer.close)
+
+
+class ConversationJournal:
+    """Append-only JSONL journal of one conversation.
+
+    Each message becomes one line in logs/conversations/<conversation_id>.jsonl.
+    Appending only snapshots the message; serialization, blob extraction and
+    file I/O happen on the shared background writer.
+    """
+
+    def __init__(self, conversation_id: str, journal_dir: Path = JOURNAL_DIR, writer: JournalWriter = journal_writer):
+        self.conversation_id = conversation_id
+        self.path = journal_dir / f"{conversation_id}.jsonl"
+        self.writer = writer
+        self.seq = 0
+
+    def append(self, message: Dict[str, Any]) -> bool:
+        """Queue a message for appending to the journal.
+
+        Args:
+            message: Message in MessageHandler format
+
+        Returns:
+            True if the record was queued
+        """
+        record = {
+            "conversation_id": self.conversation_id,
+            "seq": self.seq,
+            **snapshot(message)
+        }
+        self.seq += 1
+        return self.writer.submit(self.path, record)
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import hashlib
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from app.core.openrouter_agent.conversation_journal import snapshot
+
+# Directory for the per-conversation trace files
+TRACE_DIR = Path("logs/llm_traces")
+
+# Fraction of conversations whose LLM requests are traced (0 disables tracing)
+TRACE_SAMPLE_RATE = float(os.getenv("LLM_TRACE_SAMPLE_RATE", 0.05))
+
+# Maximum number of traces waiting for the writer before new ones are dropped
+MAX_PENDING_TRACES = int(os.getenv("LLM_TRACE_MAX_PENDING", 100))
+
+# Maximum serialized size of a single trace; longer text fields are truncated to fit
+MAX_TRACE_BYTES = int(os.getenv("LLM_TRACE_MAX_BYTES", 512 * 1024))
+
+
+def _compact_image(url: str) -> Dict[str, Any]:
+    """Replace an image URL with its hash and size."""
+    if url.startswith("data:") and ";base64," in url[:100]:
+        header, payload = url.split(",", 1)
+        return {
+            "type": "image",
+            "media_type": header[5:].split(";")[0],
+            "sha256": hashlib.sha256(payload.encode()).hexdigest(),
+            "base64_chars": len(payload)
+        }
+    return {"type": "image", "url": url}
+
+
+def _compact_content(content: Any) -> Any:
+    """Compact message content: full text, hashes and sizes for images."""
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, dict) and part.get("type") == "image_url":
+                parts.append(_compact_image(part.get("image_url", {}).get("url", "")))
+            else:
+                parts.append(part)
+        return parts
+    return content
+
+
+def _truncate_texts(messages: List[Dict[str, Any]], max_chars: int) -> int:
+    """Truncate text fields longer than max_chars in place.
+
+    Returns:
+        Number of fields truncated
+    """
+    truncated = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str) and len(content) > max_chars:
+            message["content"] = f"{content[:max_chars]}...[truncated {len(content) - max_chars} chars]"
+            truncated += 1
+        elif isinstance(content, list):
+            for part in content:
+                text = part.get("text") if isinstance(part, dict) else None
+                if isinstance(text, str) and len(text) > max_chars:
+                    part["text"] = f"{text[:max_chars]}...[truncated {len(text) - max_chars} chars]"
+                    truncated += 1
+    return truncated
+
+
+class LLMTracer:
+    """Sampled tracing of the requests sent to the LLM.
+
+    Sampling is decided per conversation, so a sampled conversation is traced
+    on every iteration. trace() only snapshots the messages and enqueues them;
+    compaction, hashing and file I/O run on a background writer thread, keeping
+    disk latency off the request path. Traces are appended as compact JSONL
+    records to logs/llm_traces/<conversation_id>.jsonl.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        max_pending: int = MAX_PENDING_TRACES,
+        max_trace_bytes: int = MAX_TRACE_BYTES,
+        trace_dir: Path = TRACE_DIR
+    ):
+        self.sample_rate = sample_rate
+        self.max_trace_bytes = max_trace_bytes
+        self.trace_dir = trace_dir
+        self.queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_pending)
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.stats = {
+            "traces_written": 0,
+            "traces_dropped": 0,
+            "traces_truncated": 0,
+            "bytes_written": 0,
+            "errors": 0
+        }
+
+    def is_sampled(self, conversation_id: str) -> bool:
+        """Decide deterministically whether a conversation is traced."""
+        if self.sample_rate <= 0:
+            return False
+        if self.sample_rate >= 1:
+            return True
+        bucket = int(hashlib.md5(conversation_id.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return bucket < self.sample_rate
+
+    def trace(
+        self,
+        conversation_id: str,
+        messages: List[Dict[str, Any]],
+        model: str,
+        kind: str = "iteration",
+        iteration: Optional[int] = None
+    ) -> bool:
+        """Queue a trace of an LLM request if the conversation is sampled.
+
+        Args:
+            conversation_id: Conversation the request belongs to
+            messages: Messages being sent to the LLM
+            model: Model the request is sent to
+            kind: Request kind, e.g. iteration or final_report
+            iteration: Agent loop iteration, if any
+
+        Returns:
+            True if a trace was queued
+        """
+        if not self.is_sampled(conversation_id):
+            return False
+
+        self._ensure_started()
+        try:
+            self.queue.put_nowait({
+                "trace_id": str(uuid.uuid4()),
+                "conversation_id": conversation_id,
+                "kind": kind,
+                "iteration": iteration,
+                "timestamp": time.time(),
+                "model": model,
+                "messages": snapshot(messages)
+            })
+            return True
+        except queue.Full:
+            self.stats["traces_dropped"] += 1
+            return False
+
+    def _ensure_started(self) -> None:
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="llm-tracer", daemon=True)
+                self.thread.start()
+
+    def _serialize(self, trace: Dict[str, Any]) -> str:
+        """Compact a trace and serialize it within the size cap."""
+        messages = [{**message, "content": _compact_content(message.get("content"))} for message in trace["messages"]]
+        trace["message_count"] = len(messages)
+        trace["messages"] = messages
+        line = json.dumps(trace, default=str)
+
+        # Halve the allowed text length until the trace fits
+        max_chars = self.max_trace_bytes
+        while len(line) > self.max_trace_bytes and max_chars > 256:
+            max_chars //= 2
+            if _truncate_texts(messages, max_chars):
+                trace["truncated"] = True
+                line = json.dumps(trace, default=str)
+        if trace.get("truncated"):
+            self.stats["traces_truncated"] += 1
+        return line
+
+    def _run(self) -> None:
+        while True:
+            trace = self.queue.get()
+            if trace is None:
+                self.queue.task_done()
+                break
+            try:
+                line = self._serialize(trace)
+                self.trace_dir.mkdir(parents=True, exist_ok=True)
+                with open(self.trace_dir / f"{trace['conversation_id']}.jsonl", "a") as f:
+                    f.write(line + "\n")
+                self.stats["traces_written"] += 1
+                self.stats["bytes_written"] += len(line) + 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"\033[91m[ERROR] Failed to write LLM trace: {e}\033[0m")
+            finally:
+                self.queue.task_done()
+
+    def close(self) -> None:
+        """Flush pending traces and stop the writer thread."""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=10)
+        self.thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get tracer statistics."""
+        return {**self.stats, "pending": self.queue.qsize(), "sample_rate": self.sample_rate}
+
+
+# Shared tracer for this process
+llm_tracer = LLMTracer()
+atexit.register(llm_tracer.close)
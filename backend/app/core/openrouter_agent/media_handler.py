@@ -1,10 +1,24 @@
 from typing import Dict, Any, List, Optional
 
+# Tools that analyze the image asset; they accept an image_handle
+IMAGE_TOOLS = {
+    "get_image_color_scheme",
+    "get_image_fonts",
+    "get_region_color_scheme",
+    "match_brand_colors",
+    "check_color_contrast",
+    "check_image_specs",
+    "check_element_placement",
+    "check_layout_consistency",
+    "check_image_clarity",
+}
+
 def inject_image_data(
     tool_name: str,
     tool_args: Dict[str, Any],
     image_base64: Optional[str] = None,
-    frames: Optional[List[Dict[str, Any]]] = None
+    frames: Optional[List[Dict[str, Any]]] = None,
+    image_handle: Optional[str] = None
 ) -> Dict[str, Any]:
     """Inject image or video frame data into tool arguments before execution.
 
@@ -13,12 +27,21 @@ def inject_image_data(
         tool_args: Arguments to pass to the tool
         image_base64: Optional base64-encoded image
         frames: Optional list of video frames with timestamps
+        image_handle: Optional media store handle of the decoded image; image
+            tools get the handle instead of a copy of the base64 string
 
     Returns:
         Updated tool arguments dictionary with injected image data
     """
     # Return early if no image data to inject or tool_args isn't a dict
-    if not isinstance(tool_args, dict) or (not image_base64 and not frames):
+    if not isinstance(tool_args, dict) or (not image_base64 and not frames and not image_handle):
+        return tool_args
+
+    # Image analyses: pass the handle of the decoded asset
+    if image_handle and not frames:
+        if tool_name in IMAGE_TOOLS:
+            tool_args["image_handle"] = image_handle
+            print(f"\033[92m[LOG] Added image handle for tool {tool_name}\033[0m")
         return tool_args
 
     # These tools expect images_base64 (array format)
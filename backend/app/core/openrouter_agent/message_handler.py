@@ -1,13 +1,15 @@
-import json
 import datetime
 from typing import Dict, Any, List, Optional, Callable, Awaitable
 from pathlib import Path
 
+from app.core.openrouter_agent.context_manager import ContextManager
+from app.core.openrouter_agent.conversation_journal import ConversationJournal
+
 class MessageHandler:
     """A class to handle message operations for the OpenRouter agent.
     
     This handles adding messages to the conversation, streaming responses,
-    and optional file-based logging.
+    and optional append-only journaling to disk.
     """
     
     def __init__(
@@ -15,18 +17,21 @@ class MessageHandler:
         conversation_id: str,
         on_stream: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
         save_messages: bool = True,
+        context_manager: Optional[ContextManager] = None,
     ):
         self.conversation_id = conversation_id
         self.on_stream = on_stream
         self.save_messages = save_messages
         self.messages = []
+        # Tracks per-message token costs as messages are added
+        self.context = context_manager or ContextManager()
         
-        # Set up logging if enabled
+        # Set up journaling if enabled
+        self.journal = None
         if self.save_messages:
-            self.logs_dir = Path("logs/conversations")
-            self.logs_dir.mkdir(parents=True, exist_ok=True)
-            self.messages_file = self.logs_dir / f"{self.conversation_id}.json"
-            print(f"\033[94m[LOG] MessageHandler: Messages will be saved to {self.messages_file}\033[0m")
+            self.journal = ConversationJournal(self.conversation_id)
+            self.messages_file = self.journal.path
+            print(f"\033[94m[LOG] MessageHandler: Messages will be journaled to {self.messages_file}\033[0m")
     
     async def add_message(self, role: str, content: Any):
         """Add a message to the conversation history.
@@ -41,28 +46,10 @@ class MessageHandler:
             "timestamp": datetime.datetime.now().isoformat()
         }
         self.messages.append(message)
-        # Save messages in real-time if enabled
-        await self.save_messages_to_file()
-    
-    async def save_messages_to_file(self):
-        """Save current messages to a JSON file in real-time."""
-        if not self.save_messages:
-            return
-
-        try:
-            timestamp = datetime.datetime.now().isoformat()
-            data = {
-                "conversation_id": self.conversation_id,
-                "timestamp": timestamp,
-                "messages": self.messages
-            }
-
-            with open(self.messages_file, 'w') as f:
-                json.dump(data, f, indent=2, default=str)
-
-            print(f"\033[92m[LOG] Saved messages to {self.messages_file}\033[0m")
-        except Exception as e:
-            print(f"\033[91m[ERROR] Failed to save messages to file: {e}\033[0m")
+        self.context.add(message)
+        # Journal the message in the background if enabled
+        if self.journal:
+            self.journal.append(message)
     
     async def stream_content(self, content: str):
         """Stream text content to the client.
@@ -108,19 +95,24 @@ class MessageHandler:
                 "content": content
             })
     
-    def get_formatted_messages(self, max_messages=None):
+    def get_formatted_messages(self, max_messages=None, fit_budget: bool = False):
         """Format messages for the OpenAI API, optionally limiting to the most recent messages.
         
         Args:
             max_messages: If provided, limit to this many most recent non-system messages
                           while keeping all system messages.
+            fit_budget: If True, evict messages by the context manager's policy so the
+                        prompt fits its token budget. Tool calls and their results are
+                        kept or evicted together.
                           
         Returns:
             List of formatted messages for the API
         """
+        messages = self.context.select(self.messages) if fit_budget else self.messages
+
         # Always include all system messages
-        system_messages = [m for m in self.messages if m["role"] == "system"]
-        non_system_messages = [m for m in self.messages if m["role"] != "system"]
+        system_messages = [m for m in messages if m["role"] == "system"]
+        non_system_messages = [m for m in messages if m["role"] != "system"]
         
         # Combine system and limited non-system messages
         formatted_messages = []
@@ -218,53 +210,14 @@ class MessageHandler:
         return formatted_messages
         
     def get_message_token_estimate(self) -> int:
-        """Get a rough estimate of the total token count for all messages.
+        """Get the estimated total token count for all messages.
         
-        This is an approximation to help with context management.
-        4 characters ~= 1 token as a rough rule of thumb.
-        For image data, we use a more realistic token estimation.
+        Per-message costs are computed once when messages are added, so this
+        is O(1) rather than a rescan of the conversation.
         
         Returns:
             Estimated token count
         """
-        total_chars = 0
-        image_already_counted = False  # Only count the first image fully
-        
-        for message in self.messages:
-            # Count text content
-            if isinstance(message["content"], str):
-                total_chars += len(message["content"])
-            # Count multimodal content
-            elif isinstance(message["content"], list):
-                for item in message["content"]:
-                    if item.get("type") == "text":
-                        total_chars += len(item.get("text", ""))
-                    elif item.get("type") == "image_url" and not image_already_counted:
-                        # Images use a lot of tokens (base64 encoding)
-                        url = item.get("image_url", {}).get("url", "")
-                        detail_level = item.get("image_url", {}).get("detail", "high")
-                        
-                        if "base64" in url:
-                            # Get base64 length as approximation of image size
-                            base64_part = url.split("base64,")[-1] if "base64," in url else url
-                            image_size_kb = len(base64_part) / 1024
-                            
-                            # More realistic token estimate for images
-                            token_multiplier = 0.05  # Much lower multiplier - 1/20th of base64 length
-                            image_tokens = int(len(base64_part) * token_multiplier)
-                            
-                            # Set reasonable bounds
-                            image_tokens = max(300, min(image_tokens, 1500))
-                            total_chars += image_tokens * 4  # Convert tokens to chars
-                            image_already_counted = True
-                            print(f"\033[94m[INFO] Estimated image tokens: {image_tokens} (image size: {image_size_kb:.1f}KB)\033[0m")
-                        else:
-                            # URL only, much smaller
-                            total_chars += len(url)
-        
-        # More accurate estimation based on empirical data: 1 token ~= 4.54 characters for Claude models
-        # (From the provided ratio: 8468 chars = 1864 tokens)
-        CHARS_PER_TOKEN = 4.54
-        estimated_tokens = int(total_chars / CHARS_PER_TOKEN)
-        print(f"\033[94m[TOKEN INFO] Total characters: {total_chars}, Estimated tokens: {estimated_tokens} (using ratio of {CHARS_PER_TOKEN} chars/token)\033[0m")
+        estimated_tokens = self.context.total_tokens
+        print(f"\033[94m[TOKEN INFO] Estimated tokens: {estimated_tokens} (budget: {self.context.budget})\033[0m")
         return estimated_tokens
@@ -0,0 +1,310 @@
+import os
+import time
+import asyncio
+from collections import deque
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple, AsyncIterator
+
+# Number of recent calls kept per model for latency and error statistics
+STATS_WINDOW = int(os.getenv("MODEL_STATS_WINDOW", 50))
+
+# Samples needed before the p95 latency is trusted for the hedge deadline
+MIN_LATENCY_SAMPLES = 5
+
+# Hedge deadline: p95 time-to-first-token times a slack factor, clamped to these bounds
+HEDGING_ENABLED = os.getenv("MODEL_HEDGING_ENABLED", "true").lower() != "false"
+HEDGE_SLACK = 1.2
+DEFAULT_HEDGE_DEADLINE = float(os.getenv("MODEL_HEDGE_DEFAULT_DEADLINE", 10))
+MIN_HEDGE_DEADLINE = 2.0
+MAX_HEDGE_DEADLINE = 30.0
+
+# Circuit breaker: open after consecutive failures, probe again after the cooldown
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_COOLDOWN = float(os.getenv("MODEL_CIRCUIT_COOLDOWN", 60))
+
+# Status codes that mean the request itself is bad; other models would reject it too.
+# 404 is left out: it usually means this model is unavailable, which another model can fix
+REQUEST_ERROR_STATUS_CODES = {400, 401, 403, 413, 422}
+
+
+def is_request_error(error: BaseException) -> bool:
+    """Check whether an error is caused by the request rather than the model or provider."""
+    if "Provider returned error" in str(error):
+        return False
+    return getattr(error, "status_code", None) in REQUEST_ERROR_STATUS_CODES
+
+
+class ModelStats:
+    """Rolling latency and error statistics for one model, with a circuit breaker."""
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.latencies: deque = deque(maxlen=window)
+        self.outcomes: deque = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+
+    def record_latency(self, latency: float) -> None:
+        self.latencies.append(latency)
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        if latency is not None:
+            self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            # (Re)open the circuit; a failed half-open probe restarts the cooldown
+            self.opened_at = time.time()
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    @property
+    def circuit_state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.time() - self.opened_at >= CIRCUIT_COOLDOWN:
+            return "half_open"
+        return "open"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "samples": len(self.outcomes),
+            "p50_latency": self.percentile(0.5),
+            "p95_latency": self.percentile(0.95),
+            "error_rate": round(self.error_rate, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "circuit": self.circuit_state
+        }
+
+
+class ModelRouter:
+    """Latency-aware routing with hedged requests across a primary and fallback models.
+
+    The primary request gets a deadline derived from the model's rolling p95
+    time-to-first-token. If no first token arrives in time, a hedged request is
+    sent to the next-best model; whichever streams first wins and the other is
+    cancelled. Model and provider errors fail over to the next candidate
+    immediately; errors caused by the request itself are raised. Models with
+    repeated failures have their circuit opened and are skipped until the
+    cooldown expires.
+    """
+
+    def __init__(self, hedging_enabled: bool = HEDGING_ENABLED):
+        self.hedging_enabled = hedging_enabled
+        self.models: Dict[str, ModelStats] = {}
+        self.stats = {"requests": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0}
+
+    def _get(self, model: str) -> ModelStats:
+        if model not in self.models:
+            self.models[model] = ModelStats()
+        return self.models[model]
+
+    def record_success(self, model: str, latency: Optional[float] = None) -> None:
+        """Record a successful call, and its time to first token if not recorded yet."""
+        self._get(model).record_success(latency)
+
+    def record_failure(self, model: str) -> None:
+        """Record a failed call, including failures after streaming started."""
+        self._get(model).record_failure()
+
+    def hedge_deadline(self, model: str) -> float:
+        """Seconds to wait for the first token before hedging."""
+        stats = self._get(model)
+        p95 = stats.percentile(0.95)
+        if p95 is None or len(stats.latencies) < MIN_LATENCY_SAMPLES:
+            return DEFAULT_HEDGE_DEADLINE
+        return max(MIN_HEDGE_DEADLINE, min(p95 * HEDGE_SLACK, MAX_HEDGE_DEADLINE))
+
+    def rank(self, primary: str, fallbacks: List[str]) -> List[str]:
+        """Order candidate models for a request.
+
+        Healthy models come first, the primary ahead of the fallbacks, which are
+        ordered by error rate and median latency. Models whose last call failed
+        follow, and models with an open circuit are skipped unless nothing else
+        is available.
+        """
+        candidates = list(dict.fromkeys([primary] + list(fallbacks)))
+
+        def score(model: str) -> Tuple:
+            stats = self._get(model)
+            p50 = stats.percentile(0.5)
+            return (
+                model != primary,
+                round(stats.error_rate, 1),
+                p50 if p50 is not None else DEFAULT_HEDGE_DEADLINE
+            )
+
+        available = [m for m in candidates if self._get(m).circuit_state != "open"]
+        healthy = sorted((m for m in available if self._get(m).consecutive_failures == 0), key=score)
+        degraded = sorted((m for m in available if self._get(m).consecutive_failures > 0), key=score)
+        ranked = healthy + degraded
+        if not ranked:
+            # Every circuit is open - try the one that opened first
+            ranked = sorted(candidates, key=lambda m: self._get(m).opened_at or 0)[:1]
+        return ranked
+
+    async def _start(
+        self,
+        create: Callable[[str], Awaitable[Any]],
+        model: str,
+        stream: bool
+    ) -> Tuple[Any, Any]:
+        """Send a request and wait for its first chunk (or full response when not streaming).
+
+        A full response counts as a success right away. For streams only the time
+        to first token is recorded here; the stream counts as a success once it
+        completes, so failures in the middle of a stream keep counting towards
+        the circuit breaker.
+        """
+        started = time.time()
+        response = await create(model)
+        first_chunk = None
+        if stream:
+            try:
+                first_chunk = await response.__anext__()
+            except StopAsyncIteration:
+                first_chunk = None
+            except BaseException:
+                await _close(response)
+                raise
+        if stream:
+            self._get(model).record_latency(time.time() - started)
+        else:
+            self.record_success(model, time.time() - started)
+        return response, first_chunk
+
+    async def create(
+        self,
+        create: Callable[[str], Awaitable[Any]],
+        primary: str,
+        fallbacks: List[str],
+        stream: bool = True,
+        on_failover: Optional[Callable[[str, Exception], Awaitable[None]]] = None
+    ) -> Tuple[Any, str, Dict[str, Any]]:
+        """Run a completion request with hedging and failover.
+
+        Args:
+            create: Coroutine factory issuing the request for a given model
+            primary: Preferred model
+            fallbacks: Alternative models
+            stream: Whether create returns a stream; the first chunk wins the race and
+                the end of the stream marks success
+            on_failover: Optional callback invoked when a model fails
+
+        Returns:
+            Tuple of (completion or stream, model that answered, route info)
+        """
+        self.stats["requests"] += 1
+        queue = self.rank(primary, fallbacks)
+        route = {"candidates": list(queue), "attempted": [], "failed": [], "hedged": False}
+        pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+        last_error: Optional[Exception] = None
+
+        def launch() -> bool:
+            if not queue:
+                return False
+            model = queue.pop(0)
+            route["attempted"].append(model)
+            pending[asyncio.create_task(self._start(create, model, stream))] = (model, time.time())
+            return True
+
+        launch()
+        try:
+            while pending:
+                # Only the first request is hedged; later launches are failovers
+                can_hedge = self.hedging_enabled and len(route["attempted"]) == 1 and queue
+                timeout = self.hedge_deadline(route["attempted"][0]) if can_hedge else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    print(f"\033[93m[MODEL ROUTER] No first token from {route['attempted'][0]} within "
+                          f"{timeout:.1f}s, hedging with {queue[0]}\033[0m")
+                    route["hedged"] = True
+                    self.stats["hedges"] += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    model, _ = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        response, first_chunk = task.result()
+                        if model != route["attempted"][0] and route["hedged"]:
+                            self.stats["hedge_wins"] += 1
+                        route["model"] = model
+                        if stream:
+                            response = _prepend(response, first_chunk, lambda m=model: self.record_success(m))
+                        return response, model, route
+
+                    if is_request_error(error):
+                        # Retrying the same request on another model will not help
+                        raise error
+
+                    last_error = error
+                    route["failed"].append(model)
+                    self.record_failure(model)
+                    self.stats["failovers"] += 1
+                    print(f"\033[91m[MODEL ROUTER] Model {model} failed: {error}\033[0m")
+                    if on_failover:
+                        await on_failover(model, error)
+
+                if not pending:
+                    launch()
+        finally:
+            # Cancel the losing requests and close any stream they already opened
+            for task, (model, started) in pending.items():
+                if not task.done():
+                    task.cancel()
+                    # The loser took at least this long; keep it in the latency window
+                    # so slow models are not hidden by always losing the race
+                    self._get(model).latencies.append(time.time() - started)
+            results = await asyncio.gather(*pending, return_exceptions=True)
+            for result in results:
+                if isinstance(result, tuple):
+                    await _close(result[0])
+
+        raise last_error or RuntimeError("No model available for the request")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get router counters and per-model statistics."""
+        return {**self.stats, "models": {m: s.to_dict() for m, s in self.models.items()}}
+
+
+async def _close(response: Any) -> None:
+    close = getattr(response, "close", None)
+    if close:
+        try:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception:
+            pass
+
+
+async def _prepend(response: Any, first_chunk: Any, on_complete: Callable[[], None]) -> AsyncIterator[Any]:
+    """Re-yield the first chunk consumed while racing, then the rest of the stream.
+
+    on_complete is called once the stream has been fully consumed without errors.
+    """
+    if first_chunk is not None:
+        yield first_chunk
+    async for chunk in response:
+        yield chunk
+    on_complete()
+
+
+# Shared router so latency and error statistics accumulate across requests
+model_router = ModelRouter()
@@ -4,14 +4,12 @@ import asyncio
 import time
 import traceback
 import uuid
+import copy
 import datetime
 from typing import List, Dict, Any, Optional, Callable, Awaitable
 import re
 from pathlib import Path
 
-# Import OpenAI SDK for native tool calling
-from openai import AsyncOpenAI
-
 # Import tool schemas and prompt management
 from app.core.openrouter_agent.tool_definitions import get_tool_schemas
 from app.core.openrouter_agent.prompt_manager import (
@@ -25,6 +23,12 @@ from app.core.openrouter_agent.message_handler import MessageHandler
 from app.core.openrouter_agent.stream_processor import process_completion_chunks
 from app.core.openrouter_agent.tool_executor import execute_and_process_tool
 from app.core.openrouter_agent.media_handler import inject_image_data
+from app.core.agent.media_store import media_store
+from app.core.openrouter_agent.report_generator import generate_report_sections, MAX_CONCURRENT_SECTIONS
+from app.core.openrouter_agent.prompt_cache import apply_cache_breakpoints, extract_cache_usage
+from app.core.openrouter_agent.llm_tracer import llm_tracer
+from app.core.openrouter_agent.client_registry import get_openrouter_client
+from app.core.openrouter_agent.model_router import model_router
 
 from app.core.agent.prompt import system_prompt
 
@@ -40,6 +44,13 @@ FALLBACK_MODELS = [
     "openai/gpt-4o"
 ]
 
+# Maximum number of tool calls from a single assistant turn to execute at once
+MAX_CONCURRENT_TOOLS = int(os.getenv("MAX_CONCURRENT_TOOLS", 4))
+
+# Tools that depend on the results of other calls in the same turn and must
+# run after them, one at a time
+SERIAL_TOOLS = {"attempt_completion"}
+
 class OpenRouterAgent:
     # Define analysis sections for multi-step report generation
     ANALYSIS_SECTIONS = [
@@ -90,6 +101,10 @@ class OpenRouterAgent:
         stream: bool = True,
         system_prompt: Optional[str] = None,
         save_messages: bool = True,
+        parallel_tool_calls: bool = True,
+        max_concurrent_tools: int = MAX_CONCURRENT_TOOLS,
+        max_concurrent_sections: int = MAX_CONCURRENT_SECTIONS,
+        prompt_caching: bool = True,
     ):
         """Initialize a new OpenRouter agent with native tool calling capabilities.
 
@@ -102,6 +117,10 @@ class OpenRouterAgent:
             stream: Whether to stream responses
             system_prompt: Optional custom system prompt
             save_messages: Whether to save conversation to disk
+            parallel_tool_calls: Whether to execute independent tool calls from one turn concurrently
+            max_concurrent_tools: Maximum number of tool calls to execute at the same time
+            max_concurrent_sections: Maximum number of final report sections to generate at the same time
+            prompt_caching: Whether to mark the stable prompt prefix with cache breakpoints and report cache usage
         """
         self.model = model
         self.temperature = temperature
@@ -109,6 +128,10 @@ class OpenRouterAgent:
         self.stream = stream
         self.timeout = OPENROUTER_TIMEOUT
         self.conversation_id = str(uuid.uuid4())
+        self.parallel_tool_calls = parallel_tool_calls
+        self.max_concurrent_tools = max(1, max_concurrent_tools)
+        self.max_concurrent_sections = max(1, max_concurrent_sections)
+        self.prompt_caching = prompt_caching
 
         # Initialize message handler
         self.message_handler = MessageHandler(
@@ -126,21 +149,436 @@ class OpenRouterAgent:
         # Track whether an image is part of the conversation
         self.has_image = False
 
-        # Initialize the OpenAI client with OpenRouter API settings
-        self.client = AsyncOpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-            default_headers={
-                "HTTP-Referer": "https://brandguideline.ai",
-                "X-Title": "Brand Compliance AI"
-            }
-        )
+        # Media store handle of the decoded image, set while process() runs
+        self.media_handle = None
+
+        # Use the shared OpenRouter client so requests reuse warm pooled connections
+        self.client = get_openrouter_client(api_key)
 
         # Get tool schemas
         self.tools = get_tool_schemas()
 
         print(f"\033[94m[LOG] OpenRouterAgent.__init__: Initialized with model {model} and timeout {self.timeout}s\033[0m")
 
+    def _usage_extra_body(self) -> Optional[Dict[str, Any]]:
+        """Request body additions asking OpenRouter to report token usage, including cache tokens."""
+        if not self.prompt_caching:
+            return None
+        return {"usage": {"include": True}}
+
+    def _record_cache_usage(
+        self,
+        usage: Any,
+        timing_metrics: Dict[str, Any],
+        iteration_count: int,
+        model: str,
+    ) -> None:
+        """Record prompt cache read/write token counts for an iteration.
+
+        Args:
+            usage: Usage object reported on the final stream chunk
+            timing_metrics: Timing metrics dict of the current process call
+            iteration_count: Current agent iteration
+            model: Model that served the request
+        """
+        cache_usage = extract_cache_usage(usage)
+        if not cache_usage:
+            return
+
+        timing_metrics["prompt_cache"].append({
+            "iteration": iteration_count,
+            "model": model,
+            **cache_usage
+        })
+        print(f"\033[96m[PROMPT CACHE] Iteration {iteration_count}: {cache_usage['prompt_tokens']} prompt tokens, "
+              f"{cache_usage['cache_read_tokens']} read from cache, {cache_usage['cache_write_tokens']} written to cache\033[0m")
+
+    async def _execute_tool_call(
+        self,
+        tool_call: Dict[str, Any],
+        fallback_id: str,
+        image_base64: Optional[str],
+        frames: Optional[List[Dict[str, Any]]],
+        iteration_count: int,
+    ) -> Dict[str, Any]:
+        """Execute a single tool call from an assistant turn.
+
+        Prepares the tool arguments (including video frame injection), runs the
+        tool and streams its result. The conversation history is not modified
+        here so that callers can append the tool messages in call order.
+
+        Args:
+            tool_call: Accumulated tool call from the completion stream
+            fallback_id: Tool call ID to use if the stream did not provide one
+            image_base64: Optional base64-encoded image for image tools
+            frames: Optional list of video frames with timestamps
+            iteration_count: Current agent iteration, used for timing metrics
+
+        Returns:
+            Dict with tool_name, tool_result, tool_response (the role: tool message),
+            trace_entry and timing_entry (None when the tool raised)
+        """
+        trace_entry = None
+        timing_entry = None
+
+        # Extract tool information
+        tool_id = tool_call.get("id") or fallback_id
+        tool_name = tool_call["function"]["name"]
+        tool_args_str = tool_call["function"]["arguments"]
+
+        # Parse arguments
+        try:
+            tool_args = json.loads(tool_args_str)
+        except json.JSONDecodeError:
+            print(f"\033[91m[ERROR] Failed to parse tool arguments: {tool_args_str}\033[0m")
+            tool_args = {}
+
+        # Debug log the tool arguments
+        print(f"\033[93m[DEBUG] Initial tool_args for {tool_name}: {list(tool_args.keys())}\033[0m")
+
+        # Log detailed information about frames
+        if frames:
+            print(f"\033[93m[DEBUG] Available frames: {len(frames)}\033[0m")
+            for i, frame in enumerate(frames[:3]):  # Log first 3 frames
+                print(f"\033[93m[DEBUG] Frame {i} keys: {list(frame.keys())}\033[0m")
+                print(f"\033[93m[DEBUG] Frame {i} timestamp: {frame.get('timestamp')}\033[0m")
+                has_image_data = "image_data" in frame and frame["image_data"]
+                has_base64 = "base64" in frame and frame["base64"]
+                print(f"\033[93m[DEBUG] Frame {i} has image_data: {has_image_data}, has base64: {has_base64}\033[0m")
+                if has_image_data:
+                    print(f"\033[93m[DEBUG] Frame {i} image_data length: {len(frame['image_data'])}\033[0m")
+                    print(f"\033[93m[DEBUG] Frame {i} image_data (first 20 chars): {frame['image_data'][:20]}...\033[0m")
+                if has_base64:
+                    print(f"\033[93m[DEBUG] Frame {i} base64 length: {len(frame['base64'])}\033[0m")
+                    print(f"\033[93m[DEBUG] Frame {i} base64 (first 20 chars): {frame['base64'][:20]}...\033[0m")
+        else:
+            print(f"\033[91m[ERROR] No frames available for {tool_name}\033[0m")
+
+        # For video tools, ensure frames are added to tool_args
+        video_tools = {
+            "get_video_color_scheme",
+            "get_video_fonts",
+            "check_video_frame_specs",
+            "extract_verbal_content",
+            "get_region_color_scheme",
+            "check_color_contrast",
+            "check_element_placement",
+            "check_image_clarity",
+            "check_text_grammar",
+        }
+
+        # Debug log to check if this is a video tool
+        if tool_name in video_tools:
+            print(f"\033[92m[INFO] {tool_name} is a video tool\033[0m")
+        else:
+            print(f"\033[93m[DEBUG] {tool_name} is not a video tool\033[0m")
+
+        if tool_name in video_tools and frames and len(frames) > 0:
+            print(f"\033[93m[DEBUG] Adding frames to {tool_name} arguments\033[0m")
+
+            # Special handling for extract_verbal_content
+            if tool_name == "extract_verbal_content":
+                # For extract_verbal_content, we need to add all frames
+                images_base64 = []
+                timestamps = tool_args.get("timestamps", [])
+
+                # If no timestamps provided, use a default list
+                if not timestamps:
+                    # Use timestamps from frames at 5-second intervals
+                    frame_timestamps = sorted(list(set([int(f.get("timestamp", 0)) for f in frames])))
+                    timestamps = [ts for ts in frame_timestamps if ts % 5 == 0]
+
+                    # If no timestamps at 5-second intervals, use first, middle, and last
+                    if not timestamps and frame_timestamps:
+                        timestamps = [
+                            frame_timestamps[0],
+                            frame_timestamps[len(frame_timestamps) // 2],
+                            frame_timestamps[-1]
+                        ]
+
+                    # If still no timestamps, use [5, 10, 15]
+                    if not timestamps:
+                        timestamps = [5, 10, 15]
+
+                    # Add timestamps to tool_args
+                    tool_args["timestamps"] = timestamps
+                    print(f"\033[92m[INFO] Added timestamps to extract_verbal_content: {timestamps}\033[0m")
+
+                # For each timestamp, find the closest frame
+                for ts in timestamps:
+                    closest_frame = min(frames, key=lambda f: abs(f.get("timestamp", 0) - float(ts)))
+                    frame_base64 = closest_frame.get("image_data") or closest_frame.get("base64")
+                    if frame_base64:
+                        images_base64.append(frame_base64)
+
+                if images_base64:
+                    print(f"\033[92m[INFO] Adding {len(images_base64)} frames to images_base64 for extract_verbal_content\033[0m")
+                    tool_args["images_base64"] = images_base64
+                    if len(images_base64) > 0:
+                        tool_args["image_base64"] = images_base64[0]  # Add first frame as image_base64
+
+            # For other video tools
+            elif "timestamp" in tool_args:
+                target_ts = tool_args["timestamp"]
+                print(f"\033[93m[DEBUG] Looking for timestamp: {target_ts}\033[0m")
+
+                # Find the closest frame
+                closest_frame = min(frames, key=lambda f: abs(f.get("timestamp", 0) - float(target_ts)))
+                print(f"\033[93m[DEBUG] Found closest frame at timestamp: {closest_frame.get('timestamp')}\033[0m")
+
+                # Get the base64 data from either key
+                frame_base64 = closest_frame.get("image_data") or closest_frame.get("base64")
+                if frame_base64:
+                    print(f"\033[92m[INFO] Adding closest frame as image_base64 (length: {len(frame_base64)})\033[0m")
+                    tool_args["image_base64"] = frame_base64
+
+                    # Always add at least the closest frame to images_base64
+                    tool_args["images_base64"] = [frame_base64]
+                    print(f"\033[92m[INFO] Added closest frame to images_base64 array\033[0m")
+
+                    # Get all frames within 1 second of the target timestamp
+                    nearby_frames = [
+                        f for f in frames
+                        if abs(f.get("timestamp", 0) - float(target_ts)) <= 1
+                    ]
+
+                    # Extract base64 data from each frame
+                    images_base64 = []
+                    for frame in nearby_frames:
+                        frame_data = frame.get("image_data") or frame.get("base64")
+                        if frame_data:
+                            images_base64.append(frame_data)
+
+                    if images_base64:
+                        print(f"\033[92m[INFO] Adding {len(images_base64)} nearby frames as images_base64\033[0m")
+                        tool_args["images_base64"] = images_base64
+            else:
+                # If no timestamp, add all frames
+                images_base64 = []
+                for frame in frames:
+                    frame_data = frame.get("image_data") or frame.get("base64")
+                    if frame_data:
+                        images_base64.append(frame_data)
+
+                if images_base64:
+                    print(f"\033[92m[INFO] Adding all {len(images_base64)} frames as images_base64\033[0m")
+                    tool_args["images_base64"] = images_base64
+                    if len(images_base64) > 0:
+                        tool_args["image_base64"] = images_base64[0]  # Add first frame as image_base64
+
+            # Debug log to verify frames are being added
+            if "images_base64" in tool_args:
+                print(f"\033[92m[DEBUG] Final tool_args has images_base64 with {len(tool_args['images_base64'])} items\033[0m")
+            else:
+                print(f"\033[91m[ERROR] Final tool_args is missing images_base64\033[0m")
+
+        # Image analyses: pass the handle of the decoded asset, or the base64 if decoding failed
+        if not frames:
+            tool_args = inject_image_data(
+                tool_name, tool_args,
+                None if self.media_handle else image_base64,
+                image_handle=self.media_handle
+            )
+
+        # Execute the tool and stream its result
+        try:
+            print(f"\033[92m[TOOL EXEC] Executing {tool_name}...\033[0m")
+
+            # First, stream that we're executing the tool (better UX)
+            if self.message_handler.on_stream:
+                # await self.message_handler.on_stream({
+                #     "type": "text",
+                #     "content": f"Executing tool: {tool_name}..."
+                # })
+                print('tool name', tool_name)
+
+            # CRITICAL: Final check to ensure frames are added for video tools
+            video_tools = {
+                "get_video_color_scheme",
+                "get_video_fonts",
+                "check_video_frame_specs",
+                "extract_verbal_content",
+                "get_region_color_scheme",
+                "check_color_contrast",
+                "check_element_placement",
+                "check_image_clarity",
+                "check_text_grammar",
+            }
+
+            if tool_name in video_tools:
+                print(f"\033[93m[DEBUG] FINAL CHECK for {tool_name} - tool_args keys: {list(tool_args.keys())}\033[0m")
+
+                # Check if images_base64 or image_base64 is present
+                has_images_base64 = "images_base64" in tool_args and tool_args["images_base64"]
+                has_image_base64 = "image_base64" in tool_args and tool_args["image_base64"]
+
+                print(f"\033[93m[DEBUG] FINAL CHECK - has_images_base64: {has_images_base64}, has_image_base64: {has_image_base64}\033[0m")
+
+                # If neither is present but we have frames, add them
+                if not (has_images_base64 or has_image_base64) and frames and len(frames) > 0:
+                    print(f"\033[91m[ERROR] {tool_name} is missing both images_base64 and image_base64. Adding frames now.\033[0m")
+
+                    # For extract_verbal_content, add frames for timestamps
+                    if tool_name == "extract_verbal_content":
+                        # Get timestamps or use defaults
+                        timestamps = tool_args.get("timestamps", [5, 10, 15])
+
+                        # Add timestamps to tool_args if not present
+                        if "timestamps" not in tool_args:
+                            tool_args["timestamps"] = timestamps
+                            print(f"\033[92m[INFO] Added default timestamps to extract_verbal_content: {timestamps}\033[0m")
+
+                        # For each timestamp, find the closest frame
+                        images_base64 = []
+                        for ts in timestamps:
+                            closest_frame = min(frames, key=lambda f: abs(f.get("timestamp", 0) - float(ts)))
+                            frame_base64 = closest_frame.get("image_data") or closest_frame.get("base64")
+                            if frame_base64:
+                                images_base64.append(frame_base64)
+
+                        if images_base64:
+                            print(f"\033[92m[INFO] FINAL CHECK - Adding {len(images_base64)} frames to images_base64 for extract_verbal_content\033[0m")
+                            tool_args["images_base64"] = images_base64
+                            tool_args["image_base64"] = images_base64[0]  # Add first frame as image_base64
+
+                    # For other video tools with timestamp
+                    elif "timestamp" in tool_args:
+                        target_ts = tool_args["timestamp"]
+                        print(f"\033[93m[DEBUG] FINAL CHECK - Looking for timestamp: {target_ts}\033[0m")
+
+                        # Find the closest frame
+                        closest_frame = min(frames, key=lambda f: abs(f.get("timestamp", 0) - float(target_ts)))
+                        frame_base64 = closest_frame.get("image_data") or closest_frame.get("base64")
+
+                        if frame_base64:
+                            print(f"\033[92m[INFO] FINAL CHECK - Adding closest frame to image_base64 and images_base64\033[0m")
+                            tool_args["image_base64"] = frame_base64
+                            tool_args["images_base64"] = [frame_base64]
+
+                    # For other video tools without timestamp
+                    else:
+                        # Add all frames
+                        images_base64 = []
+                        for frame in frames:
+                            frame_data = frame.get("image_data") or frame.get("base64")
+                            if frame_data:
+                                images_base64.append(frame_data)
+
+                        if images_base64:
+                            print(f"\033[92m[INFO] FINAL CHECK - Adding all {len(images_base64)} frames\033[0m")
+                            tool_args["images_base64"] = images_base64
+                            tool_args["image_base64"] = images_base64[0]
+
+                # Final verification
+                if "images_base64" in tool_args:
+                    print(f"\033[92m[DEBUG] FINAL VERIFICATION - tool_args has images_base64 with {len(tool_args['images_base64'])} items\033[0m")
+                else:
+                    print(f"\033[91m[ERROR] FINAL VERIFICATION - tool_args is still missing images_base64\033[0m")
+
+            # Record tool execution start time
+            tool_start = time.time()
+            print(f"\033[94m[TIMING] Tool execution for {tool_name} started at {datetime.datetime.fromtimestamp(tool_start).strftime('%H:%M:%S.%f')[:-3]}\033[0m")
+
+            # Execute the tool - returns the proper OpenRouter compatible message format
+            result_format = await execute_and_process_tool(
+                tool_name,
+                tool_args,
+                image_base64,
+                frames,
+                tool_call_id=tool_id,  # Pass the tool_call_id from the API response
+                on_stream=self.message_handler.on_stream
+            )
+            # Record tool execution end time
+            tool_end = time.time()
+            tool_duration = tool_end - tool_start
+            print(f"\033[94m[TIMING] Tool execution for {tool_name} completed in {tool_duration:.2f}s\033[0m")
+
+            # Record timing metrics for the caller
+            timing_entry = {
+                "tool_name": tool_name,
+                "iteration": iteration_count,
+                "start_time": tool_start,
+                "end_time": tool_end,
+                "duration": tool_duration
+            }
+
+            # Extract the actual tool result from the message format
+            if isinstance(result_format, dict) and "content" in result_format:
+                tool_result = result_format["content"]
+            else:
+                tool_result = str(result_format)
+
+            # Ensure tool_result is properly formatted for further processing
+            # If it's a string that looks like JSON, try to parse it
+            if isinstance(tool_result, str):
+                try:
+                    if tool_result.strip().startswith('{') and tool_result.strip().endswith('}'):
+                        parsed_result = json.loads(tool_result)
+                        tool_result = parsed_result
+                except json.JSONDecodeError:
+                    # If parsing fails, keep it as a string
+                    pass
+
+            # Tool trace entry for logging/debugging (minimal format)
+            trace_entry = {
+                "tool": tool_name,
+                "input": {k: v for k, v in tool_args.items() if k not in ["image_base64", "images_base64", "image_handle"]},
+                "output": tool_result
+            }
+
+            # Stream the tool result in the format compliance API expects
+            # Only include the minimal necessary information to reduce token usage
+            if self.message_handler.on_stream:
+                # Create a simplified result representation - remove any unnecessarily large fields
+                simplified_result = tool_result
+                if isinstance(simplified_result, str):
+                    # Try to parse as JSON to simplify if possible
+                    try:
+                        simplified_result = json.loads(simplified_result)
+                    except:
+                        pass
+
+                # Remove trace and other metadata if present
+                if isinstance(simplified_result, dict):
+                    if "trace_record" in simplified_result:
+                        del simplified_result["trace_record"]
+
+                await self.message_handler.on_stream({
+                    "type": "tool",
+                    "content": json.dumps({
+                        "tool_name": tool_name,
+                        "tool_input": {k: v for k, v in tool_args.items() if k not in ["image_base64", "images_base64", "image_handle"]},
+                        "tool_result": simplified_result
+                    })
+                })
+        except Exception as e:
+            print(f"\033[91m[ERROR] Exception in {tool_name}: {e}\033[0m")
+            tool_result = {"error": str(e)}
+
+            # Stream error to client
+            if self.message_handler.on_stream:
+                await self.message_handler.on_stream({
+                    "type": "error",
+                    "content": f"Error executing tool {tool_name}: {str(e)}"
+                })
+
+        # Add tool result as a message following OpenAI/OpenRouter format
+        tool_response = {
+            "role": "tool",
+            "tool_call_id": tool_id,
+            "name": tool_name,
+            "content": json.dumps(tool_result)  # Must be JSON string per OpenRouter docs
+        }
+
+        return {
+            "tool_name": tool_name,
+            "tool_result": tool_result,
+            "tool_response": tool_response,
+            "trace_entry": trace_entry,
+            "timing_entry": timing_entry,
+        }
+
+
     async def process(
         self,
         user_prompt: str,
@@ -160,6 +598,7 @@ class OpenRouterAgent:
             "iterations": [],
             "llm_calls": [],
             "tool_executions": [],
+            "prompt_cache": [],
             "final_report_generation": {
                 "start_time": None,
                 "end_time": None,
@@ -193,6 +632,9 @@ class OpenRouterAgent:
         # Track iteration count to enforce completion after max_iterations
         iteration_count = 0
 
+        # Set once the model had to be pushed to complete after max_iterations
+        forced_completion = False
+
         # Track last response time to detect timeouts
         last_response_time = time.time()
 
@@ -282,6 +724,14 @@ class OpenRouterAgent:
             await self.message_handler.add_message("user", user_prompt)
             self.has_image = False
 
+        # Decode the asset once for this analysis; image tools get a handle to it
+        self.media_handle = None
+        if image_base64 and not frames:
+            try:
+                self.media_handle = await asyncio.to_thread(media_store.register, image_base64)
+            except Exception as e:
+                print(f"\033[93m[WARNING] Could not decode the image for tools, passing base64 instead: {e}\033[0m")
+
         # Main loop to process the conversation and handle tool calls
         try:
             while True:
@@ -309,64 +759,20 @@ class OpenRouterAgent:
                     llm_prep_start = time.time()
                     print(f"\033[94m[TIMING] LLM call preparation started at {datetime.datetime.fromtimestamp(llm_prep_start).strftime('%H:%M:%S.%f')[:-3]}\033[0m")
 
-                    # Check estimated token count
-                    token_estimate = self.message_handler.get_message_token_estimate()
-                    print(f"\033[94m[INFO] Estimated token count: {token_estimate}\033[0m")
-
-                    # Use message history management to prevent token overflow
-                    # Keep system messages and most recent messages if token count is high
-                    # For OpenRouter, we need more aggressive pruning to avoid token limit errors
-                    # The Claude 3.7 context window is 200K tokens
-                    if token_estimate > 150000:  # Very high - risk of overflow
-                        max_msgs = 5  # Very aggressive pruning
-                        print(f"\033[91m[WARNING] Token count very high ({token_estimate}), pruning aggressively\033[0m")
-                    elif token_estimate > 50000:  # High but manageable
-                        max_msgs = 10  # Standard pruning
-                        print(f"\033[93m[WARNING] Token count high ({token_estimate}), pruning messages\033[0m")
-                    else:
-                        max_msgs = 15  # No pruning needed
-
-                    print(f"\033[94m[INFO] max_msgs: {max_msgs}\033[0m")
-
-
-                    # Create the chat completion with the OpenAI SDK
                     # Override default max_tokens if specified in the process call
                     current_max_tokens = max_tokens if max_tokens is not None else self.max_tokens
 
-                    # More aggressive message history management to prevent token overflow
-                    # For large token counts (from images), limit to system prompt + latest messages
-                    token_limit = 50000  # Lower threshold for context limiting
-                    if token_estimate > token_limit:
-                        # More aggressive token management - system prompt + last few messages
-                        msg_limit = 3  # Set a very tight limit on message history
-                        print(f"\033[93m[WARNING] Very high token count ({token_estimate}), using tight history limit of {msg_limit}\033[0m")
-                        max_msgs = msg_limit
-
-                    # Get formatted messages and log their sizes
-                    formatted_messages = self.message_handler.get_formatted_messages(max_messages=max_msgs)
-
-                    # Save the messages being passed to the LLM to a JSON file
-                    loop_messages_dir = Path("logs/llm_messages")
-                    loop_messages_dir.mkdir(parents=True, exist_ok=True)
-
-                    # Create a timestamped filename to track each loop
-                    timestamp = int(time.time())
-                    loop_messages_file = loop_messages_dir / f"{self.conversation_id}_{iteration_count}_{timestamp}.json"
+                    # Token costs are tracked incrementally as messages are added; size the
+                    # budget for the smallest model the router may hedge or fail over to,
+                    # and the response we reserve room for
+                    context = self.message_handler.context
+                    context.set_model(self.model, current_max_tokens, fallbacks=FALLBACK_MODELS)
+                    token_estimate = self.message_handler.get_message_token_estimate()
+                    print(f"\033[94m[INFO] Context budget: {context.budget} tokens, remaining: {context.remaining}\033[0m")
 
-                    # Save messages to file
-                    try:
-                        with open(loop_messages_file, 'w') as f:
-                            # Use a safe JSON serializer that can handle various types
-                            json.dump({
-                                "conversation_id": self.conversation_id,
-                                "iteration": iteration_count,
-                                "timestamp": timestamp,
-                                "model": self.model,
-                                "messages": formatted_messages
-                            }, f, default=str, indent=2)
-                        print(f"\033[94m[LOG] Saved LLM messages for iteration {iteration_count} to {loop_messages_file}\033[0m")
-                    except Exception as e:
-                        print(f"\033[91m[ERROR] Failed to save LLM messages to file: {str(e)}\033[0m")
+                    # Get formatted messages, evicting old tool results and large payloads
+                    # (never splitting tool_call/tool pairs) when over budget
+                    formatted_messages = self.message_handler.get_formatted_messages(fit_budget=True)
 
                     # Add detailed size logging
                     total_chars = sum(len(str(msg)) for msg in formatted_messages)
@@ -393,91 +799,51 @@ class OpenRouterAgent:
                     print(f"\033[94m[TIMING] LLM call preparation completed in {llm_prep_duration:.2f}s\033[0m")
                     print(f"\033[94m[TIMING] LLM call started at {datetime.datetime.fromtimestamp(llm_call_start).strftime('%H:%M:%S.%f')[:-3]}\033[0m")
 
-                    # Try to make the API call with potential model fallback
-                    api_error = None
-                    model_fallback_attempted = False
-                    current_model = self.model
-
-                    # Try the current model first
-                    try:
-                        completion = await self.client.chat.completions.create(
-                            model=current_model,
-                            messages=formatted_messages,
+                    # Route the call: hedge to the next-best model if the first token is late,
+                    # fail over on errors and skip models whose circuit is open
+                    async def create_completion(model):
+                        # Trace the request to the model it is sent to, for sampled conversations;
+                        # the writer runs off the event loop
+                        llm_tracer.trace(self.conversation_id, formatted_messages, model, iteration=iteration_count)
+                        # Mark the system prompt and asset image as a cacheable prefix, for the
+                        # model the router picked rather than the configured one
+                        messages = apply_cache_breakpoints(formatted_messages, model) if self.prompt_caching else formatted_messages
+                        return await self.client.chat.completions.create(
+                            model=model,
+                            messages=messages,
                             tools=self.tools,  # Pass the tool schemas
                             temperature=self.temperature,
                             max_tokens=current_max_tokens,
                             stream=self.stream,
-                            timeout=self.timeout
+                            timeout=self.timeout,
+                            extra_body=self._usage_extra_body()
                         )
-                    except Exception as model_error:
-                        print('--------❗❗❗❗❗❗❗❗❗❗❗')
-                        print(model_error)
-                        print('--------❗❗❗❗❗❗❗❗❗❗❗')
-                        api_error = model_error
-                        error_msg = str(model_error)
-                        print(f"\033[91m[ERROR] Error with model {current_model}: {error_msg}\033[0m")
-
-                        # Check if this is a provider error that requires model fallback
-                        if "Provider returned error" in error_msg:
-                            model_fallback_attempted = True
-
-                            # Stream the error to client
-                            if self.message_handler.on_stream:
-                                await self.message_handler.on_stream({
-                                    "type": "text",
-                                    "content": f"The model {current_model} returned an error. Trying with a different model..."
-                                })
-
-                            # Try each fallback model in sequence
-                            for fallback_model in FALLBACK_MODELS:
-                                # Skip the current model if it's in the fallback list
-                                if fallback_model == current_model:
-                                    continue
-
-                                print(f"\033[93m[MODEL FALLBACK] Trying fallback model: {fallback_model}\033[0m")
-
-                                # Notify the user about the model change
-                                if self.message_handler.on_stream:
-                                    await self.message_handler.on_stream({
-                                        "type": "text",
-                                        "content": f"Trying model: {fallback_model}"
-                                    })
-
-                                try:
-                                    # Try with the fallback model
-                                    completion = await self.client.chat.completions.create(
-                                        model=fallback_model,
-                                        messages=formatted_messages,
-                                        tools=self.tools,
-                                        temperature=self.temperature,
-                                        max_tokens=current_max_tokens,
-                                        stream=self.stream,
-                                        timeout=self.timeout
-                                    )
 
-                                    # If we get here, the fallback model worked
-                                    print(f"\033[92m[MODEL FALLBACK] Successfully switched to {fallback_model}\033[0m")
+                    async def on_failover(failed_model, model_error):
+                        # Stream the error to client
+                        if self.message_handler.on_stream:
+                            await self.message_handler.on_stream({
+                                "type": "text",
+                                "content": f"The model {failed_model} returned an error. Trying with a different model..."
+                            })
 
-                                    # Update the model for future iterations
-                                    self.model = fallback_model
-                                    current_model = fallback_model
-
-                                    # Clear the error since we succeeded with a fallback model
-                                    api_error = None
-                                    break
-                                except Exception as fallback_error:
-                                    # Log the fallback error and continue to the next model
-                                    print(f"\033[91m[ERROR] Fallback model {fallback_model} also failed: {str(fallback_error)}\033[0m")
-
-                            # If we still have an error after trying all fallback models, raise it
-                            if api_error:
-                                print(f"\033[91m[ERROR] All fallback models failed\033[0m")
-                                if self.message_handler.on_stream:
-                                    await self.message_handler.on_stream({
-                                        "type": "error",
-                                        "content": "All available models failed. Please try again later."
-                                    })
-                                raise api_error
+                    try:
+                        completion, current_model, route = await model_router.create(
+                            create_completion,
+                            primary=self.model,
+                            fallbacks=FALLBACK_MODELS,
+                            stream=self.stream,
+                            on_failover=on_failover
+                        )
+                    except Exception as model_error:
+                        print(f"\033[91m[ERROR] All models failed: {str(model_error)}\033[0m")
+                        if self.message_handler.on_stream:
+                            await self.message_handler.on_stream({
+                                "type": "error",
+                                "content": "All available models failed. Please try again later."
+                            })
+                        raise
+                    model_fallback_attempted = current_model != self.model or bool(route["failed"])
 
                     # Record LLM call end time
                     llm_call_end = time.time()
@@ -493,7 +859,11 @@ class OpenRouterAgent:
                         "end_time": llm_call_end,
                         "duration": llm_call_duration,
                         "preparation_time": llm_prep_duration,
-                        "fallback_attempted": model_fallback_attempted
+                        "fallback_attempted": model_fallback_attempted,
+                        "hedged": route["hedged"],
+                        "failed_models": route["failed"],
+                        "context_tokens": token_estimate,
+                        "context_budget": context.budget
                     })
                     # Update the last response time since we got a response
                     last_response_time = time.time()
@@ -514,11 +884,41 @@ class OpenRouterAgent:
 
                     # Stream handling
                     if self.stream:
+                        # Independent tool calls start executing as soon as their arguments
+                        # are complete, while the model is still streaming the rest of the turn
+                        tool_semaphore = asyncio.Semaphore(self.max_concurrent_tools)
+                        early_tool_tasks = {}
+
+                        async def run_tool_limited(tool_call):
+                            async with tool_semaphore:
+                                return await self._execute_tool_call(
+                                    tool_call, tool_call["id"],
+                                    image_base64, frames, iteration_count
+                                )
+
+                        def dispatch_tool_call(tool_call):
+                            # Assign a missing id on the assembled call itself, so the early
+                            # execution and the assistant message below use the same one
+                            if not tool_call.get("id"):
+                                tool_call["id"] = f"call_{str(uuid.uuid4())}"
+                            if not self.parallel_tool_calls or tool_call["function"]["name"] in SERIAL_TOOLS:
+                                return
+                            print(f"\033[94m[INFO] Dispatching {tool_call['function']['name']} while the model is still streaming\033[0m")
+                            early_tool_tasks[tool_call["index"]] = asyncio.create_task(
+                                run_tool_limited(copy.deepcopy(tool_call))
+                            )
+
                         # Process chunks to build response content and extract tool calls
                         # This will also stream text content in real-time during processing
                         try:
                             current_content, current_tool_calls, is_tool_call = await process_completion_chunks(
-                                completion, self.message_handler, lambda t: globals().update({'last_response_time': t})
+                                completion,
+                                self.message_handler,
+                                lambda t: globals().update({'last_response_time': t}),
+                                on_usage=lambda usage: self._record_cache_usage(
+                                    usage, timing_metrics, iteration_count, current_model
+                                ),
+                                on_tool_call_complete=dispatch_tool_call
                             )
 
                             # Handle the response based on content and tool calls
@@ -539,50 +939,25 @@ class OpenRouterAgent:
                             error_msg = str(e)
                             print(f"\033[91m[ERROR] Error processing completion chunks: {error_msg}\033[0m")
 
+                            # The turn is discarded, so drop the tools started from it
+                            for task in early_tool_tasks.values():
+                                task.cancel()
+
                             # Check if this is a provider error that requires model fallback
                             if "Provider returned error" in error_msg:
+                                # Record the failure so the router ranks this model behind
+                                # healthy fallbacks (and opens its circuit if it keeps failing)
+                                model_router.record_failure(current_model)
+
                                 # Stream the error to client
                                 if self.message_handler.on_stream:
                                     await self.message_handler.on_stream({
                                         "type": "text",
-                                        "content": f"The model {self.model} returned an error. Trying with a different model..."
+                                        "content": f"The model {current_model} returned an error. Trying with a different model..."
                                     })
 
-                                # Find the next model to try
-                                current_model_index = -1
-                                try:
-                                    # If current model is in the fallback list, get its index
-                                    current_model_index = FALLBACK_MODELS.index(self.model)
-                                except ValueError:
-                                    # Current model is not in the fallback list, start with the first fallback model
-                                    pass
-
-                                # Get the next model to try
-                                if current_model_index < len(FALLBACK_MODELS) - 1:
-                                    # There are more models to try
-                                    next_model = FALLBACK_MODELS[current_model_index + 1]
-                                    print(f"\033[93m[MODEL FALLBACK] Switching from {self.model} to {next_model}\033[0m")
-
-                                    # Update the model and try again
-                                    self.model = next_model
-
-                                    # Notify the user about the model change
-                                    if self.message_handler.on_stream:
-                                        await self.message_handler.on_stream({
-                                            "type": "text",
-                                            "content": f"Switching to model: {next_model}"
-                                        })
-
-                                    # Continue with the next iteration to retry with the new model
-                                    continue
-                                else:
-                                    # We've tried all models, give up
-                                    print(f"\033[91m[ERROR] All fallback models failed\033[0m")
-                                    if self.message_handler.on_stream:
-                                        await self.message_handler.on_stream({
-                                            "type": "error",
-                                            "content": "All available models failed. Please try again later."
-                                        })
+                                # Continue with the next iteration to retry on the next-best model
+                                continue
                             else:
                                 # Not a provider error, just a regular error
                                 # Stream the error to client
@@ -599,8 +974,10 @@ class OpenRouterAgent:
                         if current_tool_calls:
                             tool_calls = []
                             for tool_call in current_tool_calls:
-                                # Generate an ID if one isn't provided
-                                tool_id = tool_call.get("id", f"call_{str(uuid.uuid4())}")
+                                # Generate an ID if one isn't provided (calls dispatched early already have one)
+                                if not tool_call.get("id"):
+                                    tool_call["id"] = f"call_{str(uuid.uuid4())}"
+                                tool_id = tool_call["id"]
 
                                 tool_calls.append({
                                     "id": tool_id,
@@ -617,351 +994,51 @@ class OpenRouterAgent:
                             # Add the complete assistant message to conversation history through message_handler
                             await self.message_handler.add_message("assistant", assistant_message)
 
-                            # Now process each tool call
-                            for i, tool_call in enumerate(current_tool_calls):
-                                # Extract tool information
-                                tool_id = tool_call.get("id", assistant_message["tool_calls"][i]["id"])
-                                tool_name = tool_call["function"]["name"]
-                                tool_args_str = tool_call["function"]["arguments"]
-
-                                # Parse arguments
-                                try:
-                                    tool_args = json.loads(tool_args_str)
-                                except json.JSONDecodeError:
-                                    print(f"\033[91m[ERROR] Failed to parse tool arguments: {tool_args_str}\033[0m")
-                                    tool_args = {}
-
-                                # Debug log the tool arguments
-                                print(f"\033[93m[DEBUG] Initial tool_args for {tool_name}: {list(tool_args.keys())}\033[0m")
-
-                                # Log detailed information about frames
-                                if frames:
-                                    print(f"\033[93m[DEBUG] Available frames: {len(frames)}\033[0m")
-                                    for i, frame in enumerate(frames[:3]):  # Log first 3 frames
-                                        print(f"\033[93m[DEBUG] Frame {i} keys: {list(frame.keys())}\033[0m")
-                                        print(f"\033[93m[DEBUG] Frame {i} timestamp: {frame.get('timestamp')}\033[0m")
-                                        has_image_data = "image_data" in frame and frame["image_data"]
-                                        has_base64 = "base64" in frame and frame["base64"]
-                                        print(f"\033[93m[DEBUG] Frame {i} has image_data: {has_image_data}, has base64: {has_base64}\033[0m")
-                                        if has_image_data:
-                                            print(f"\033[93m[DEBUG] Frame {i} image_data length: {len(frame['image_data'])}\033[0m")
-                                            print(f"\033[93m[DEBUG] Frame {i} image_data (first 20 chars): {frame['image_data'][:20]}...\033[0m")
-                                        if has_base64:
-                                            print(f"\033[93m[DEBUG] Frame {i} base64 length: {len(frame['base64'])}\033[0m")
-                                            print(f"\033[93m[DEBUG] Frame {i} base64 (first 20 chars): {frame['base64'][:20]}...\033[0m")
-                                else:
-                                    print(f"\033[91m[ERROR] No frames available for {tool_name}\033[0m")
-
-                                # For video tools, ensure frames are added to tool_args
-                                video_tools = {
-                                    "get_video_color_scheme",
-                                    "get_video_fonts",
-                                    "check_video_frame_specs",
-                                    "extract_verbal_content",
-                                    "get_region_color_scheme",
-                                    "check_color_contrast",
-                                    "check_element_placement",
-                                    "check_image_clarity",
-                                    "check_text_grammar",
-                                }
-
-                                # Debug log to check if this is a video tool
-                                if tool_name in video_tools:
-                                    print(f"\033[92m[INFO] {tool_name} is a video tool\033[0m")
-                                else:
-                                    print(f"\033[93m[DEBUG] {tool_name} is not a video tool\033[0m")
-
-                                if tool_name in video_tools and frames and len(frames) > 0:
-                                    print(f"\033[93m[DEBUG] Adding frames to {tool_name} arguments\033[0m")
-
-                                    # Special handling for extract_verbal_content
-                                    if tool_name == "extract_verbal_content":
-                                        # For extract_verbal_content, we need to add all frames
-                                        images_base64 = []
-                                        timestamps = tool_args.get("timestamps", [])
-
-                                        # If no timestamps provided, use a default list
-                                        if not timestamps:
-                                            # Use timestamps from frames at 5-second intervals
-                                            frame_timestamps = sorted(list(set([int(f.get("timestamp", 0)) for f in frames])))
-                                            timestamps = [ts for ts in frame_timestamps if ts % 5 == 0]
-
-                                            # If no timestamps at 5-second intervals, use first, middle, and last
-                                            if not timestamps and frame_timestamps:
-                                                timestamps = [
-                                                    frame_timestamps[0],
-                                                    frame_timestamps[len(frame_timestamps) // 2],
-                                                    frame_timestamps[-1]
-                                                ]
-
-                                            # If still no timestamps, use [5, 10, 15]
-                                            if not timestamps:
-                                                timestamps = [5, 10, 15]
-
-                                            # Add timestamps to tool_args
-                                            tool_args["timestamps"] = timestamps
-                                            print(f"\033[92m[INFO] Added timestamps to extract_verbal_content: {timestamps}\033[0m")
-
-                                        # For each timestamp, find the closest frame
-                                        for ts in timestamps:
-                                            closest_frame = min(frames, key=lambda f: abs(f.get("timestamp", 0) - float(ts)))
-                                            frame_base64 = closest_frame.get("image_data") or closest_frame.get("base64")
-                                            if frame_base64:
-                                                images_base64.append(frame_base64)
-
-                                        if images_base64:
-                                            print(f"\033[92m[INFO] Adding {len(images_base64)} frames to images_base64 for extract_verbal_content\033[0m")
-                                            tool_args["images_base64"] = images_base64
-                                            if len(images_base64) > 0:
-                                                tool_args["image_base64"] = images_base64[0]  # Add first frame as image_base64
-
-                                    # For other video tools
-                                    elif "timestamp" in tool_args:
-                                        target_ts = tool_args["timestamp"]
-                                        print(f"\033[93m[DEBUG] Looking for timestamp: {target_ts}\033[0m")
-
-                                        # Find the closest frame
-                                        closest_frame = min(frames, key=lambda f: abs(f.get("timestamp", 0) - float(target_ts)))
-                                        print(f"\033[93m[DEBUG] Found closest frame at timestamp: {closest_frame.get('timestamp')}\033[0m")
-
-                                        # Get the base64 data from either key
-                                        frame_base64 = closest_frame.get("image_data") or closest_frame.get("base64")
-                                        if frame_base64:
-                                            print(f"\033[92m[INFO] Adding closest frame as image_base64 (length: {len(frame_base64)})\033[0m")
-                                            tool_args["image_base64"] = frame_base64
-
-                                            # Always add at least the closest frame to images_base64
-                                            tool_args["images_base64"] = [frame_base64]
-                                            print(f"\033[92m[INFO] Added closest frame to images_base64 array\033[0m")
-
-                                            # Get all frames within 1 second of the target timestamp
-                                            nearby_frames = [
-                                                f for f in frames
-                                                if abs(f.get("timestamp", 0) - float(target_ts)) <= 1
-                                            ]
-
-                                            # Extract base64 data from each frame
-                                            images_base64 = []
-                                            for frame in nearby_frames:
-                                                frame_data = frame.get("image_data") or frame.get("base64")
-                                                if frame_data:
-                                                    images_base64.append(frame_data)
-
-                                            if images_base64:
-                                                print(f"\033[92m[INFO] Adding {len(images_base64)} nearby frames as images_base64\033[0m")
-                                                tool_args["images_base64"] = images_base64
-                                    else:
-                                        # If no timestamp, add all frames
-                                        images_base64 = []
-                                        for frame in frames:
-                                            frame_data = frame.get("image_data") or frame.get("base64")
-                                            if frame_data:
-                                                images_base64.append(frame_data)
-
-                                        if images_base64:
-                                            print(f"\033[92m[INFO] Adding all {len(images_base64)} frames as images_base64\033[0m")
-                                            tool_args["images_base64"] = images_base64
-                                            if len(images_base64) > 0:
-                                                tool_args["image_base64"] = images_base64[0]  # Add first frame as image_base64
-
-                                    # Debug log to verify frames are being added
-                                    if "images_base64" in tool_args:
-                                        print(f"\033[92m[DEBUG] Final tool_args has images_base64 with {len(tool_args['images_base64'])} items\033[0m")
-                                    else:
-                                        print(f"\033[91m[ERROR] Final tool_args is missing images_base64\033[0m")
-
-                                # Execute the tool and stream its result
-                                try:
-                                    print(f"\033[92m[TOOL EXEC] Executing {tool_name}...\033[0m")
-
-                                    # First, stream that we're executing the tool (better UX)
-                                    if self.message_handler.on_stream:
-                                        # await self.message_handler.on_stream({
-                                        #     "type": "text",
-                                        #     "content": f"Executing tool: {tool_name}..."
-                                        # })
-                                        print('tool name', tool_name)
-
-                                    # CRITICAL: Final check to ensure frames are added for video tools
-                                    video_tools = {
-                                        "get_video_color_scheme",
-                                        "get_video_fonts",
-                                        "check_video_frame_specs",
-                                        "extract_verbal_content",
-                                        "get_region_color_scheme",
-                                        "check_color_contrast",
-                                        "check_element_placement",
-                                        "check_image_clarity",
-                                        "check_text_grammar",
-                                    }
-
-                                    if tool_name in video_tools:
-                                        print(f"\033[93m[DEBUG] FINAL CHECK for {tool_name} - tool_args keys: {list(tool_args.keys())}\033[0m")
-
-                                        # Check if images_base64 or image_base64 is present
-                                        has_images_base64 = "images_base64" in tool_args and tool_args["images_base64"]
-                                        has_image_base64 = "image_base64" in tool_args and tool_args["image_base64"]
-
-                                        print(f"\033[93m[DEBUG] FINAL CHECK - has_images_base64: {has_images_base64}, has_image_base64: {has_image_base64}\033[0m")
-
-                                        # If neither is present but we have frames, add them
-                                        if not (has_images_base64 or has_image_base64) and frames and len(frames) > 0:
-                                            print(f"\033[91m[ERROR] {tool_name} is missing both images_base64 and image_base64. Adding frames now.\033[0m")
-
-                                            # For extract_verbal_content, add frames for timestamps
-                                            if tool_name == "extract_verbal_content":
-                                                # Get timestamps or use defaults
-                                                timestamps = tool_args.get("timestamps", [5, 10, 15])
-
-                                                # Add timestamps to tool_args if not present
-                                                if "timestamps" not in tool_args:
-                                                    tool_args["timestamps"] = timestamps
-                                                    print(f"\033[92m[INFO] Added default timestamps to extract_verbal_content: {timestamps}\033[0m")
-
-                                                # For each timestamp, find the closest frame
-                                                images_base64 = []
-                                                for ts in timestamps:
-                                                    closest_frame = min(frames, key=lambda f: abs(f.get("timestamp", 0) - float(ts)))
-                                                    frame_base64 = closest_frame.get("image_data") or closest_frame.get("base64")
-                                                    if frame_base64:
-                                                        images_base64.append(frame_base64)
-
-                                                if images_base64:
-                                                    print(f"\033[92m[INFO] FINAL CHECK - Adding {len(images_base64)} frames to images_base64 for extract_verbal_content\033[0m")
-                                                    tool_args["images_base64"] = images_base64
-                                                    tool_args["image_base64"] = images_base64[0]  # Add first frame as image_base64
-
-                                            # For other video tools with timestamp
-                                            elif "timestamp" in tool_args:
-                                                target_ts = tool_args["timestamp"]
-                                                print(f"\033[93m[DEBUG] FINAL CHECK - Looking for timestamp: {target_ts}\033[0m")
-
-                                                # Find the closest frame
-                                                closest_frame = min(frames, key=lambda f: abs(f.get("timestamp", 0) - float(target_ts)))
-                                                frame_base64 = closest_frame.get("image_data") or closest_frame.get("base64")
-
-                                                if frame_base64:
-                                                    print(f"\033[92m[INFO] FINAL CHECK - Adding closest frame to image_base64 and images_base64\033[0m")
-                                                    tool_args["image_base64"] = frame_base64
-                                                    tool_args["images_base64"] = [frame_base64]
-
-                                            # For other video tools without timestamp
-                                            else:
-                                                # Add all frames
-                                                images_base64 = []
-                                                for frame in frames:
-                                                    frame_data = frame.get("image_data") or frame.get("base64")
-                                                    if frame_data:
-                                                        images_base64.append(frame_data)
-
-                                                if images_base64:
-                                                    print(f"\033[92m[INFO] FINAL CHECK - Adding all {len(images_base64)} frames\033[0m")
-                                                    tool_args["images_base64"] = images_base64
-                                                    tool_args["image_base64"] = images_base64[0]
-
-                                        # Final verification
-                                        if "images_base64" in tool_args:
-                                            print(f"\033[92m[DEBUG] FINAL VERIFICATION - tool_args has images_base64 with {len(tool_args['images_base64'])} items\033[0m")
-                                        else:
-                                            print(f"\033[91m[ERROR] FINAL VERIFICATION - tool_args is still missing images_base64\033[0m")
-
-                                    # Record tool execution start time
-                                    tool_start = time.time()
-                                    print(f"\033[94m[TIMING] Tool execution for {tool_name} started at {datetime.datetime.fromtimestamp(tool_start).strftime('%H:%M:%S.%f')[:-3]}\033[0m")
-
-                                    # Execute the tool - returns the proper OpenRouter compatible message format
-                                    result_format = await execute_and_process_tool(
-                                        tool_name,
-                                        tool_args,
-                                        image_base64,
-                                        frames,
-                                        tool_call_id=tool_id,  # Pass the tool_call_id from the API response
-                                        on_stream=self.message_handler.on_stream
+                            # Now process each tool call. Independent calls run concurrently
+                            # (bounded by max_concurrent_tools), most of them already started
+                            # during streaming; tools in SERIAL_TOOLS run afterwards, one at a
+                            # time, since they depend on earlier results.
+                            fallback_ids = [tc["id"] for tc in assistant_message["tool_calls"]]
+                            outcomes = [None] * len(current_tool_calls)
+                            concurrent_indices = [
+                                idx for idx, tc in enumerate(current_tool_calls)
+                                if tc["function"]["name"] not in SERIAL_TOOLS
+                            ]
+
+                            if self.parallel_tool_calls and concurrent_indices:
+                                print(f"\033[94m[INFO] Executing {len(concurrent_indices)} tool calls concurrently "
+                                      f"({len(early_tool_tasks)} started during streaming, limit {self.max_concurrent_tools})\033[0m")
+
+                                async def run_limited(idx):
+                                    task = early_tool_tasks.get(current_tool_calls[idx].get("index"))
+                                    if task is not None:
+                                        return await task
+                                    async with tool_semaphore:
+                                        return await self._execute_tool_call(
+                                            current_tool_calls[idx], fallback_ids[idx], image_base64, frames, iteration_count
+                                        )
+
+                                results = await asyncio.gather(*(run_limited(idx) for idx in concurrent_indices))
+                                for idx, outcome in zip(concurrent_indices, results):
+                                    outcomes[idx] = outcome
+
+                            for idx, tool_call in enumerate(current_tool_calls):
+                                if outcomes[idx] is None:
+                                    outcomes[idx] = await self._execute_tool_call(
+                                        tool_call, fallback_ids[idx], image_base64, frames, iteration_count
                                     )
-                                    # Record tool execution end time
-                                    tool_end = time.time()
-                                    tool_duration = tool_end - tool_start
-                                    print(f"\033[94m[TIMING] Tool execution for {tool_name} completed in {tool_duration:.2f}s\033[0m")
-
-                                    # Add to timing metrics
-                                    timing_metrics["tool_executions"].append({
-                                        "tool_name": tool_name,
-                                        "iteration": iteration_count,
-                                        "start_time": tool_start,
-                                        "end_time": tool_end,
-                                        "duration": tool_duration
-                                    })
-
-                                    # Extract the actual tool result from the message format
-                                    if isinstance(result_format, dict) and "content" in result_format:
-                                        tool_result = result_format["content"]
-                                    else:
-                                        tool_result = str(result_format)
-
-                                    # Ensure tool_result is properly formatted for further processing
-                                    # If it's a string that looks like JSON, try to parse it
-                                    if isinstance(tool_result, str):
-                                        try:
-                                            if tool_result.strip().startswith('{') and tool_result.strip().endswith('}'):
-                                                parsed_result = json.loads(tool_result)
-                                                tool_result = parsed_result
-                                        except json.JSONDecodeError:
-                                            # If parsing fails, keep it as a string
-                                            pass
-
-                                    # Add to tool trace for logging/debugging (minimal format)
-                                    tool_trace.append({
-                                        "tool": tool_name,
-                                        "input": {k: v for k, v in tool_args.items() if k not in ["image_base64", "images_base64"]},
-                                        "output": tool_result
-                                    })
 
-                                    # Stream the tool result in the format compliance API expects
-                                    # Only include the minimal necessary information to reduce token usage
-                                    if self.message_handler.on_stream:
-                                        # Create a simplified result representation - remove any unnecessarily large fields
-                                        simplified_result = tool_result
-                                        if isinstance(simplified_result, str):
-                                            # Try to parse as JSON to simplify if possible
-                                            try:
-                                                simplified_result = json.loads(simplified_result)
-                                            except:
-                                                pass
-
-                                        # Remove trace and other metadata if present
-                                        if isinstance(simplified_result, dict):
-                                            if "trace_record" in simplified_result:
-                                                del simplified_result["trace_record"]
-
-                                        await self.message_handler.on_stream({
-                                            "type": "tool",
-                                            "content": json.dumps({
-                                                "tool_name": tool_name,
-                                                "tool_input": {k: v for k, v in tool_args.items() if k not in ["image_base64", "images_base64"]},
-                                                "tool_result": simplified_result
-                                            })
-                                        })
-                                except Exception as e:
-                                    print(f"\033[91m[ERROR] Exception in {tool_name}: {e}\033[0m")
-                                    tool_result = {"error": str(e)}
-
-                                    # Stream error to client
-                                    if self.message_handler.on_stream:
-                                        await self.message_handler.on_stream({
-                                            "type": "error",
-                                            "content": f"Error executing tool {tool_name}: {str(e)}"
-                                        })
-
-                                # Add tool result as a message following OpenAI/OpenRouter format
-                                tool_response = {
-                                    "role": "tool",
-                                    "tool_call_id": tool_id,
-                                    "name": tool_name,
-                                    "content": json.dumps(tool_result)  # Must be JSON string per OpenRouter docs
-                                }
+                            # Record results and append the tool messages in the original call order
+                            for outcome in outcomes:
+                                tool_name = outcome["tool_name"]
+                                tool_result = outcome["tool_result"]
+                                if outcome["timing_entry"]:
+                                    timing_metrics["tool_executions"].append(outcome["timing_entry"])
+                                if outcome["trace_entry"]:
+                                    tool_trace.append(outcome["trace_entry"])
 
                                 # Add the tool response to conversation history
-                                await self.message_handler.add_message("tool", tool_response)
+                                await self.message_handler.add_message("tool", outcome["tool_response"])
 
                             # If attempt_completion, proceed to the second step of our two-step approach
                             if tool_name == "attempt_completion":
@@ -1243,27 +1320,8 @@ Here is a summary of key compliance findings from the analysis:
 
                                             # We already removed images from the final prompt, so no additional action needed here
 
-                                            # Save the final messages in a file for debugging purposes
-                                            final_messages_dir = Path("logs/final_report_messages")
-                                            final_messages_dir.mkdir(parents=True, exist_ok=True)
-
-                                            # Create a timestamped filename
-                                            timestamp = int(time.time())
-                                            final_messages_file = final_messages_dir / f"{self.conversation_id}_{timestamp}.json"
-
-                                            # Save messages to file
-                                            try:
-                                                with open(final_messages_file, 'w') as f:
-                                                    # Use a safe JSON serializer that can handle various types
-                                                    json.dump({
-                                                        "conversation_id": self.conversation_id,
-                                                        "timestamp": timestamp,
-                                                        "model": self.model,
-                                                        "messages": messages_for_completion
-                                                    }, f, default=str, indent=2)
-                                                print(f"\033[94m[LOG] Saved final report messages to {final_messages_file}\033[0m")
-                                            except Exception as e:
-                                                print(f"\033[91m[ERROR] Failed to save final report messages to file: {str(e)}\033[0m")
+                                            # Trace the final report request for sampled conversations
+                                            llm_tracer.trace(self.conversation_id, messages_for_completion, self.model, kind="final_report")
 
                                             # Record start time for LLM call
                                             llm_call_start = time.time()
@@ -1275,7 +1333,7 @@ Here is a summary of key compliance findings from the analysis:
                                             current_model = self.model
                                             final_report_response = None
 
-                                            # Process each analysis section sequentially
+                                            # Process the analysis sections
                                             try:
                                                 # Initialize section results dictionary
                                                 section_results = {}
@@ -1287,102 +1345,17 @@ Here is a summary of key compliance findings from the analysis:
                                                 # Initialize executive_summary variable to prevent reference errors
                                                 executive_summary = "Executive summary not available."
                                                 
-                                                # Process each section
-                                                for section in self.ANALYSIS_SECTIONS:
-                                                    section_id = section['id']
-                                                    section_title = section['title']
-                                                    section_instruction = section['instruction']
-                                                    
-                                                    print(f"\033[94m[INFO] Processing analysis section: {section_title}\033[0m")
-                                                    
-                                                    # Notify the user about current section start
-                                                    if self.message_handler.on_stream:
-                                                        # Send text notification
-                                                        await self.message_handler.on_stream({
-                                                            "type": "text",
-                                                            "content": f"🔍 Starting analysis of {section_title.lower()}..."
-                                                        })
-                                                        
-                                                        # Send section start notification as an analysis_section event
-                                                        await self.message_handler.on_stream({
-                                                            "type": "analysis_section",
-                                                            "section_id": section_id,
-                                                            "section_title": section_title,
-                                                            "content": "",  # Empty content initially
-                                                            "is_complete": False
-                                                        })
-                                                    
-                                                    # Create section-specific messages by adding the instruction
-                                                    section_messages = messages_for_completion.copy()
-                                                    section_messages.append({
-                                                        "role": "system",
-                                                        "content": f"{section_instruction}\n\nOnly provide analysis for this specific section. Be thorough but concise."
-                                                    })
-                                                    
-                                                    # Record section start time
-                                                    section_start = time.time()
-                                                    
-                                                    # Try to get analysis for this section
-                                                    try:
-                                                        section_response = await self.client.chat.completions.create(
-                                                            model='google/gemini-2.0-flash-001',
-                                                            messages=section_messages,
-                                                            temperature=self.temperature,
-                                                            max_tokens=2000,  # Shorter response for each section
-                                                            stream=False  # No streaming for section analysis
-                                                        )
-                                                        
-                                                        # Extract the section content
-                                                        if section_response and hasattr(section_response, 'choices') and section_response.choices:
-                                                            if len(section_response.choices) > 0 and hasattr(section_response.choices[0], 'message'):
-                                                                message = section_response.choices[0].message
-                                                                if hasattr(message, 'content') and message.content:
-                                                                    section_results[section_id] = message.content
-                                                                    section_duration = time.time() - section_start
-                                                                    print(f"\033[94m[INFO] Successfully completed {section_title} analysis in {section_duration:.2f}s\033[0m")
-                                                                    
-                                                                    # Notify the user about section completion
-                                                                    if self.message_handler.on_stream:
-                                                                        # First send a text notification
-                                                                        await self.message_handler.on_stream({
-                                                                            "type": "text",
-                                                                            "content": f"✅ Completed analysis of {section_title.lower()} in {section_duration:.1f}s"
-                                                                        })
-                                                                        
-                                                                        # Then send the actual section content as an analysis_section event
-                                                                        await self.message_handler.on_stream({
-                                                                            "type": "analysis_section",
-                                                                            "section_id": section_id,
-                                                                            "section_title": section_title,
-                                                                            "content": message.content,
-                                                                            "is_complete": True
-                                                                        })
-                                                                else:
-                                                                    section_results[section_id] = f"No content available for {section_title}"
-                                                                    print(f"\033[93m[WARNING] No content in response for {section_title}\033[0m")
-                                                            else:
-                                                                section_results[section_id] = f"No valid message for {section_title}"
-                                                                print(f"\033[93m[WARNING] No valid message in response for {section_title}\033[0m")
-                                                        else:
-                                                            section_results[section_id] = f"Invalid response format for {section_title}"
-                                                            print(f"\033[93m[WARNING] Invalid response format for {section_title}\033[0m")
-                                                            
-                                                    except Exception as section_error:
-                                                        error_msg = str(section_error)
-                                                        section_results[section_id] = f"Error analyzing {section_title}: {error_msg[:100]}..."
-                                                        section_errors[section_id] = error_msg
-                                                        print(f"\033[91m[ERROR] Failed to analyze {section_title}: {error_msg}\033[0m")
-                                                        
-                                                        # Notify the user about section error
-                                                        if self.message_handler.on_stream:
-                                                            await self.message_handler.on_stream({
-                                                                "type": "text",
-                                                                "content": f"⚠️ Error analyzing {section_title.lower()}: {error_msg[:100]}..."
-                                                            })
-                                                        
-                                                        # Don't stop the whole process for one section error
-                                                        continue
-                                                
+                                                # Generate the sections concurrently; analysis_section events stream as each
+                                                # one finishes and the results come back in canonical order
+                                                section_results, section_errors = await generate_report_sections(
+                                                    self.client,
+                                                    self.ANALYSIS_SECTIONS,
+                                                    messages_for_completion,
+                                                    self.temperature,
+                                                    on_stream=self.message_handler.on_stream,
+                                                    max_concurrent=self.max_concurrent_sections
+                                                )
+
                                                 # Notify the user that we're generating the final report
                                                 if self.message_handler.on_stream:
                                                     await self.message_handler.on_stream({
@@ -1525,10 +1498,12 @@ Here is a summary of key compliance findings from the analysis:
                                                         "tool_result": final_result
                                                     })
                                                     
-                                                    # Send the complete event
+                                                    # Send the complete event; only a report from a run that finished
+                                                    # on its own with every section generated may be cached
                                                     await self.message_handler.on_stream({
                                                         "type": "complete",
-                                                        "content": complete_event_content
+                                                        "content": complete_event_content,
+                                                        "cacheable": not section_errors and not forced_completion
                                                     })
                                                     
                                                     # Send the analysis results as a separate stream
@@ -2038,7 +2013,10 @@ Here is a summary of key compliance findings from the analysis:
                                             "avg_iteration_time": sum(iter_data["duration"] for iter_data in timing_metrics["iterations"]) / len(timing_metrics["iterations"]) if timing_metrics["iterations"] else 0,
                                             "avg_llm_call_time": sum(call_data["duration"] for call_data in timing_metrics["llm_calls"]) / len(timing_metrics["llm_calls"]) if timing_metrics["llm_calls"] else 0,
                                             "avg_tool_execution_time": sum(tool_data["duration"] for tool_data in timing_metrics["tool_executions"]) / len(timing_metrics["tool_executions"]) if timing_metrics["tool_executions"] else 0,
-                                            "final_report_generation_time": timing_metrics["final_report_generation"]["duration"]
+                                            "final_report_generation_time": timing_metrics["final_report_generation"]["duration"],
+                                            "prompt_cache": timing_metrics["prompt_cache"],
+                                            "cache_read_tokens": sum(entry["cache_read_tokens"] for entry in timing_metrics["prompt_cache"]),
+                                            "cache_write_tokens": sum(entry["cache_write_tokens"] for entry in timing_metrics["prompt_cache"])
                                         }
                                     }
 
@@ -2111,7 +2089,9 @@ Here is a summary of key compliance findings from the analysis:
                                     }
 
                                     # Add image data like in the streaming case
-                                    if tool_name in video_tools:
+                                    if self.media_handle and not frames:
+                                        tool_args = inject_image_data(tool_name, tool_args, image_handle=self.media_handle)
+                                    elif tool_name in video_tools:
                                         tool_args["images_base64"] = [image_base64] if image_base64 else []
                                     else:
                                         tool_args["image_base64"] = image_base64
@@ -2256,11 +2236,10 @@ Here is a summary of key compliance findings from the analysis:
                         print(f"\033[91m[ERROR] Authentication error with OpenRouter API: {error_msg}\033[0m")
                     elif "400" in error_msg:
                         print(f"\033[91m[ERROR] Bad request to OpenRouter API (possible token limit): {error_msg}\033[0m")
-                        # If this is a token limit issue, reduce history more aggressively for next iteration
-                        if token_estimate > 10000:
-                            # Force a more aggressive limit on messages for the next iteration
-                            print(f"\033[93m[WARNING] High token count detected ({token_estimate}), will reduce context\033[0m")
-                            max_msgs = 5  # More aggressive limit on recent messages
+                        # If this is a token limit issue, shrink the context budget for the next iteration
+                        if "context" in error_msg.lower() or "token" in error_msg.lower():
+                            print(f"\033[93m[WARNING] Possible context overflow, will reduce context\033[0m")
+                            self.message_handler.context.shrink()
                     else:
                         print(f"\033[91m[ERROR] Error calling OpenRouter API: {error_msg}\033[0m")
 
@@ -2297,6 +2276,7 @@ Here is a summary of key compliance findings from the analysis:
                     # We've hit max iterations, suggest completion
                     print(f"\033[93m[INFO] OpenRouterAgent.process: Reached {iteration_count} iterations without attempt_completion, suggesting completion\033[0m")
                     suggestion_message = get_force_completion_prompt(self.model)
+                    forced_completion = True
                     await self.message_handler.add_message("user", suggestion_message)
                     await self.message_handler.stream_content("Checking if analysis is ready for completion...")
                 elif iteration_count % 10 == 0:
@@ -2329,6 +2309,10 @@ Here is a summary of key compliance findings from the analysis:
                 "tool_trace": tool_trace,
                 "model": self.model
             }
+        finally:
+            if self.media_handle:
+                media_store.release(self.media_handle)
+                self.media_handle = None
 
         # If we reach here, we exited the loop without a completion
         return {
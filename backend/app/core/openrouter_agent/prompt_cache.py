@@ -0,0 +1,129 @@
+import copy
+from typing import List, Dict, Any, Optional
+
+# Models that need explicit cache_control breakpoints to enable prompt caching.
+# OpenAI and DeepSeek models cache automatically and need no markup.
+CACHE_BREAKPOINT_MODEL_PREFIXES = ("anthropic/", "google/gemini")
+
+# Anthropic allows at most four breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
+
+# Marker that starts the per-user memories appended to the system prompt
+USER_MEMORIES_MARKER = "<User Memories and Feedback>"
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def supports_cache_breakpoints(model: str) -> bool:
+    """Check whether a model needs cache_control breakpoints for prompt caching.
+
+    Args:
+        model: OpenRouter model identifier
+
+    Returns:
+        True if the model supports explicit cache breakpoints
+    """
+    return bool(model) and model.startswith(CACHE_BREAKPOINT_MODEL_PREFIXES)
+
+
+def _split_system_prompt(text: str) -> List[Dict[str, Any]]:
+    """Split a system prompt into the shared base prompt and the user memories.
+
+    The base prompt is identical for every user, so it gets its own breakpoint
+    and stays cached across users even when their memories differ.
+    """
+    marker_index = text.find(USER_MEMORIES_MARKER)
+    if marker_index <= 0:
+        return [{"type": "text", "text": text, "cache_control": CACHE_CONTROL}]
+
+    return [
+        {"type": "text", "text": text[:marker_index], "cache_control": CACHE_CONTROL},
+        {"type": "text", "text": text[marker_index:], "cache_control": CACHE_CONTROL},
+    ]
+
+
+def apply_cache_breakpoints(messages: List[Dict[str, Any]], model: str) -> List[Dict[str, Any]]:
+    """Mark the stable prompt prefix with cache_control breakpoints.
+
+    Breakpoints are placed on the system prompt (split from the user memories
+    when present) and on the first user message carrying an image, so that the
+    prompt and the asset image are read from the provider cache on every
+    iteration after the first. Messages are copied; the input list is not modified.
+
+    Args:
+        messages: Formatted messages ready to send to the API
+        model: OpenRouter model identifier
+
+    Returns:
+        List of messages with cache breakpoints, or the input list unchanged
+        if the model does not support breakpoints
+    """
+    if not supports_cache_breakpoints(model):
+        return messages
+
+    cached_messages = []
+    breakpoints = 0
+    image_message_marked = False
+
+    for message in messages:
+        role = message.get("role")
+        content = message.get("content")
+
+        if role == "system" and isinstance(content, str) and content:
+            parts = _split_system_prompt(content)
+            # Keep one breakpoint in reserve for the image message
+            if breakpoints + len(parts) < MAX_CACHE_BREAKPOINTS:
+                breakpoints += len(parts)
+                cached_messages.append({**message, "content": parts})
+                continue
+
+        if (
+            role == "user"
+            and not image_message_marked
+            and isinstance(content, list)
+            and breakpoints < MAX_CACHE_BREAKPOINTS
+            and any(isinstance(part, dict) and part.get("type") == "image_url" for part in content)
+        ):
+            # cache_control can only be set on text parts, so put the images first
+            # and mark the trailing text part - the breakpoint then covers the images
+            images = [part for part in content if isinstance(part, dict) and part.get("type") == "image_url"]
+            texts = [copy.copy(part) for part in content if not (isinstance(part, dict) and part.get("type") == "image_url")]
+            if not texts:
+                texts = [{"type": "text", "text": "Asset to analyze:"}]
+            texts[-1]["cache_control"] = CACHE_CONTROL
+
+            breakpoints += 1
+            image_message_marked = True
+            cached_messages.append({**message, "content": images + texts})
+            continue
+
+        cached_messages.append(message)
+
+    return cached_messages
+
+
+def extract_cache_usage(usage: Any) -> Optional[Dict[str, int]]:
+    """Extract prompt and cache token counts from an OpenRouter usage object.
+
+    Args:
+        usage: Usage object from a completion or final stream chunk
+
+    Returns:
+        Dict with prompt_tokens, completion_tokens, cache_read_tokens and
+        cache_write_tokens, or None if no usage was reported
+    """
+    if usage is None:
+        return None
+
+    if hasattr(usage, "model_dump"):
+        usage = usage.model_dump()
+    if not isinstance(usage, dict):
+        return None
+
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens") or 0,
+        "completion_tokens": usage.get("completion_tokens") or 0,
+        "cache_read_tokens": details.get("cached_tokens") or 0,
+        "cache_write_tokens": details.get("cache_write_tokens") or usage.get("cache_creation_input_tokens") or 0,
+    }
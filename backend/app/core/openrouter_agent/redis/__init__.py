@@ -1,8 +1,9 @@
 from .connection import get_redis_client, RedisConnectionManager
 from .image_cache import get_image_cache, ImageCache
-from .cache_integration import cache_tool_result, get_cached_image, process_tool_result_with_cache
+from .analysis_cache import get_analysis_cache, AnalysisCache
+from .cache_integration import cache_tool_result, get_cached_result, get_cached_image, get_guideline_version, invalidate_cached_results, is_shared_tool, run_single_flight
 from .health import check_redis_health, initialize_redis
-from .config import get_redis_config, get_cache_config, get_monitoring_config
+from .config import get_redis_config, get_cache_config, get_analysis_cache_config, get_monitoring_config
 from .startup import setup_redis_cache, shutdown_redis_cache
 from .url_parser import parse_redis_url
 
@@ -11,13 +12,20 @@ __all__ = [
     'RedisConnectionManager',
     'get_image_cache',
     'ImageCache',
+    'get_analysis_cache',
+    'AnalysisCache',
     'cache_tool_result',
+    'get_cached_result',
     'get_cached_image',
-    'process_tool_result_with_cache',
+    'get_guideline_version',
+    'invalidate_cached_results',
+    'is_shared_tool',
+    'run_single_flight',
     'check_redis_health',
     'initialize_redis',
     'get_redis_config',
     'get_cache_config',
+    'get_analysis_cache_config',
     'get_monitoring_config',
     'setup_redis_cache',
     'shutdown_redis_cache',
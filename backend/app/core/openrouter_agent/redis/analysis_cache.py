@@ -0,0 +1,207 @@
+import json
+import time
+import base64
+import hashlib
+import logging
+import asyncio
+from typing import Dict, Any, Optional, List
+
+from .connection import get_redis_client
+from .config import get_analysis_cache_config
+
+logger = logging.getLogger(__name__)
+
+# Get configuration
+analysis_cache_config = get_analysis_cache_config()
+
+DEFAULT_TTL = analysis_cache_config["ttl"]  # Default: 7 days in seconds
+MAX_EVENTS = analysis_cache_config["max_events"]
+MAX_ENTRY_BYTES = analysis_cache_config["max_entry_bytes"]
+
+
+def hash_asset(image_base64: str) -> str:
+    """Compute the SHA-256 of the decoded asset bytes.
+
+    Hashing the decoded bytes (rather than the base64 text) makes the key
+    independent of data URL prefixes and base64 line wrapping.
+
+    Args:
+        image_base64: Base64 encoded asset, with or without a data URL prefix
+
+    Returns:
+        Hex digest of the decoded bytes
+    """
+    if image_base64.startswith("data:"):
+        image_base64 = image_base64.split(",", 1)[-1]
+    return hashlib.sha256(base64.b64decode(image_base64)).hexdigest()
+
+
+class AnalysisCache:
+    """Redis-based cache of complete compliance analyses.
+
+    Entries are keyed by the asset content hash, brand, prompt, model and the
+    current guideline version stamp. Re-uploading a guideline bumps the stamp,
+    so every analysis made against older guidelines stops matching and expires
+    through its TTL.
+    """
+
+    def __init__(self, prefix: str = "analysis", ttl: int = DEFAULT_TTL, max_events: int = MAX_EVENTS, max_entry_bytes: int = MAX_ENTRY_BYTES):
+        """Initialize the analysis cache.
+
+        Args:
+            prefix: Key prefix for Redis keys
+            ttl: Time-to-live for cache entries in seconds
+            max_events: Maximum number of streamed events stored with an entry
+            max_entry_bytes: Entries larger than this are stored without their events
+        """
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_events = max_events
+        self.max_entry_bytes = max_entry_bytes
+        self.redis = get_redis_client()
+        # Background stores in flight; the event loop only keeps weak references to tasks
+        self.background_tasks = set()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "invalidations": 0,
+            "errors": 0
+        }
+
+    @property
+    def version_key(self) -> str:
+        return f"{self.prefix}:guideline_version"
+
+    async def get_guideline_version(self) -> int:
+        """Get the current guideline version stamp."""
+        value = await self.redis.get(self.version_key)
+        return int(value) if value else 0
+
+    async def invalidate_guidelines(self) -> Optional[int]:
+        """Bump the guideline version stamp, invalidating all cached analyses.
+
+        The agent resolves the brand from the asset at run time and may read
+        any brand's guidelines, so the stamp is global rather than per brand.
+
+        Returns:
+            The new version stamp, or None if Redis is unavailable
+        """
+        try:
+            version = await self.redis.incr(self.version_key)
+            self.stats["invalidations"] += 1
+            print(f"\033[94m[ANALYSIS CACHE] 🔄 Guidelines changed, version stamp is now {version}\033[0m")
+            return version
+        except Exception as e:
+            logger.error(f"Error invalidating analysis cache: {str(e)}")
+            self.stats["errors"] += 1
+            return None
+
+    async def make_key(self, asset_hash: str, brand_name: Optional[str], prompt: str, model: str) -> str:
+        """Build the cache key for an analysis request.
+
+        Args:
+            asset_hash: SHA-256 of the decoded asset bytes
+            brand_name: Brand name supplied with the request, if any
+            prompt: Full prompt text (system prompt and user text)
+            model: Model used for the analysis
+
+        Returns:
+            A string key for Redis
+        """
+        version = await self.get_guideline_version()
+        key_data = json.dumps({
+            "asset": asset_hash,
+            "brand": (brand_name or "").strip().lower(),
+            "prompt": hashlib.sha256(prompt.encode()).hexdigest(),
+            "model": model,
+            "guideline_version": version
+        }, sort_keys=True)
+        return f"{self.prefix}:{hashlib.sha256(key_data.encode()).hexdigest()}"
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Retrieve a cached analysis.
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            Cached entry with final_report, events and metadata, or None if not found
+        """
+        try:
+            data = await self.redis.get(key)
+            if data is None:
+                self.stats["misses"] += 1
+                print(f"\033[93m[ANALYSIS CACHE] 👎 CACHE MISS for {key}\033[0m")
+                return None
+            self.stats["hits"] += 1
+            print(f"\033[92m[ANALYSIS CACHE] 👍 CACHE HIT for {key} ({len(data) // 1024}KB)\033[0m")
+            return json.loads(data)
+        except Exception as e:
+            logger.exception(f"Error retrieving analysis from cache: {str(e)}")
+            self.stats["errors"] += 1
+            return None
+
+    async def store(self, key: str, final_report: Any, events: Optional[List[Dict[str, Any]]] = None, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """Store a completed analysis.
+
+        Args:
+            key: Key from make_key
+            final_report: Final report sent in the complete event
+            events: Streamed agent events to replay on a hit, if enabled
+            metadata: Extra fields stored with the entry (e.g. brand name and score)
+
+        Returns:
+            True if stored successfully, False otherwise
+        """
+        if events is not None and len(events) > self.max_events:
+            events = None
+        entry = {
+            **(metadata or {}),
+            "final_report": final_report,
+            "events": events,
+            "created_at": int(time.time())
+        }
+        try:
+            data = json.dumps(entry, default=str).encode("utf-8")
+            if len(data) > self.max_entry_bytes and entry["events"]:
+                entry["events"] = None
+                data = json.dumps(entry, default=str).encode("utf-8")
+            await self.redis.set(key, data, ex=self.ttl)
+            self.stats["stores"] += 1
+            print(f"\033[94m[ANALYSIS CACHE] 💾 Stored analysis for {key}\033[0m")
+            return True
+        except Exception as e:
+            logger.exception(f"Error storing analysis in cache: {str(e)}")
+            self.stats["errors"] += 1
+            return False
+
+    def store_in_background(self, key: str, final_report: Any, events: Optional[List[Dict[str, Any]]] = None, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Store an analysis without blocking the response stream."""
+        task = asyncio.create_task(self.store(key, final_report, events, metadata))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics.
+
+        Returns:
+            Dictionary with cache statistics
+        """
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / total if total else 0,
+            "total_requests": total
+        }
+
+
+# Singleton instance
+_analysis_cache_instance = None
+
+def get_analysis_cache() -> AnalysisCache:
+    """Get the singleton AnalysisCache instance."""
+    global _analysis_cache_instance
+    if _analysis_cache_instance is None:
+        _analysis_cache_instance = AnalysisCache()
+    return _analysis_cache_instance
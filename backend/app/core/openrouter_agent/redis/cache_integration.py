@@ -1,8 +1,10 @@
+import json
 import logging
 import asyncio
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
 
 from .image_cache import get_image_cache
+from .analysis_cache import get_analysis_cache
 from .config import get_cache_config, get_monitoring_config
 
 # Get configuration
@@ -20,27 +22,35 @@ IMAGE_RETURNING_TOOLS = cache_config["image_returning_tools"]
 # List of tools that should never be cached
 NEVER_CACHE_TOOLS = cache_config["never_cache_tools"]
 
-async def cache_tool_result(tool_name: str, tool_args: Dict[str, Any], result: Any) -> None:
+# Tools whose results are shared across workers, whether or not they return images
+SHARED_RESULT_TOOLS = cache_config["shared_result_tools"]
+
+# Seconds one worker may hold the single-flight lock of a tool call
+SINGLE_FLIGHT_LOCK_TTL = cache_config["single_flight_lock_ttl"]
+
+def is_shared_tool(tool_name: str) -> bool:
+    """Check whether a tool's results are cached in Redis and shared across workers."""
+    if tool_name in NEVER_CACHE_TOOLS:
+        return False
+    return tool_name in IMAGE_RETURNING_TOOLS or tool_name in SHARED_RESULT_TOOLS
+
+async def cache_tool_result(tool_name: str, tool_args: Dict[str, Any], result: Any, wait: bool = False) -> None:
     """
-    Cache a tool result if it contains base64 images.
+    Cache the complete result of a shared tool in Redis.
     
     Args:
         tool_name: Name of the tool that was executed
         tool_args: Arguments passed to the tool
         result: Result returned by the tool
+        wait: Store before returning (e.g. while other workers wait for it) instead of in the background
     """
-    # Skip tools that should never be cached
-    if tool_name in NEVER_CACHE_TOOLS:
-        return
-    
-    # Only cache tools that return base64 images
-    if tool_name not in IMAGE_RETURNING_TOOLS:
+    # Only cache tools whose results are shared through Redis
+    if not is_shared_tool(tool_name):
         return
     
     try:
         # Parse the result if it's a JSON string
         if isinstance(result, str):
-            import json
             try:
                 result_dict = json.loads(result)
             except json.JSONDecodeError:
@@ -49,69 +59,142 @@ async def cache_tool_result(tool_name: str, tool_args: Dict[str, Any], result: A
         else:
             result_dict = result
         
-        # Check if the result contains a base64 field
-        if isinstance(result_dict, dict) and "base64" in result_dict and result_dict["base64"]:
-            # Get the base64 image data
-            base64_data = result_dict["base64"]
-            
-            # Store the base64 image in Redis cache in the background
-            print(f"\033[94m[REDIS CACHE] 💾 Caching base64 image for tool {tool_name} in the background\033[0m")
-            logger.info(f"Caching base64 image for tool {tool_name} in the background")
-            image_cache = get_image_cache()
-            await image_cache.store_in_background(tool_name, tool_args, base64_data)
+        # Errors are not shared; image tools are only worth a Redis round trip when they carry an image
+        if not isinstance(result_dict, dict) or "error" in result_dict:
+            return
+        if tool_name in IMAGE_RETURNING_TOOLS and not result_dict.get("base64"):
+            return
+        
+        image_cache = get_image_cache()
+        if wait:
+            await image_cache.store(tool_name, tool_args, result)
+        else:
+            # Store the whole result in Redis cache in the background
+            print(f"\033[94m[REDIS CACHE] 💾 Caching result for tool {tool_name} in the background\033[0m")
+            logger.info(f"Caching result for tool {tool_name} in the background")
+            await image_cache.store_in_background(tool_name, tool_args, result)
             
     except Exception as e:
         logger.exception(f"Error caching tool result: {str(e)}")
 
-async def get_cached_image(tool_name: str, tool_args: Dict[str, Any]) -> Optional[str]:
+async def get_cached_result(tool_name: str, tool_args: Dict[str, Any]) -> Optional[Any]:
     """
-    Get a cached base64 image for a tool if available.
+    Get the cached result of a shared tool, if available.
     
     Args:
         tool_name: Name of the tool
         tool_args: Arguments passed to the tool
         
     Returns:
-        Cached base64 image or None if not found
+        The cached tool result, to be used instead of running the tool, or None if not found
     """
-    # Skip tools that should never be cached
-    if tool_name in NEVER_CACHE_TOOLS:
-        return None
-    
-    # Only check cache for tools that return base64 images
-    if tool_name not in IMAGE_RETURNING_TOOLS:
+    # Only check cache for tools whose results are shared through Redis
+    if not is_shared_tool(tool_name):
         return None
     
     try:
-        # Get the cached base64 image
         image_cache = get_image_cache()
-        cached_base64 = await image_cache.get(tool_name, tool_args)
-        
-        if cached_base64:
-            logger.info(f"Found cached base64 image for tool {tool_name}")
-            return cached_base64
-        else:
-            logger.info(f"No cached base64 image found for tool {tool_name}")
-            return None
-            
+        return await image_cache.get(tool_name, tool_args)
     except Exception as e:
-        logger.exception(f"Error getting cached image: {str(e)}")
+        logger.exception(f"Error getting cached result: {str(e)}")
         return None
 
-async def process_tool_result_with_cache(tool_name: str, tool_args: Dict[str, Any], result: Any) -> Any:
+async def get_cached_image(tool_name: str, tool_args: Dict[str, Any]) -> Optional[str]:
+    """
+    Get a cached base64 image for a tool if available.
+    
+    Args:
+        tool_name: Name of the tool
+        tool_args: Arguments passed to the tool
+        
+    Returns:
+        Cached base64 image or None if not found
+    """
+    result = await get_cached_result(tool_name, tool_args)
+    if isinstance(result, str):
+        try:
+            result = json.loads(result)
+        except json.JSONDecodeError:
+            return None
+    if isinstance(result, dict):
+        return result.get("base64")
+    return None
+
+async def run_single_flight(
+    tool_name: str,
+    tool_args: Dict[str, Any],
+    execute_func: Callable[[], Awaitable[Any]]
+) -> Tuple[Any, str]:
     """
-    Process a tool result, potentially replacing base64 fields with cached values.
+    Run a shared tool call at most once across workers.
+    
+    The first worker to take the call's short Redis lock runs the tool and
+    stores its result before releasing the lock; workers that find the lock
+    taken wait for that result instead of running the same call. If the lock
+    lapses without a result, or Redis is unavailable, the tool runs locally.
     
     Args:
         tool_name: Name of the tool
         tool_args: Arguments passed to the tool
-        result: Original result from the tool
+        execute_func: Async function that runs the tool
         
     Returns:
-        Processed result, potentially with cached base64 values
+        Tuple of (tool result, "remote" if another worker produced it, else "executed")
+    """
+    image_cache = get_image_cache()
+    try:
+        token = await image_cache.acquire_lock(tool_name, tool_args, SINGLE_FLIGHT_LOCK_TTL)
+    except Exception as e:
+        logger.error(f"Error taking single-flight lock for {tool_name}: {str(e)}")
+        result = await execute_func()
+        return result, "executed"
+    
+    if token is None:
+        print(f"\033[94m[REDIS CACHE] ⏳ {tool_name} is running in another worker, waiting for its result\033[0m")
+        try:
+            result = await image_cache.wait_for_result(tool_name, tool_args, SINGLE_FLIGHT_LOCK_TTL)
+        except Exception as e:
+            logger.error(f"Error waiting for shared result of {tool_name}: {str(e)}")
+            result = None
+        if result is not None:
+            return result, "remote"
+        result = await execute_func()
+        await cache_tool_result(tool_name, tool_args, result)
+        return result, "executed"
+    
+    try:
+        result = await execute_func()
+        # Store before releasing the lock so waiting workers find the result
+        await cache_tool_result(tool_name, tool_args, result, wait=True)
+        return result, "executed"
+    finally:
+        await image_cache.release_lock(tool_name, tool_args, token)
+
+async def get_guideline_version() -> Optional[int]:
+    """
+    Get the guideline version stamp that is bumped whenever guidelines change.
+    
+    Returns:
+        The version stamp, or None if Redis is unavailable
+    """
+    try:
+        return await get_analysis_cache().get_guideline_version()
+    except Exception as e:
+        logger.error(f"Error reading guideline version: {str(e)}")
+        return None
+
+async def invalidate_cached_results(tool_name: Optional[str] = None) -> int:
     """
-    # Cache the result for future use
-    asyncio.create_task(cache_tool_result(tool_name, tool_args, result))
+    Remove cached results of image-returning tools, e.g. after guidelines change.
     
-    # Return the original result (caching happens in the background)
-    return result
+    Args:
+        tool_name: Optional tool name to remove results for
+        
+    Returns:
+        Number of entries removed
+    """
+    try:
+        return await get_image_cache().invalidate(tool_name)
+    except Exception as e:
+        logger.exception(f"Error invalidating cached results: {str(e)}")
+        return 0
@@ -42,11 +42,14 @@ CACHE_CONFIG = {
     # Default TTL for cached items (24 hours by default)
     "default_ttl": int(os.environ.get("REDIS_CACHE_TTL", 60 * 60 * 24)),
     
-    # Chunk size for large base64 strings (1MB by default)
-    "chunk_size": int(os.environ.get("REDIS_CACHE_CHUNK_SIZE", 1024 * 1024)),
+    # Total size of cached tool results before the least recently used are evicted (256MB by default)
+    "max_bytes": int(os.environ.get("REDIS_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
     
-    # Maximum number of chunks to fetch in parallel
-    "max_parallel_chunks": int(os.environ.get("REDIS_CACHE_MAX_PARALLEL_CHUNKS", 5)),
+    # Results larger than this are not cached (16MB by default)
+    "max_entry_bytes": int(os.environ.get("REDIS_CACHE_MAX_ENTRY_BYTES", 16 * 1024 * 1024)),
+    
+    # Compression of cached images: auto (zstd, then lz4, then zlib), zstd, lz4, zlib or none
+    "compression": os.environ.get("REDIS_CACHE_COMPRESSION", "auto"),
     
     # Tools that return base64 images we want to cache
     "image_returning_tools": [
@@ -54,6 +57,17 @@ CACHE_CONFIG = {
         # Add other tools that return base64 images here
     ],
     
+    # Tools whose results are shared across workers through Redis (guideline lookups are
+    # identical for every user of a brand)
+    "shared_result_tools": [
+        "search_brand_guidelines",
+        "read_guideline_page",
+        "match_brand_colors",
+    ],
+    
+    # Lock held while one worker runs a shared tool call, so other workers wait for its result
+    "single_flight_lock_ttl": float(os.environ.get("REDIS_SINGLE_FLIGHT_LOCK_TTL", 30)),
+    
     # Tools that should never be cached
     "never_cache_tools": [
         "attempt_completion",
@@ -61,6 +75,24 @@ CACHE_CONFIG = {
     ],
 }
 
+# Whole-analysis result cache configuration
+ANALYSIS_CACHE_CONFIG = {
+    # Enable caching of complete compliance analyses
+    "enabled": os.environ.get("ANALYSIS_CACHE_ENABLED", "True").lower() == "true",
+
+    # TTL for cached analyses (7 days by default)
+    "ttl": int(os.environ.get("ANALYSIS_CACHE_TTL", 60 * 60 * 24 * 7)),
+
+    # Store the streamed events so a cache hit can replay them
+    "replay_events": os.environ.get("ANALYSIS_CACHE_REPLAY_EVENTS", "True").lower() == "true",
+
+    # Analyses with more events than this are cached without their events
+    "max_events": int(os.environ.get("ANALYSIS_CACHE_MAX_EVENTS", 2000)),
+
+    # Analyses larger than this (in bytes) are cached without their events
+    "max_entry_bytes": int(os.environ.get("ANALYSIS_CACHE_MAX_ENTRY_BYTES", 8 * 1024 * 1024)),
+}
+
 # Monitoring configuration
 MONITORING_CONFIG = {
     # Enable detailed logging of cache operations
@@ -81,6 +113,10 @@ def get_cache_config() -> Dict[str, Any]:
     """Get the cache configuration."""
     return CACHE_CONFIG
 
+def get_analysis_cache_config() -> Dict[str, Any]:
+    """Get the analysis cache configuration."""
+    return ANALYSIS_CACHE_CONFIG
+
 def get_monitoring_config() -> Dict[str, Any]:
     """Get the monitoring configuration."""
     return MONITORING_CONFIG
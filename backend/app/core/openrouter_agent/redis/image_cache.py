@@ -1,13 +1,16 @@
 import json
 import time
+import uuid
+import base64
+import binascii
 import hashlib
 import logging
-from typing import Dict, Any, Optional, List, Tuple, Union
+from typing import Dict, Any, Optional, List, Tuple
 import asyncio
-import base64
 
 from .connection import get_redis_client
 from .config import get_cache_config, get_monitoring_config
+from .image_codec import pack_image, unpack_image, resolve_compression, ImageCodecError
 
 logger = logging.getLogger(__name__)
 
@@ -16,307 +19,440 @@ cache_config = get_cache_config()
 monitoring_config = get_monitoring_config()
 
 # Constants from configuration
-DEFAULT_CHUNK_SIZE = cache_config["chunk_size"]  # Default: 1MB chunks
 DEFAULT_TTL = cache_config["default_ttl"]  # Default: 24 hours in seconds
-MAX_PARALLEL_CHUNKS = cache_config["max_parallel_chunks"]  # Default: 5 chunks in parallel
+MAX_CACHE_BYTES = cache_config["max_bytes"]  # Default: 256MB across all entries
+MAX_ENTRY_BYTES = cache_config["max_entry_bytes"]  # Default: 16MB per entry
+COMPRESSION = cache_config["compression"]  # Default: fastest installed compressor
 
+# Entries removed per eviction round trip
+EVICTION_BATCH = 32
 
-class ImageCache:
-    """Redis-based cache for large base64 encoded images with chunking support.
+# Background stores in flight; the event loop only keeps weak references to tasks
+_background_tasks = set()
+
+# Seconds between checks while waiting for another worker's result
+LOCK_POLL_INTERVAL = 0.1
+LOCK_POLL_MAX_INTERVAL = 0.5
+
+# Deletes a lock only if it is still held by the caller's token
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
 
-    This class handles caching large base64 encoded images by splitting them into
-    manageable chunks and storing them in Redis with appropriate metadata.
+
+class ImageCache:
+    """Redis-based cache for results of tools that return base64 encoded images.
+
+    Each entry is a single Redis hash holding the complete tool result, so a
+    hit is served without running the tool. A result's base64 image is kept
+    as raw image bytes behind a small binary header (format, dimensions,
+    CRC32), compressed when that makes them smaller, in a field of its own;
+    it is encoded to base64 again only when a hit is returned to the agent.
+    A sorted set indexes entries by
+    last access and a hash records their sizes; when the cache grows beyond
+    its byte budget the least recently used entries are evicted. Entries
+    expire after ttl seconds without being read. No operation scans the
+    keyspace.
     """
 
-    def __init__(self, prefix: str = "guideline_image", chunk_size: int = DEFAULT_CHUNK_SIZE, ttl: int = DEFAULT_TTL):
+    def __init__(self, prefix: str = "guideline_image", ttl: int = DEFAULT_TTL, max_bytes: int = MAX_CACHE_BYTES, max_entry_bytes: int = MAX_ENTRY_BYTES, compression: str = COMPRESSION):
         """Initialize the image cache.
 
         Args:
             prefix: Key prefix for Redis keys
-            chunk_size: Size of each chunk in bytes
             ttl: Time-to-live for cache entries in seconds
+            max_bytes: Total size of cached results kept before evicting the least recently used
+            max_entry_bytes: Results larger than this are not cached
+            compression: Compression for cached images ("auto", "zstd", "lz4", "zlib" or "none")
         """
         self.prefix = prefix
-        self.chunk_size = chunk_size
         self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.compression = resolve_compression(compression)
         self.redis = get_redis_client()
         self.stats = {
             "hits": 0,
             "misses": 0,
             "stores": 0,
             "errors": 0,
-            "chunk_stores": 0,
-            "chunk_retrievals": 0
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "oversized": 0,
+            "corrupt": 0,
+            "bytes_stored": 0,
+            "bytes_served": 0,
+            "bytes_evicted": 0,
+            "images_packed": 0,
+            "image_base64_bytes": 0,
+            "image_packed_bytes": 0,
+            "locks_acquired": 0,
+            "lock_waits": 0,
+            "lock_wait_hits": 0
         }
 
+    @property
+    def index_key(self) -> str:
+        """Sorted set of entry keys scored by last access time."""
+        return f"{self.prefix}:lru"
+
+    @property
+    def sizes_key(self) -> str:
+        """Hash of entry key to entry size in bytes."""
+        return f"{self.prefix}:sizes"
+
+    @property
+    def total_key(self) -> str:
+        """Total size of all indexed entries in bytes."""
+        return f"{self.prefix}:bytes"
+
     def _generate_key(self, tool_name: str, args: Dict[str, Any]) -> str:
         """Generate a deterministic cache key based on tool name and arguments.
 
         Args:
             tool_name: Name of the tool being cached
-            args: Tool arguments (excluding large base64 data)
+            args: Tool arguments
 
         Returns:
             A string key for Redis
         """
-        # Create a copy of args without any large base64 data to avoid huge keys
+        # Large strings (base64 data) enter the key as a content hash, not verbatim;
+        # task_detail only describes the call, so identical calls share an entry
         filtered_args = {}
         for k, v in args.items():
-            # Skip large string values that might be base64 data
-            if isinstance(v, str) and len(v) > 1000 and ("," in v[:100] or ";" in v[:100]):
-                filtered_args[k] = f"<base64_data_{len(v)}bytes>"
+            if k == "task_detail":
+                continue
+            if isinstance(v, str) and len(v) > 1000:
+                filtered_args[k] = f"sha256:{hashlib.sha256(v.encode()).hexdigest()}"
             else:
                 filtered_args[k] = v
 
         # Create a deterministic string representation and hash it
-        key_data = f"{tool_name}:{json.dumps(filtered_args, sort_keys=True)}"
-        key_hash = hashlib.md5(key_data.encode()).hexdigest()
+        key_data = f"{tool_name}:{json.dumps(filtered_args, sort_keys=True, default=str)}"
+        key_hash = hashlib.sha256(key_data.encode()).hexdigest()
         return f"{self.prefix}:{tool_name}:{key_hash}"
 
-    async def _manage_cache_memory(self, clear_percentage: float = 0.35) -> None:
-        """Clear a percentage of the cache to manage memory usage.
+    async def _remove(self, keys: List[bytes], reason: str) -> int:
+        """Delete entries and drop them from the index and the byte total.
 
         Args:
-            clear_percentage: Percentage of keys to clear (0.0 to 1.0)
+            keys: Entry keys as returned by the index
+            reason: Stat to count the removals under
+
+        Returns:
+            Number of bytes released
         """
-        try:
-            # Get all keys with our prefix
-            pattern = f"{self.prefix}:*:metadata"
-            keys = await self.redis.keys(pattern)
-
-            if not keys:
-                print(f"\033[94m[REDIS CACHE] No keys to clear for pattern {pattern}\033[0m")
-                return
-
-            # Calculate how many keys to remove
-            total_keys = len(keys)
-            keys_to_remove = int(total_keys * clear_percentage)
-
-            if keys_to_remove == 0:
-                keys_to_remove = 1  # Remove at least one key
-
-            print(f"\033[94m[REDIS CACHE] 🧹 Clearing {keys_to_remove}/{total_keys} keys ({clear_percentage*100:.1f}%) to manage memory\033[0m")
-
-            # Sort keys by creation time if possible, otherwise just take random keys
-            keys_to_delete = keys[:keys_to_remove]
-
-            # For each metadata key, get the chunk count and delete all related chunks
-            pipe = self.redis.pipeline()
-            deleted_chunks = 0
-
-            for metadata_key in keys_to_delete:
-                # Get metadata to find out how many chunks
-                metadata_bytes = await self.redis.get(metadata_key)
-                if metadata_bytes:
-                    try:
-                        metadata = json.loads(metadata_bytes.decode('utf-8'))
-                        chunk_count = metadata.get("chunk_count", 0)
-                        base_key = metadata_key[:-9]  # Remove ":metadata" suffix
-
-                        # Delete all chunks
-                        for i in range(chunk_count):
-                            pipe.delete(f"{base_key}:chunk:{i}")
-                            deleted_chunks += 1
-
-                        # Delete metadata
-                        pipe.delete(metadata_key)
-                    except json.JSONDecodeError:
-                        # If metadata is corrupted, just delete the key
-                        pipe.delete(metadata_key)
-                else:
-                    # If metadata doesn't exist, just delete the key
-                    pipe.delete(metadata_key)
-
-            # Execute all deletions
-            await pipe.execute()
-            print(f"\033[94m[REDIS CACHE] 🧹 Cleared {len(keys_to_delete)} metadata keys and approximately {deleted_chunks} chunk keys\033[0m")
+        if not keys:
+            return 0
+        sizes = await self.redis.hmget(self.sizes_key, keys)
+        released = sum(int(size) for size in sizes if size)
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(*keys)
+        pipe.hdel(self.sizes_key, *keys)
+        pipe.zrem(self.index_key, *keys)
+        pipe.decrby(self.total_key, released)
+        await pipe.execute()
 
-        except Exception as e:
-            logger.error(f"Error managing cache memory: {str(e)}")
-            print(f"\033[91m[REDIS CACHE] ❌ Error managing cache memory: {str(e)}\033[0m")
+        self.stats[reason] += len(keys)
+        if reason == "evictions":
+            self.stats["bytes_evicted"] += released
+        return released
+
+    async def _trim(self, total_bytes: int) -> None:
+        """Drop index entries whose TTL has passed, then evict least recently used entries over budget."""
+        # Entries expire in Redis on their own; their index and size records are cleaned up here
+        expired = await self.redis.zrangebyscore(self.index_key, "-inf", time.time() - self.ttl, start=0, num=EVICTION_BATCH)
+        if expired:
+            total_bytes -= await self._remove(expired, "expirations")
+
+        while total_bytes > self.max_bytes:
+            oldest = await self.redis.zrange(self.index_key, 0, EVICTION_BATCH - 1)
+            if not oldest:
+                break
+            released = await self._remove(oldest, "evictions")
+            total_bytes -= released
+            print(f"\033[94m[REDIS CACHE] 🧹 Evicted {len(oldest)} least recently used entries ({released // 1024}KB)\033[0m")
+
+    def _pack(self, result: Any) -> Tuple[bytes, str, Optional[bytes]]:
+        """Split a result into its JSON fields and its packed image, if it carries one.
 
-    async def _store_chunks(self, base_key: str, data: str) -> Dict[str, Any]:
-        """Split and store data in chunks.
+        Returns:
+            Tuple of (UTF-8 result without the image data, encoding, packed image or None)
+        """
+        is_text = isinstance(result, str)
+        encoding = "text" if is_text else "json"
+        parsed = result
+        if is_text:
+            try:
+                parsed = json.loads(result)
+            except ValueError:
+                parsed = None
+
+        image_data = parsed.get("base64") if isinstance(parsed, dict) else None
+        if isinstance(image_data, str) and image_data:
+            # A data URL keeps its prefix in the JSON; only the image bytes are packed
+            prefix = ""
+            if image_data.startswith("data:"):
+                head, _, image_data = image_data.partition(",")
+                prefix = f"{head},"
+            try:
+                raw = base64.b64decode(image_data, validate=True)
+            except (binascii.Error, ValueError):
+                raw = None
+            if raw:
+                packed = pack_image(raw, self.compression)
+                self.stats["images_packed"] += 1
+                self.stats["image_base64_bytes"] += len(image_data)
+                self.stats["image_packed_bytes"] += len(packed)
+                return json.dumps({**parsed, "base64": prefix}).encode("utf-8"), f"{encoding}+image", packed
+
+        data = result if is_text else json.dumps(result)
+        return data.encode("utf-8"), encoding, None
+
+    async def store(self, tool_name: str, args: Dict[str, Any], result: Any) -> bool:
+        """Store a complete tool result in the cache.
 
         Args:
-            base_key: Base Redis key for the image
-            data: Base64 encoded image data
+            tool_name: Name of the tool that produced the result
+            args: Arguments passed to the tool
+            result: Tool result (a JSON string or a JSON-serializable value)
 
         Returns:
-            Metadata about the stored chunks
+            True if stored successfully, False otherwise
         """
-        # First, manage cache memory by clearing some percentage of existing keys
-        await self._manage_cache_memory(clear_percentage=0.35)
-
-        # Convert string to bytes if needed
-        if isinstance(data, str):
-            data_bytes = data.encode('utf-8')
-        else:
-            data_bytes = data
-
-        # Split into chunks
-        chunks = [data_bytes[i:i+self.chunk_size] for i in range(0, len(data_bytes), self.chunk_size)]
-        chunk_count = len(chunks)
-
-        # Store metadata
-        metadata = {
-            "chunk_count": chunk_count,
-            "total_size": len(data_bytes),
-            "chunk_size": self.chunk_size,
-            "created_at": int(time.time()),
-            "expires_at": int(time.time()) + self.ttl
-        }
+        try:
+            data, encoding, image = self._pack(result)
+            size = len(data) + len(image or b"")
+            if size > self.max_entry_bytes:
+                self.stats["oversized"] += 1
+                return False
 
-        # Store metadata
-        await self.redis.set(
-            f"{base_key}:metadata",
-            json.dumps(metadata).encode('utf-8'),
-            ex=self.ttl
-        )
+            key = self._generate_key(tool_name, args)
+            previous = await self.redis.hget(self.sizes_key, key)
 
-        # Store chunks in parallel with pipeline
-        pipe = self.redis.pipeline()
-        for i, chunk in enumerate(chunks):
-            pipe.set(f"{base_key}:chunk:{i}", chunk, ex=self.ttl)
-            self.stats["chunk_stores"] += 1
+            entry = {"result": data, "encoding": encoding, "created_at": int(time.time())}
+            if image is not None:
+                entry["image"] = image
 
-        await pipe.execute()
-        print(f"\033[94m[REDIS CACHE] 💾 Stored {chunk_count} chunks ({len(data_bytes) // 1024}KB) for key {base_key}\033[0m")
-        logger.debug(f"Stored {chunk_count} chunks for key {base_key}")
-        return metadata
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(key)
+            pipe.hset(key, mapping=entry)
+            pipe.expire(key, self.ttl)
+            pipe.zadd(self.index_key, {key: time.time()})
+            pipe.hset(self.sizes_key, key, size)
+            pipe.incrby(self.total_key, size - int(previous or 0))
+            total_bytes = (await pipe.execute())[-1]
 
-    async def _retrieve_chunks(self, base_key: str) -> Optional[bytes]:
-        """Retrieve and combine chunks for an image.
+            self.stats["stores"] += 1
+            self.stats["bytes_stored"] += size
+            print(f"\033[94m[REDIS CACHE] 💾 Stored result ({size // 1024}KB) for key {key}\033[0m")
 
-        Args:
-            base_key: Base Redis key for the image
+            await self._trim(int(total_bytes))
+            return True
+        except Exception as e:
+            logger.exception(f"Error storing image in cache: {str(e)}")
+            self.stats["errors"] += 1
+            return False
 
-        Returns:
-            Combined data from all chunks or None if not found
+    @staticmethod
+    def _decode(data: bytes, encoding: Optional[bytes], image: Optional[bytes] = None) -> Any:
+        """Rebuild a stored result; a packed image is verified and encoded to base64 here, at the edge.
+
+        Raises:
+            ImageCodecError: If the entry's image is missing or fails its checksum
         """
-        # Get metadata
-        metadata_bytes = await self.redis.get(f"{base_key}:metadata")
-        if not metadata_bytes:
+        text = data.decode("utf-8")
+        if encoding in (b"text+image", b"json+image"):
+            if image is None:
+                raise ImageCodecError("Cached result is missing its image")
+            _, raw = unpack_image(image)
+            result = json.loads(text)
+            result["base64"] = result.get("base64", "") + base64.b64encode(raw).decode("ascii")
+            return json.dumps(result) if encoding == b"text+image" else result
+        return json.loads(text) if encoding == b"json" else text
+
+    async def _load(self, key: str, values: List[Optional[bytes]]) -> Optional[Any]:
+        """Decode the result, encoding and image fields of an entry, dropping it if it is corrupt."""
+        data, encoding, image = values
+        try:
+            result = self._decode(data, encoding, image)
+        except (ImageCodecError, ValueError) as e:
+            logger.error(f"Dropping corrupt cache entry {key}: {str(e)}")
+            await self._remove([key.encode()], "corrupt")
             return None
+        self.stats["bytes_served"] += len(data) + len(image or b"")
+        return result
 
-        metadata = json.loads(metadata_bytes.decode('utf-8'))
-        chunk_count = metadata["chunk_count"]
+    async def get(self, tool_name: str, args: Dict[str, Any]) -> Optional[Any]:
+        """Retrieve a cached tool result.
 
-        # Retrieve chunks in batches to avoid too many concurrent operations
-        all_chunks = []
-        for batch_start in range(0, chunk_count, MAX_PARALLEL_CHUNKS):
-            batch_end = min(batch_start + MAX_PARALLEL_CHUNKS, chunk_count)
-            batch_keys = [f"{base_key}:chunk:{i}" for i in range(batch_start, batch_end)]
+        Args:
+            tool_name: Name of the tool
+            args: Arguments passed to the tool
 
-            # Get chunks in parallel
-            chunk_data = await self.redis.mget(batch_keys)
-            self.stats["chunk_retrievals"] += len(batch_keys)
+        Returns:
+            The tool result as it was stored, or None if not found
+        """
+        try:
+            key = self._generate_key(tool_name, args)
+            values = await self.redis.hmget(key, ["result", "encoding", "image"])
+            result = await self._load(key, values) if values[0] is not None else None
 
-            # Check if any chunks are missing
-            if None in chunk_data:
-                logger.error(f"Missing chunks for {base_key}, cache may be corrupted")
-                self.stats["errors"] += 1
+            if result is None:
+                self.stats["misses"] += 1
+                print(f"\033[93m[REDIS CACHE] 👎 CACHE MISS for tool {tool_name}\033[0m")
                 return None
 
-            all_chunks.extend(chunk_data)
-
-        # Combine chunks
-        combined_data = b''.join(all_chunks)
+            # Refresh recency and expiry; entries live while they keep being read
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zadd(self.index_key, {key: time.time()}, xx=True)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
 
-        # Verify size
-        if len(combined_data) != metadata["total_size"]:
-            logger.error(f"Size mismatch for {base_key}: expected {metadata['total_size']}, got {len(combined_data)}")
+            self.stats["hits"] += 1
+            print(f"\033[92m[REDIS CACHE] 👍 CACHE HIT for tool {tool_name}\033[0m")
+            return result
+        except Exception as e:
+            logger.exception(f"Error retrieving image from cache: {str(e)}")
             self.stats["errors"] += 1
             return None
 
-        return combined_data
-
-    async def store(self, tool_name: str, args: Dict[str, Any], result: str) -> bool:
-        """Store a base64 encoded image in the cache.
+    async def invalidate(self, tool_name: Optional[str] = None) -> int:
+        """Remove all cached results, or those of one tool.
 
         Args:
-            tool_name: Name of the tool that produced the result
-            args: Arguments passed to the tool
-            result: Base64 encoded image data
+            tool_name: Optional tool name to remove results for
 
         Returns:
-            True if stored successfully, False otherwise
+            Number of entries removed
         """
         try:
-            key = self._generate_key(tool_name, args)
-            await self._store_chunks(key, result)
-            self.stats["stores"] += 1
-            logger.info(f"Stored image in cache for tool {tool_name} with key {key}")
-            return True
+            keys = await self.redis.zrange(self.index_key, 0, -1)
+            if tool_name:
+                tool_prefix = f"{self.prefix}:{tool_name}:".encode()
+                keys = [key for key in keys if key.startswith(tool_prefix)]
+            for start in range(0, len(keys), EVICTION_BATCH):
+                await self._remove(keys[start:start + EVICTION_BATCH], "invalidations")
+            if keys:
+                print(f"\033[94m[REDIS CACHE] 🔄 Invalidated {len(keys)} cached results\033[0m")
+            return len(keys)
         except Exception as e:
-            logger.exception(f"Error storing image in cache: {str(e)}")
+            logger.error(f"Error invalidating image cache: {str(e)}")
             self.stats["errors"] += 1
-            return False
+            return 0
 
-    async def get(self, tool_name: str, args: Dict[str, Any]) -> Optional[str]:
-        """Retrieve a base64 encoded image from the cache.
+    async def acquire_lock(self, tool_name: str, args: Dict[str, Any], ttl: float) -> Optional[str]:
+        """Take the short lock that marks a tool call as running in this worker.
 
         Args:
             tool_name: Name of the tool
             args: Arguments passed to the tool
+            ttl: Seconds after which the lock lapses even if never released
 
         Returns:
-            Base64 encoded image data or None if not found
+            Token to release the lock with, or None if another worker holds it
         """
+        token = uuid.uuid4().hex
+        acquired = await self.redis.set(f"{self._generate_key(tool_name, args)}:lock", token, nx=True, px=int(ttl * 1000))
+        if not acquired:
+            return None
+        self.stats["locks_acquired"] += 1
+        return token
+
+    async def release_lock(self, tool_name: str, args: Dict[str, Any], token: str) -> None:
+        """Release a lock taken by acquire_lock, unless it has lapsed and been taken by another worker."""
         try:
-            # Occasionally manage cache memory on cache hits too (with lower probability)
-            if hash(str(args)) % 5 == 0:  # ~20% chance to clear cache on get
-                await self._manage_cache_memory(clear_percentage=0.15)  # Clear less on gets
+            await self.redis.eval(_RELEASE_LOCK_SCRIPT, 1, f"{self._generate_key(tool_name, args)}:lock", token)
+        except Exception as e:
+            logger.error(f"Error releasing single-flight lock: {str(e)}")
 
-            key = self._generate_key(tool_name, args)
-            data = await self._retrieve_chunks(key)
-
-            if data is not None:
-                self.stats["hits"] += 1
-                print(f"\033[92m[REDIS CACHE] 👍 CACHE HIT for tool {tool_name} - Using cached base64 image ({len(data) // 1024}KB)\033[0m")
-                logger.info(f"Cache hit for tool {tool_name} with key {key}")
-                # Convert bytes back to string if it was stored as bytes
-                return data.decode('utf-8')
-            else:
-                self.stats["misses"] += 1
-                print(f"\033[93m[REDIS CACHE] 👎 CACHE MISS for tool {tool_name} - Need to fetch base64 image\033[0m")
-                logger.info(f"Cache miss for tool {tool_name} with key {key}")
+    async def wait_for_result(self, tool_name: str, args: Dict[str, Any], timeout: float) -> Optional[Any]:
+        """Wait for another worker that holds the lock to store its result.
+
+        Args:
+            tool_name: Name of the tool
+            args: Arguments passed to the tool
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            The stored result, or None if the lock was released or lapsed without one
+        """
+        key = self._generate_key(tool_name, args)
+        self.stats["lock_waits"] += 1
+        deadline = time.monotonic() + timeout
+        interval = LOCK_POLL_INTERVAL
+        while time.monotonic() < deadline:
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, LOCK_POLL_MAX_INTERVAL)
+
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hmget(key, ["result", "encoding", "image"])
+            pipe.exists(f"{key}:lock")
+            values, locked = await pipe.execute()
+            if values[0] is not None:
+                result = await self._load(key, values)
+                if result is not None:
+                    self.stats["lock_wait_hits"] += 1
+                    print(f"\033[92m[REDIS CACHE] 👍 Received result for tool {tool_name} from another worker\033[0m")
+                return result
+            if not locked:
                 return None
-        except Exception as e:
-            logger.exception(f"Error retrieving image from cache: {str(e)}")
-            self.stats["errors"] += 1
-            return None
+        return None
 
-    async def store_in_background(self, tool_name: str, args: Dict[str, Any], result: str) -> None:
-        """Store image in cache without blocking the main process.
+    async def store_in_background(self, tool_name: str, args: Dict[str, Any], result: Any) -> None:
+        """Store a result in the cache without blocking the main process.
 
-        This method starts a background task to store the image data without
+        This method starts a background task to store the result without
         waiting for it to complete, allowing the main process to continue.
 
         Args:
             tool_name: Name of the tool that produced the result
             args: Arguments passed to the tool
-            result: Base64 encoded image data
+            result: Tool result
         """
         # Create a task but don't wait for it
-        asyncio.create_task(self.store(tool_name, args, result))
+        task = asyncio.create_task(self.store(tool_name, args, result))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
         logger.debug(f"Started background task to cache result for tool {tool_name}")
 
     async def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics.
 
         Returns:
-            Dictionary with cache statistics
+            Dictionary with cache statistics, including the entries and bytes held in Redis
         """
         hit_rate = 0
         if (self.stats["hits"] + self.stats["misses"]) > 0:
             hit_rate = self.stats["hits"] / (self.stats["hits"] + self.stats["misses"])
 
-        return {
+        stats = {
             **self.stats,
             "hit_rate": hit_rate,
-            "total_requests": self.stats["hits"] + self.stats["misses"]
+            "total_requests": self.stats["hits"] + self.stats["misses"],
+            "max_bytes": self.max_bytes,
+            "compression": self.compression,
+            # Stored size of packed images relative to their base64 text
+            "image_storage_ratio": (
+                self.stats["image_packed_bytes"] / self.stats["image_base64_bytes"]
+                if self.stats["image_base64_bytes"] else None
+            )
         }
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zcard(self.index_key)
+            pipe.get(self.total_key)
+            entries, total_bytes = await pipe.execute()
+            stats["entries"] = entries
+            stats["total_bytes"] = int(total_bytes or 0)
+        except Exception as e:
+            logger.error(f"Error reading image cache size: {str(e)}")
+        return stats
 
 # Singleton instance
 _image_cache_instance = None
@@ -0,0 +1,170 @@
+import io
+import struct
+import zlib
+import logging
+from typing import Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Optional fast compressors; zlib from the standard library is the fallback
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Magic, version, compression, format, width, height, raw length, CRC32 of the raw bytes
+_HEADER = struct.Struct(">4sBBBxIIII")
+MAGIC = b"BCIM"
+VERSION = 1
+HEADER_SIZE = _HEADER.size
+
+COMPRESSION_CODES = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+COMPRESSION_NAMES = {code: name for name, code in COMPRESSION_CODES.items()}
+
+FORMAT_CODES = {"unknown": 0, "png": 1, "jpeg": 2, "webp": 3, "gif": 4, "bmp": 5}
+FORMAT_NAMES = {code: name for name, code in FORMAT_CODES.items()}
+
+# Compressed payloads are kept only when they save at least this fraction of the raw size;
+# PNG and JPEG data rarely shrink, and then decompressing on every hit would buy nothing
+MIN_COMPRESSION_SAVING = 0.05
+
+
+class ImageCodecError(ValueError):
+    """Raised when a packed image is malformed or fails its checksum."""
+
+
+def available_compression() -> str:
+    """Fastest compressor installed: zstd, then lz4, then zlib."""
+    if zstandard is not None:
+        return "zstd"
+    if lz4_frame is not None:
+        return "lz4"
+    return "zlib"
+
+
+def resolve_compression(name: str) -> str:
+    """Map a configured compression name ("auto", "zstd", "lz4", "zlib" or "none") to one that is installed."""
+    name = (name or "auto").lower()
+    if name == "auto":
+        return available_compression()
+    if (name == "zstd" and zstandard is None) or (name == "lz4" and lz4_frame is None):
+        fallback = available_compression()
+        logger.warning(f"{name} is not installed, compressing cached images with {fallback}")
+        return fallback
+    if name not in COMPRESSION_CODES:
+        logger.warning(f"Unknown image cache compression '{name}', storing images uncompressed")
+        return "none"
+    return name
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=1).compress(data)
+    if compression == "lz4":
+        return lz4_frame.compress(data)
+    if compression == "zlib":
+        return zlib.compress(data, 1)
+    return data
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImageCodecError("Cached image is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == "lz4":
+        if lz4_frame is None:
+            raise ImageCodecError("Cached image is lz4-compressed but lz4 is not installed")
+        return lz4_frame.decompress(data)
+    if compression == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+def probe_image(raw: bytes) -> Tuple[str, int, int]:
+    """Read the format and dimensions of encoded image bytes from their header, without decoding pixels.
+
+    Returns:
+        Tuple of (format name, width, height); ("unknown", 0, 0) if the bytes are not a readable image
+    """
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(raw)) as image:
+            fmt = (image.format or "unknown").lower()
+            width, height = image.size
+    except Exception:
+        return "unknown", 0, 0
+    return (fmt if fmt in FORMAT_CODES else "unknown"), width, height
+
+
+def pack_image(raw: bytes, compression: str = "none") -> bytes:
+    """Pack encoded image bytes behind a small binary header, compressing them if that pays off.
+
+    Args:
+        raw: Encoded image bytes (PNG, JPEG, ...)
+        compression: Installed compression to try, as returned by resolve_compression
+
+    Returns:
+        Header followed by the (possibly compressed) image bytes
+    """
+    fmt, width, height = probe_image(raw)
+    payload = raw
+    if compression != "none":
+        compressed = _compress(raw, compression)
+        if len(compressed) <= len(raw) * (1 - MIN_COMPRESSION_SAVING):
+            payload = compressed
+        else:
+            compression = "none"
+    header = _HEADER.pack(
+        MAGIC, VERSION, COMPRESSION_CODES[compression], FORMAT_CODES[fmt],
+        width, height, len(raw), zlib.crc32(raw)
+    )
+    return header + payload
+
+
+def read_header(blob: bytes) -> Dict[str, Any]:
+    """Parse the header of a packed image.
+
+    Raises:
+        ImageCodecError: If the blob is not a packed image of a known version
+    """
+    if len(blob) < HEADER_SIZE:
+        raise ImageCodecError("Packed image is shorter than its header")
+    magic, version, compression, fmt, width, height, size, checksum = _HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION or compression not in COMPRESSION_NAMES:
+        raise ImageCodecError("Packed image has an unknown header")
+    return {
+        "format": FORMAT_NAMES.get(fmt, "unknown"),
+        "width": width,
+        "height": height,
+        "size": size,
+        "stored_size": len(blob),
+        "compression": COMPRESSION_NAMES[compression],
+        "crc32": checksum,
+    }
+
+
+def unpack_image(blob: bytes) -> Tuple[Dict[str, Any], bytes]:
+    """Unpack a packed image and verify its checksum.
+
+    Returns:
+        Tuple of (header fields, encoded image bytes)
+
+    Raises:
+        ImageCodecError: If the header, length or checksum does not match
+    """
+    header = read_header(blob)
+    try:
+        raw = _decompress(blob[HEADER_SIZE:], header["compression"])
+    except ImageCodecError:
+        raise
+    except Exception as e:
+        raise ImageCodecError(f"Packed image failed to decompress: {e}") from e
+    if len(raw) != header["size"] or zlib.crc32(raw) != header["crc32"]:
+        raise ImageCodecError("Packed image failed its checksum")
+    return header, raw
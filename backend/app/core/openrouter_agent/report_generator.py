@@ -1 +1,168 @@
-# This file will contain the logic for generating compliance reports.
+import os
+import time
+import asyncio
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+
+# Model used for the per-section analysis calls
+SECTION_MODEL = "google/gemini-2.0-flash-001"
+
+# Maximum number of section calls in flight at the same time
+MAX_CONCURRENT_SECTIONS = int(os.getenv("MAX_CONCURRENT_SECTIONS", 6))
+
+# The synthesis section summarizes the others, so it runs last over their results
+SYNTHESIS_SECTION_ID = "final_synthesis"
+
+
+def _extract_content(response) -> Optional[str]:
+    """Extract the message content from a non-streaming completion response."""
+    if response and hasattr(response, 'choices') and response.choices:
+        message = getattr(response.choices[0], 'message', None)
+        if message is not None and getattr(message, 'content', None):
+            return message.content
+    return None
+
+
+async def generate_section(
+    client,
+    section: Dict[str, str],
+    messages_for_completion: List[Dict[str, Any]],
+    temperature: float,
+    on_stream: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    extra_context: Optional[str] = None,
+) -> Tuple[str, Optional[str]]:
+    """Generate the analysis for a single report section.
+
+    Args:
+        client: AsyncOpenAI client configured for OpenRouter
+        section: Section definition with id, title and instruction
+        messages_for_completion: Shared conversation context for the report
+        temperature: Temperature parameter for generation
+        on_stream: Optional callback for streaming section events
+        extra_context: Optional text appended to the section instruction
+
+    Returns:
+        Tuple of (section content, error message or None)
+    """
+    section_id = section['id']
+    section_title = section['title']
+
+    # The shared context comes first so every section call sends the same prefix
+    instruction = f"{section['instruction']}\n\nOnly provide analysis for this specific section. Be thorough but concise."
+    if extra_context:
+        instruction = f"{instruction}\n\n{extra_context}"
+    section_messages = messages_for_completion + [{"role": "system", "content": instruction}]
+
+    section_start = time.time()
+    try:
+        section_response = await client.chat.completions.create(
+            model=SECTION_MODEL,
+            messages=section_messages,
+            temperature=temperature,
+            max_tokens=2000,  # Shorter response for each section
+            stream=False  # No streaming for section analysis
+        )
+    except Exception as section_error:
+        error_msg = str(section_error)
+        print(f"\033[91m[ERROR] Failed to analyze {section_title}: {error_msg}\033[0m")
+
+        # Notify the user about section error
+        if on_stream:
+            await on_stream({
+                "type": "text",
+                "content": f"⚠️ Error analyzing {section_title.lower()}: {error_msg[:100]}..."
+            })
+        return f"Error analyzing {section_title}: {error_msg[:100]}...", error_msg
+
+    content = _extract_content(section_response)
+    if not content:
+        print(f"\033[93m[WARNING] No content in response for {section_title}\033[0m")
+        return f"No content available for {section_title}", None
+
+    section_duration = time.time() - section_start
+    print(f"\033[94m[INFO] Successfully completed {section_title} analysis in {section_duration:.2f}s\033[0m")
+
+    # Notify the user about section completion as soon as it finishes
+    if on_stream:
+        await on_stream({
+            "type": "text",
+            "content": f"✅ Completed analysis of {section_title.lower()} in {section_duration:.1f}s"
+        })
+        await on_stream({
+            "type": "analysis_section",
+            "section_id": section_id,
+            "section_title": section_title,
+            "content": content,
+            "is_complete": True
+        })
+
+    return content, None
+
+
+async def generate_report_sections(
+    client,
+    sections: List[Dict[str, str]],
+    messages_for_completion: List[Dict[str, Any]],
+    temperature: float,
+    on_stream: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    max_concurrent: int = MAX_CONCURRENT_SECTIONS,
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Generate all report sections concurrently.
+
+    Independent sections are launched together under a concurrency limit and
+    their analysis_section events are streamed as each one completes. The
+    synthesis section runs last with the other sections' results as context.
+
+    Args:
+        client: AsyncOpenAI client configured for OpenRouter
+        sections: Section definitions in canonical report order
+        messages_for_completion: Shared conversation context for the report
+        temperature: Temperature parameter for generation
+        on_stream: Optional callback for streaming section events
+        max_concurrent: Maximum number of section calls in flight
+
+    Returns:
+        Tuple of (section results in canonical order, section errors)
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+    results: Dict[str, str] = {}
+    errors: Dict[str, str] = {}
+
+    # Announce every section up front so the client can render placeholders
+    if on_stream:
+        for section in sections:
+            await on_stream({
+                "type": "text",
+                "content": f"🔍 Starting analysis of {section['title'].lower()}..."
+            })
+            await on_stream({
+                "type": "analysis_section",
+                "section_id": section['id'],
+                "section_title": section['title'],
+                "content": "",  # Empty content initially
+                "is_complete": False
+            })
+
+    async def run_section(section, extra_context=None):
+        async with semaphore:
+            content, error = await generate_section(
+                client, section, messages_for_completion, temperature, on_stream, extra_context
+            )
+        results[section['id']] = content
+        if error:
+            errors[section['id']] = error
+
+    independent = [s for s in sections if s['id'] != SYNTHESIS_SECTION_ID]
+    synthesis = [s for s in sections if s['id'] == SYNTHESIS_SECTION_ID]
+
+    print(f"\033[94m[INFO] Generating {len(independent)} report sections concurrently (limit {max_concurrent})\033[0m")
+    await asyncio.gather(*(run_section(section) for section in independent))
+
+    for section in synthesis:
+        findings = "\n\n".join(
+            f"## {s['title']}\n{results.get(s['id'], '')}" for s in independent
+        )
+        await run_section(section, extra_context=f"Findings from the other sections of this report:\n\n{findings}")
+
+    # Reassemble in canonical order
+    ordered_results = {s['id']: results.get(s['id'], f"No analysis available for {s['title']}") for s in sections}
+    return ordered_results, errors
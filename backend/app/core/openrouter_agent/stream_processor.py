@@ -8,10 +8,89 @@ from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
 from app.core.openrouter_agent.tool_executor import execute_tool
 from app.core.openrouter_agent.media_handler import inject_image_data
 
+class ToolCallAssembler:
+    """Incrementally assemble streamed tool calls and detect when each one is complete.
+
+    A tool call is complete when its accumulated arguments parse as a JSON
+    object, when a tool call with a later index starts, or when the stream
+    ends. Each call is reported to on_complete exactly once, so the caller can
+    start executing it while the model is still streaming the rest of the turn.
+    """
+
+    def __init__(self, on_complete: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.tool_calls: List[Dict[str, Any]] = []
+        self.on_complete = on_complete
+        self.completed = set()
+
+    def _find_or_create(self, index: int, tool_call_id: Optional[str]) -> Dict[str, Any]:
+        for tc in self.tool_calls:
+            if tc.get("index") == index:
+                return tc
+
+        # A new index means every earlier tool call has been fully streamed
+        for tc in self.tool_calls:
+            if tc["index"] < index:
+                self._complete(tc)
+
+        tool_call = {
+            "index": index,
+            "id": tool_call_id or "",
+            "type": "function",
+            "function": {
+                "name": "",
+                "arguments": ""
+            }
+        }
+        self.tool_calls.append(tool_call)
+        return tool_call
+
+    def _complete(self, tool_call: Dict[str, Any]) -> None:
+        if tool_call["index"] in self.completed or not tool_call["function"]["name"]:
+            return
+        self.completed.add(tool_call["index"])
+        if self.on_complete:
+            self.on_complete(tool_call)
+
+    def _arguments_complete(self, arguments: str) -> bool:
+        # Only try to parse once the arguments could be a closed JSON object
+        if not arguments.rstrip().endswith("}"):
+            return False
+        try:
+            return isinstance(json.loads(arguments), dict)
+        except json.JSONDecodeError:
+            return False
+
+    def add_delta(self, tool_call_delta) -> None:
+        """Merge a tool call delta from a completion chunk."""
+        if tool_call_delta.index is None:
+            return
+        tool_call = self._find_or_create(tool_call_delta.index, tool_call_delta.id)
+
+        # Update tool call with delta information
+        if tool_call_delta.function:
+            if tool_call_delta.function.name:
+                tool_call["function"]["name"] = tool_call_delta.function.name
+            if tool_call_delta.function.arguments:
+                tool_call["function"]["arguments"] += tool_call_delta.function.arguments
+                if (
+                    tool_call["index"] not in self.completed
+                    and self._arguments_complete(tool_call["function"]["arguments"])
+                ):
+                    self._complete(tool_call)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Complete any remaining tool calls at the end of the stream."""
+        for tool_call in self.tool_calls:
+            self._complete(tool_call)
+        return self.tool_calls
+
+
 async def process_completion_chunks(
     completion_stream,
     message_handler,
     on_update_time: Callable[[float], None],
+    on_usage: Optional[Callable[[Any], None]] = None,
+    on_tool_call_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
 ) -> Tuple[str, List[Dict[str, Any]], bool]:
     """Process streaming chunks from OpenRouter API response.
 
@@ -19,13 +98,16 @@ async def process_completion_chunks(
         completion_stream: AsyncIterator of completion chunks from OpenAI SDK
         message_handler: MessageHandler instance for handling messages
         on_update_time: Callback to update last response time
+        on_usage: Optional callback receiving the usage object when the stream reports one
+        on_tool_call_complete: Optional callback receiving each tool call as soon as its
+            arguments are complete, while the rest of the stream is still being received
 
     Returns:
         Tuple of (content string, tool calls list, is_tool_call flag)
     """
     # Initialize accumulators
     current_content = ""
-    current_tool_calls = []
+    assembler = ToolCallAssembler(on_tool_call_complete)
     is_tool_call = False
 
     # Process each chunk
@@ -33,7 +115,10 @@ async def process_completion_chunks(
         # Update last response time
         on_update_time(time.time())
 
-        # We'll implement usage tracking later when OpenRouter's API supports it properly
+        # OpenRouter sends usage (including cache token counts) on the final chunk
+        # when the request asks for usage accounting
+        if on_usage and getattr(chunk, "usage", None):
+            on_usage(chunk.usage)
 
         # Track chunk counts for debugging purposes
         if 'chunk_count' not in globals():
@@ -56,36 +141,9 @@ async def process_completion_chunks(
         if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.tool_calls:
             is_tool_call = True
             for tool_call_delta in chunk.choices[0].delta.tool_calls:
-                # Find or create the corresponding tool call in our accumulator
-                tool_call = None
-                if tool_call_delta.index is not None:
-                    # Find existing tool call with same index
-                    for tc in current_tool_calls:
-                        if tc.get("index") == tool_call_delta.index:
-                            tool_call = tc
-                            break
-
-                    # Create new tool call if not found
-                    if not tool_call:
-                        tool_call = {
-                            "index": tool_call_delta.index,
-                            "id": tool_call_delta.id or "",
-                            "type": "function",
-                            "function": {
-                                "name": "",
-                                "arguments": ""
-                            }
-                        }
-                        current_tool_calls.append(tool_call)
-
-                # Update tool call with delta information
-                if tool_call_delta.function:
-                    if tool_call_delta.function.name:
-                        tool_call["function"]["name"] = tool_call_delta.function.name
-                    if tool_call_delta.function.arguments:
-                        tool_call["function"]["arguments"] += tool_call_delta.function.arguments
-
-    return current_content, current_tool_calls, is_tool_call
+                assembler.add_delta(tool_call_delta)
+
+    return current_content, assembler.finish(), is_tool_call
 
 
 def extract_tool_call_from_response(
@@ -1,175 +1,438 @@
+import os
 import json
+import asyncio
 import hashlib
+import threading
 import time
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Iterable, Set, Tuple
+
+from app.core.agent.media_store import MEDIA_HANDLE_PREFIX
+
+# Redis is the shared second tier; without it the cache is per process
+try:
+    from app.core.openrouter_agent.redis import get_cached_result, get_guideline_version, is_shared_tool, run_single_flight
+    shared_cache_available = True
+except ImportError:
+    shared_cache_available = False
+
+# Upper bound on the size of cached results; least recently used entries are evicted first
+MAX_CACHE_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Upper bound on the number of cached results
+MAX_CACHE_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", 5000))
+
+# Media arguments that are fingerprinted into the cache key instead of being serialized
+MEDIA_ARGS = ("image_handle", "image_base64", "images_base64")
+
+# Arguments that describe the call for the UI but do not change the result
+NON_KEY_ARGS = ("task_detail",)
+
+# Base64 assets whose fingerprint is remembered, so an asset is hashed once rather than per call
+MAX_FINGERPRINTS = 128
+
+# Tools whose results depend on the stored brand guidelines
+GUIDELINE_TOOLS = ("search_brand_guidelines", "read_guideline_page", "match_brand_colors")
+
+# Key-only argument carrying the guideline version stamp for guideline tools, so results
+# computed against replaced guidelines stop matching in every worker
+GUIDELINE_VERSION_ARG = "_guideline_version"
+
+
+class _MediaFingerprints:
+    """Remembers the content hash of recently seen base64 assets.
+
+    The agent passes the same frame strings to every tool call of an
+    analysis, so fingerprints are looked up by object identity first and
+    the string is only hashed the first time it is seen.
+    """
+
+    def __init__(self, max_entries: int = MAX_FINGERPRINTS):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, value: str) -> str:
+        if value.startswith(MEDIA_HANDLE_PREFIX):
+            # Handles already name the content hash of the decoded asset
+            return value[len(MEDIA_HANDLE_PREFIX):]
+
+        key = id(value)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is value:
+                self.entries.move_to_end(key)
+                return entry[1]
+
+        data = value.split(",", 1)[-1] if value.startswith("data:") else value
+        digest = hashlib.sha256(data.encode()).hexdigest()
+        with self.lock:
+            # The entry keeps a reference to the string, so its id cannot be reused meanwhile
+            self.entries[key] = (value, digest)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return digest
+
+
+_fingerprints = _MediaFingerprints()
+
+
+def media_fingerprints(tool_args: Dict[str, Any]) -> List[str]:
+    """Content hashes of the media referenced by tool arguments, in argument order."""
+    digests = []
+    for key in MEDIA_ARGS:
+        value = tool_args.get(key)
+        if isinstance(value, str) and value:
+            digests.append(_fingerprints.get(value))
+        elif isinstance(value, list):
+            digests.extend(_fingerprints.get(v) for v in value if isinstance(v, str) and v)
+    return digests
+
 
 class ToolResultCache:
     """
     A cache for tool execution results to avoid redundant tool calls with the same inputs.
-    
-    This cache stores tool results based on the tool name and input parameters,
-    with configurable expiration times for different tools.
+
+    Results are keyed by the tool name, the non-media arguments and a content
+    hash of the referenced media, so the same call on two different images
+    never shares a result. The cache is an LRU bounded by entry count and by
+    the size of the stored results, with configurable expiration times for
+    different tools.
     """
-    
-    def __init__(self, default_ttl: int = 3600):
+
+    def __init__(self, default_ttl: int = 3600, max_bytes: int = MAX_CACHE_BYTES, max_entries: int = MAX_CACHE_ENTRIES):
         """
         Initialize the tool result cache.
-        
+
         Args:
             default_ttl: Default time-to-live in seconds for cache entries (default: 1 hour)
+            max_bytes: Maximum total size of cached results in bytes
+            max_entries: Maximum number of cached results
         """
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
         self.default_ttl = default_ttl
-        
-        # Configure tool-specific TTLs (in seconds)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+        # Executions in flight in this process, so identical concurrent calls share one
+        self.in_flight: Dict[str, asyncio.Task] = {}
+
+        # Configure tool-specific TTLs (in seconds); a TTL of 0 disables caching for the tool
         self.tool_ttls = {
             # Tools with static results can have longer TTLs
             "get_brand_guidelines": 86400,  # 24 hours
             "get_brand_colors": 86400,     # 24 hours
             "get_brand_fonts": 86400,      # 24 hours
-            
-            # Analysis tools might need shorter TTLs
-            "check_color_contrast": 3600,   # 1 hour
-            "check_image_clarity": 3600,    # 1 hour
-            "check_element_placement": 3600, # 1 hour
-            
-            # Dynamic tools should have very short TTLs or be excluded
-            "attempt_completion": 300,      # 5 minutes
+
+            # Guideline lookups are invalidated when guidelines change
+            "search_brand_guidelines": 3600,  # 1 hour
+            "read_guideline_page": 3600,      # 1 hour
+            "match_brand_colors": 3600,       # 1 hour
+
+            # Analysis tools are deterministic for the same media and arguments
+            "get_region_color_scheme": 21600,   # 6 hours
+            "get_video_color_scheme": 21600,    # 6 hours
+            "check_video_frame_specs": 21600,   # 6 hours
+            "check_color_contrast": 21600,      # 6 hours
+            "check_image_clarity": 21600,       # 6 hours
+            "check_element_placement": 21600,   # 6 hours
+            "check_layout_consistency": 21600,  # 6 hours
+
+            # Model-backed tools may be re-run for a fresh answer
+            "extract_verbal_content": 3600,  # 1 hour
+            "check_text_grammar": 3600,      # 1 hour
+
         }
-        
+
         # Tools to exclude from caching (results always change or have side effects)
         self.exclude_from_cache = [
-            # Add tools that should never be cached here
+            # The completion summarizes the whole analysis, including its task_detail
+            "attempt_completion",
         ]
-        
+
         # Stats for monitoring cache performance
         self.stats = {
             "hits": 0,
             "misses": 0,
-            "expirations": 0
+            "expirations": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "oversized": 0,
+            "shared_hits": 0,
+            "coalesced": 0,
+            "remote_results": 0
         }
-    
-    def _generate_cache_key(self, tool_name: str, tool_args: Dict[str, Any]) -> str:
+
+    def _generate_cache_key(self, tool_name: str, tool_args: Dict[str, Any], media: Optional[List[str]] = None) -> str:
         """
-        Generate a unique cache key for a tool call based on tool name and arguments.
-        
+        Generate a unique cache key for a tool call based on tool name, arguments and media.
+
         Args:
             tool_name: Name of the tool being called
             tool_args: Arguments passed to the tool
-            
+            media: Content hashes of the referenced media (computed from tool_args if omitted)
+
         Returns:
             A unique hash string to use as cache key
         """
-        # Remove image_base64 and images_base64 from the args for the cache key
-        # since these are large and might have minor variations that don't affect results
-        filtered_args = {k: v for k, v in tool_args.items() 
-                        if k not in ["image_base64", "images_base64"]}
-        
+        # Media is large, so it enters the key as content hashes rather than as base64
+        filtered_args = {k: v for k, v in tool_args.items() if k not in MEDIA_ARGS and k not in NON_KEY_ARGS}
+        if media is None:
+            media = media_fingerprints(tool_args)
+
         # Convert the filtered args to a stable string representation
-        args_str = json.dumps(filtered_args, sort_keys=True)
-        
-        # Create a hash of the tool name and arguments
-        key_string = f"{tool_name}:{args_str}"
-        return hashlib.md5(key_string.encode()).hexdigest()
-    
+        args_str = json.dumps(filtered_args, sort_keys=True, default=str)
+
+        # Create a hash of the tool name, arguments and media
+        key_string = f"{tool_name}:{args_str}:{','.join(media)}"
+        return hashlib.sha256(key_string.encode()).hexdigest()
+
+    def get_ttl(self, tool_name: str) -> int:
+        """Get the TTL for a tool in seconds (0 if the tool is not cached)."""
+        if tool_name in self.exclude_from_cache:
+            return 0
+        return self.tool_ttls.get(tool_name, self.default_ttl)
+
+    def set_ttl(self, tool_name: str, ttl: int) -> None:
+        """Set the TTL for a tool; 0 disables caching for it."""
+        self.tool_ttls[tool_name] = max(0, int(ttl))
+
+    def _remove(self, cache_key: str) -> None:
+        entry = self.cache.pop(cache_key, None)
+        if entry is not None:
+            self.total_bytes -= entry["bytes"]
+
+    def _evict(self) -> None:
+        while self.cache and (self.total_bytes > self.max_bytes or len(self.cache) > self.max_entries):
+            _, entry = self.cache.popitem(last=False)
+            self.total_bytes -= entry["bytes"]
+            self.stats["evictions"] += 1
+
     def get(self, tool_name: str, tool_args: Dict[str, Any]) -> Optional[Any]:
         """
         Retrieve a cached tool result if available and not expired.
-        
+
         Args:
             tool_name: Name of the tool
             tool_args: Arguments passed to the tool
-            
+
         Returns:
             The cached result or None if not found or expired
         """
-        # Skip cache lookup for excluded tools
-        if tool_name in self.exclude_from_cache:
+        # Skip cache lookup for tools that are not cached
+        if not self.get_ttl(tool_name):
             self.stats["misses"] += 1
             return None
-        
+
         # Generate cache key
         cache_key = self._generate_cache_key(tool_name, tool_args)
-        
-        # Check if key exists in cache
-        if cache_key in self.cache:
-            entry = self.cache[cache_key]
-            current_time = time.time()
-            
-            # Check if entry has expired
-            if current_time - entry["timestamp"] < entry["ttl"]:
-                print(f"\033[92m[CACHE HIT] Using cached result for {tool_name}\033[0m")
-                self.stats["hits"] += 1
-                return entry["result"]
-            else:
+
+        with self.lock:
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                # Check if entry has expired
+                if time.time() - entry["timestamp"] < entry["ttl"]:
+                    self.cache.move_to_end(cache_key)
+                    self.stats["hits"] += 1
+                    print(f"\033[92m[CACHE HIT] Using cached result for {tool_name}\033[0m")
+                    return entry["result"]
+
                 # Entry has expired
                 print(f"\033[93m[CACHE EXPIRED] Result for {tool_name} has expired\033[0m")
                 self.stats["expirations"] += 1
-                del self.cache[cache_key]
-        
-        # Cache miss
-        self.stats["misses"] += 1
+                self._remove(cache_key)
+
+            # Cache miss
+            self.stats["misses"] += 1
         return None
-    
+
     def set(self, tool_name: str, tool_args: Dict[str, Any], result: Any) -> None:
         """
         Store a tool result in the cache.
-        
+
         Args:
             tool_name: Name of the tool
             tool_args: Arguments passed to the tool
             result: Result returned by the tool
         """
-        # Skip caching for excluded tools
-        if tool_name in self.exclude_from_cache:
+        # Skip caching for tools that are not cached
+        ttl = self.get_ttl(tool_name)
+        if not ttl:
             return
-        
+
+        # Errors are usually transient (e.g. a timeout) and should be retried
+        if (isinstance(result, dict) and "error" in result) or (isinstance(result, str) and result.startswith('{"error"')):
+            return
+
+        size = len(result.encode("utf-8")) if isinstance(result, str) else len(json.dumps(result, default=str))
+        if size > self.max_bytes:
+            self.stats["oversized"] += 1
+            return
+
         # Generate cache key
-        cache_key = self._generate_cache_key(tool_name, tool_args)
-        
-        # Get TTL for this tool (or use default)
-        ttl = self.tool_ttls.get(tool_name, self.default_ttl)
-        
+        media = media_fingerprints(tool_args)
+        cache_key = self._generate_cache_key(tool_name, tool_args, media)
+
         # Store result with timestamp and TTL
-        self.cache[cache_key] = {
-            "result": result,
-            "timestamp": time.time(),
-            "ttl": ttl
-        }
-        
-        print(f"\033[94m[CACHE SET] Cached result for {tool_name} (TTL: {ttl}s)\033[0m")
-    
+        with self.lock:
+            self._remove(cache_key)
+            self.cache[cache_key] = {
+                "result": result,
+                "tool_name": tool_name,
+                "media": set(media),
+                "timestamp": time.time(),
+                "ttl": ttl,
+                "bytes": size
+            }
+            self.total_bytes += size
+            self._evict()
+
+        print(f"\033[94m[CACHE SET] Cached result for {tool_name} (TTL: {ttl}s, {size // 1024}KB)\033[0m")
+
+    def invalidate(self, tool_names: Optional[Iterable[str]] = None, media: Optional[str] = None) -> int:
+        """
+        Drop cached results by tool and/or by media.
+
+        Args:
+            tool_names: Only drop results of these tools
+            media: Only drop results that reference this media (a handle, base64 asset or content hash)
+
+        Returns:
+            Number of entries removed
+        """
+        tools: Optional[Set[str]] = set(tool_names) if tool_names is not None else None
+        digest = None
+        if media:
+            is_digest = len(media) == 64 and all(c in "0123456789abcdef" for c in media)
+            digest = media if is_digest else _fingerprints.get(media)
+
+        with self.lock:
+            keys = [
+                key for key, entry in self.cache.items()
+                if (tools is None or entry["tool_name"] in tools)
+                and (digest is None or digest in entry["media"])
+            ]
+            for key in keys:
+                self._remove(key)
+            self.stats["invalidations"] += len(keys)
+
+        if keys:
+            print(f"\033[93m[CACHE INVALIDATE] Removed {len(keys)} cached results\033[0m")
+        return len(keys)
+
     def clear(self, tool_name: Optional[str] = None) -> None:
         """
         Clear cache entries, either for a specific tool or all entries.
-        
+
         Args:
             tool_name: Optional tool name to clear cache for specific tool only
         """
         if tool_name:
             # Clear entries for specific tool
-            keys_to_remove = []
-            for key, entry in self.cache.items():
-                if entry.get("tool_name") == tool_name:
-                    keys_to_remove.append(key)
-            
-            for key in keys_to_remove:
-                del self.cache[key]
-                
+            self.invalidate([tool_name])
             print(f"\033[93m[CACHE CLEAR] Cleared cache for {tool_name}\033[0m")
         else:
             # Clear all entries
-            self.cache.clear()
+            with self.lock:
+                self.cache.clear()
+                self.total_bytes = 0
             print(f"\033[93m[CACHE CLEAR] Cleared entire cache\033[0m")
-    
-    def get_stats(self) -> Dict[str, int]:
+
+    def get_stats(self) -> Dict[str, Any]:
         """
         Get cache performance statistics.
-        
+
+        Returns:
+            Dictionary with hit/miss/expiration/eviction counts, entries and bytes
+        """
+        with self.lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": self.stats["hits"] / total if total else 0,
+                "entries": len(self.cache),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+    async def execute(self, tool_name: str, tool_args: Dict[str, Any], execute_func) -> Tuple[Any, str]:
+        """
+        Get a tool result from the cache tiers, or execute the tool once.
+
+        Lookups go to this process's LRU first and then, for shared tools, to
+        Redis. Guideline tools are keyed with the current guideline version, so
+        an upload in any worker makes older results miss everywhere. Identical calls that arrive while one is running in this
+        process wait for it instead of executing again, and shared tools are
+        also deduplicated across workers through a short Redis lock.
+
+        Args:
+            tool_name: Name of the tool to execute
+            tool_args: Arguments for the tool
+            execute_func: Async function that executes the actual tool
+
         Returns:
-            Dictionary with hit/miss/expiration counts
+            Tuple of (tool result, source), where source is "cache", "shared_cache",
+            "in_flight", "remote" or "executed"
         """
-        return self.stats
+        if not self.get_ttl(tool_name):
+            return await execute_func(tool_name, tool_args), "executed"
+
+        # Arguments the cache tiers key on; the tool itself always gets tool_args
+        key_args = tool_args
+        if tool_name in GUIDELINE_TOOLS and shared_cache_available:
+            version = await get_guideline_version()
+            if version is not None:
+                key_args = {**tool_args, GUIDELINE_VERSION_ARG: version}
+
+        cached_result = self.get(tool_name, key_args)
+        if cached_result is not None:
+            return cached_result, "cache"
+
+        cache_key = self._generate_cache_key(tool_name, key_args)
+        pending = self.in_flight.get(cache_key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            print(f"\033[94m[CACHE] Waiting for identical in-flight {tool_name} call\033[0m")
+            result, _ = await asyncio.shield(pending)
+            return result, "in_flight"
+
+        # The execution runs as its own task, so a caller that is cancelled (e.g. its client
+        # disconnected) leaves it running for the other callers waiting on it
+        task = asyncio.create_task(self._execute_and_store(tool_name, tool_args, key_args, execute_func))
+        self.in_flight[cache_key] = task
+
+        def done(finished: asyncio.Task) -> None:
+            if self.in_flight.get(cache_key) is finished:
+                del self.in_flight[cache_key]
+            # Mark the exception as retrieved in case no caller is left to await it
+            if not finished.cancelled():
+                finished.exception()
+
+        task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    async def _execute_and_store(self, tool_name: str, tool_args: Dict[str, Any], key_args: Dict[str, Any], execute_func) -> Tuple[Any, str]:
+        result, source = await self._execute_shared(tool_name, tool_args, key_args, execute_func)
+        self.set(tool_name, key_args, result)
+        return result, source
+
+    async def _execute_shared(self, tool_name: str, tool_args: Dict[str, Any], key_args: Dict[str, Any], execute_func) -> Tuple[Any, str]:
+        """Resolve a miss through Redis for shared tools, or by executing the tool."""
+        if not (shared_cache_available and is_shared_tool(tool_name)):
+            return await execute_func(tool_name, tool_args), "executed"
+
+        shared_result = await get_cached_result(tool_name, key_args)
+        if shared_result is not None:
+            self.stats["shared_hits"] += 1
+            return shared_result, "shared_cache"
+
+        result, source = await run_single_flight(tool_name, key_args, lambda: execute_func(tool_name, tool_args))
+        if source == "remote":
+            self.stats["remote_results"] += 1
+        return result, source
 
 # Create a global instance of the cache
 tool_cache = ToolResultCache()
@@ -177,26 +440,14 @@ tool_cache = ToolResultCache()
 async def cached_execute_tool(tool_name: str, tool_args: Dict[str, Any], execute_func):
     """
     Execute a tool with caching support.
-    
+
     Args:
         tool_name: Name of the tool to execute
         tool_args: Arguments for the tool
         execute_func: Async function that executes the actual tool
-        
+
     Returns:
         Tool execution result (either from cache or from actual execution)
     """
-    # Try to get result from cache
-    cached_result = tool_cache.get(tool_name, tool_args)
-    
-    if cached_result is not None:
-        # Return cached result
-        return cached_result
-    
-    # Execute the tool
-    result = await execute_func(tool_name, tool_args)
-    
-    # Cache the result
-    tool_cache.set(tool_name, tool_args, result)
-    
+    result, _ = await tool_cache.execute(tool_name, tool_args, execute_func)
     return result
@@ -6,10 +6,12 @@ from app.core.openrouter_agent.tool_definitions.tool_mapping import (
     get_tool_function,
     TOOL_MAPPING
 )
+from app.core.openrouter_agent.tool_definitions.tool_pool import tool_pool
 
 __all__ = [
     "get_tool_schemas",
     "execute_tool",
     "get_tool_function",
-    "TOOL_MAPPING"
+    "TOOL_MAPPING",
+    "tool_pool"
 ]
@@ -12,6 +12,7 @@ from app.core.agent.tools import (
     get_brand_guidelines as _search_brand_guidelines,
     read_guideline_page as _read_guideline_page,
     get_region_color_scheme as _get_region_color_scheme,
+    match_brand_colors as _match_brand_colors,
     check_color_contrast as _check_color_contrast,
     check_element_placement as _check_element_placement,
     check_layout_consistency as _check_layout_consistency,
@@ -19,6 +20,7 @@ from app.core.agent.tools import (
     check_text_grammar as _check_text_grammar,
     attempt_completion as _attempt_completion,
 )
+from app.core.openrouter_agent.tool_definitions.tool_pool import tool_pool
 
 
 async def execute_tool(tool_name: str, tool_args: Dict[str, Any]) -> Any:
@@ -51,6 +53,11 @@ async def execute_tool(tool_name: str, tool_args: Dict[str, Any]) -> Any:
     if not tool_func:
         raise ValueError(f"Tool '{tool_name}' not found in the tool mapping.")
 
+    # CPU-bound tools run in the process pool so they do not block the event loop;
+    # pool failures are reported like any other tool error rather than run inline
+    if tool_pool.handles(tool_name):
+        return await tool_pool.run(tool_name, tool_args)
+
     # Check if the tool function is async
     if asyncio.iscoroutinefunction(tool_func):
         result = await tool_func(tool_args)
@@ -74,6 +81,7 @@ TOOL_MAPPING: Dict[str, Callable[[Dict[str, Any]], Any]] = {
 
     # Image analysis tools
     "get_region_color_scheme": _get_region_color_scheme,
+    "match_brand_colors": _match_brand_colors,
     "check_color_contrast": _check_color_contrast,
     "check_element_placement": _check_element_placement,
     "check_layout_consistency": _check_layout_consistency,
@@ -0,0 +1,292 @@
+# Process pool for CPU-bound tools
+
+import os
+import time
+import asyncio
+import inspect
+import multiprocessing
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.agent.media_store import media_store
+
+TOOL_POOL_ENABLED = os.getenv("TOOL_POOL_ENABLED", "true").lower() != "false"
+TOOL_POOL_WORKERS = int(os.getenv("TOOL_POOL_WORKERS", max(1, min(2, os.cpu_count() or 1))))
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("TOOL_POOL_DEFAULT_TIMEOUT", 60))
+
+# Tools that do pure CPU work on the image, with their timeouts in seconds
+CPU_BOUND_TOOLS: Dict[str, float] = {
+    "get_image_color_scheme": 30,
+    "get_region_color_scheme": 30,
+    "check_color_contrast": 30,
+    "check_element_placement": 60,
+    "check_layout_consistency": 60,
+    "check_image_clarity": 60,
+}
+
+# Seconds a worker gets to exit after being asked to stop at shutdown
+SHUTDOWN_GRACE = 5.0
+
+# Request sent to check that a worker is up and has imported the tools
+_PING = "ping"
+
+
+class ToolWorkerError(RuntimeError):
+    """Raised when a worker process dies before returning a result."""
+
+
+def _warm_worker() -> int:
+    """Import the tool implementations so the first real call does not pay for it."""
+    import app.core.agent.tools  # noqa: F401
+    return os.getpid()
+
+
+def _run_tool(tool_name: str, tool_args: Dict[str, Any]) -> Tuple[Any, float]:
+    """Run a tool inside a worker process.
+
+    Returns:
+        Tuple of (tool result, seconds spent running the tool)
+    """
+    from app.core.agent.tools import get_tool_function
+    from app.core.agent.media_store import attach_shared
+
+    shared = tool_args.pop("image_shared", None)
+    if shared:
+        tool_args["image_handle"] = attach_shared(shared)
+
+    tool_func = get_tool_function(tool_name)
+    if tool_func is None:
+        raise ValueError(f"Tool '{tool_name}' not found in the tool mapping.")
+
+    started = time.time()
+    if inspect.iscoroutinefunction(tool_func):
+        result = asyncio.run(tool_func(tool_args))
+    else:
+        result = tool_func(tool_args)
+    return result, time.time() - started
+
+
+
+def _worker_main(conn) -> None:
+    """Serve tool calls sent over a pipe until the parent asks the worker to stop."""
+    _warm_worker()
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        if request == _PING:
+            reply = ("ok", (os.getpid(), 0.0))
+        else:
+            tool_name, tool_args = request
+            try:
+                reply = ("ok", _run_tool(tool_name, tool_args))
+            except Exception as e:
+                reply = ("error", e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # The result or exception could not be pickled
+            conn.send(("error", ToolWorkerError(f"Could not return the tool result: {e}")))
+
+
+class _Worker:
+    """A worker process and the parent's end of its pipe."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        # Only the worker holds its end now, so the parent sees EOF if the worker dies
+        child_conn.close()
+
+    def terminate(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class ToolProcessPool:
+    """Pre-warmed worker processes that run CPU-bound tools off the event loop.
+
+    The image tools are declared async but compute inline, so running them in
+    the server process stalls every other stream on the worker. Here they run
+    in separate processes, one call per worker at a time; the decoded image is
+    passed through shared memory by handle, so only a small descriptor is
+    pickled per call. A tool that exceeds its timeout (or whose caller gives
+    up) gets only its own worker terminated and replaced; calls running on the
+    other workers are unaffected.
+    """
+
+    def __init__(self, workers: int = TOOL_POOL_WORKERS, enabled: bool = TOOL_POOL_ENABLED):
+        self.workers = max(1, workers)
+        self.enabled = enabled
+        self.context = multiprocessing.get_context("spawn")
+        self.idle: Optional[asyncio.Queue] = None
+        self.processes: List[_Worker] = []
+        self.started_at: Optional[float] = None
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "restarts": 0,
+            "queue_wait_seconds": 0.0
+        }
+        self.tools: Dict[str, Dict[str, Any]] = {}
+
+    def handles(self, tool_name: str) -> bool:
+        """Check whether a tool should run in the pool."""
+        return self.enabled and tool_name in CPU_BOUND_TOOLS
+
+    def _spawn(self) -> _Worker:
+        # Spawned workers do not inherit the server's threads, locks or event loop
+        worker = _Worker(self.context)
+        self.processes.append(worker)
+        return worker
+
+    def _ensure_workers(self) -> asyncio.Queue:
+        if self.idle is None:
+            self.idle = asyncio.Queue()
+            for _ in range(self.workers):
+                self.idle.put_nowait(self._spawn())
+            self.started_at = time.time()
+        return self.idle
+
+    async def startup(self) -> None:
+        """Start the worker processes and wait until each has imported the tools."""
+        if not self.enabled:
+            return
+        idle = self._ensure_workers()
+        workers = [idle.get_nowait() for _ in range(idle.qsize())]
+        pids = []
+        for worker in workers:
+            worker.conn.send(_PING)
+        try:
+            for worker in workers:
+                status, (pid, _) = await asyncio.to_thread(worker.conn.recv)
+                pids.append(pid)
+        finally:
+            for worker in workers:
+                idle.put_nowait(worker)
+        print(f"\033[94m[TOOL POOL] Started {len(set(pids))} worker processes\033[0m")
+
+    def _replace(self, worker: _Worker) -> None:
+        """Terminate a worker (hung, dead or abandoned mid-call) and put a fresh one in its place."""
+        self.stats["restarts"] += 1
+        # A running call cannot be interrupted; terminating its process can
+        worker.terminate()
+        if worker in self.processes:
+            self.processes.remove(worker)
+        if self.idle is not None:
+            self.idle.put_nowait(self._spawn())
+
+    def _prepare_args(self, tool_args: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace the media handle with a shared-memory descriptor the worker can map."""
+        args = dict(tool_args)
+        handle = args.pop("image_handle", None)
+        if handle:
+            args["image_shared"] = media_store.share(handle)
+        return args
+
+    def _record(self, tool_name: str, seconds: float, timed_out: bool = False) -> None:
+        entry = self.tools.setdefault(tool_name, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "timeouts": 0})
+        entry["calls"] += 1
+        entry["total_seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+        if timed_out:
+            entry["timeouts"] += 1
+
+    async def run(self, tool_name: str, tool_args: Dict[str, Any]) -> Any:
+        """Run a tool in the pool.
+
+        Args:
+            tool_name: Name of a CPU-bound tool
+            tool_args: Arguments to pass to the tool
+
+        Returns:
+            The tool execution result
+
+        Raises:
+            TimeoutError: If the tool exceeds its timeout
+            ToolWorkerError: If the worker process died while running the tool
+        """
+        timeout = CPU_BOUND_TOOLS.get(tool_name, DEFAULT_TOOL_TIMEOUT)
+        args = self._prepare_args(tool_args)
+        idle = self._ensure_workers()
+
+        submitted = time.time()
+        self.stats["submitted"] += 1
+        self.in_flight += 1
+        try:
+            worker = await idle.get()
+            # Any exit before the reply arrives leaves the worker busy or broken
+            healthy = False
+            try:
+                worker.conn.send((tool_name, args))
+                status, payload = await asyncio.wait_for(asyncio.to_thread(worker.conn.recv), timeout=timeout)
+                healthy = True
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                self._record(tool_name, timeout, timed_out=True)
+                print(f"\033[91m[TOOL POOL] {tool_name} timed out after {timeout:.0f}s, replacing its worker\033[0m")
+                raise TimeoutError(f"Tool {tool_name} timed out after {timeout:.0f}s")
+            except (EOFError, OSError) as e:
+                self.stats["failed"] += 1
+                print(f"\033[91m[TOOL POOL] Worker died while running {tool_name}, replacing it\033[0m")
+                raise ToolWorkerError(f"Worker process died while running {tool_name}") from e
+            finally:
+                if healthy and worker.process.is_alive():
+                    idle.put_nowait(worker)
+                else:
+                    self._replace(worker)
+        finally:
+            self.in_flight -= 1
+
+        if status == "error":
+            self.stats["failed"] += 1
+            raise payload
+
+        result, run_seconds = payload
+        self.stats["completed"] += 1
+        self.stats["queue_wait_seconds"] += max(0.0, time.time() - submitted - run_seconds)
+        self.busy_seconds += run_seconds
+        self._record(tool_name, run_seconds)
+        return result
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        workers, self.processes, self.idle = self.processes, [], None
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(SHUTDOWN_GRACE)
+            worker.terminate()
+            worker.conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool counters, utilization and per-tool timings."""
+        uptime = time.time() - self.started_at if self.started_at else 0.0
+        completed = self.stats["completed"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "workers": self.workers,
+            "running": self.idle is not None,
+            "in_flight": self.in_flight,
+            "utilization": round(self.busy_seconds / (self.workers * uptime), 3) if uptime else 0.0,
+            "avg_queue_wait_seconds": round(self.stats["queue_wait_seconds"] / completed, 3) if completed else 0.0,
+            "tools": {
+                name: {**entry, "avg_seconds": round(entry["total_seconds"] / entry["calls"], 3)}
+                for name, entry in self.tools.items()
+            }
+        }
+
+
+# Shared pool for this server process
+tool_pool = ToolProcessPool()
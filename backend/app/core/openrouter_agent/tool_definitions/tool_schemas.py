@@ -214,11 +214,58 @@ def get_tool_schemas() -> List[Dict[str, Any]]:
                 }
             }
         },
+        {
+            "type": "function",
+            "function": {
+                "name": "match_brand_colors",
+                "description": "Match colors against the brand's official palette using perceptual (CIEDE2000) color distance. Pass hex colors to check them, or omit colors to map every pixel of a region (or the whole image) to the nearest brand color and get on-brand and off-brand coverage in one call.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "brand_name": {
+                            "type": "string",
+                            "description": "The name of the brand whose palette to match against.",
+                            "minLength": 1,
+                        },
+                        "colors": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Optional hex colors to match (e.g. ['#f40009', '#000000']).",
+                        },
+                        "x1": {
+                            "type": "integer",
+                            "description": "Optional x-coordinate of the top-left corner of the region.",
+                        },
+                        "y1": {
+                            "type": "integer",
+                            "description": "Optional y-coordinate of the top-left corner of the region.",
+                        },
+                        "x2": {
+                            "type": "integer",
+                            "description": "Optional x-coordinate of the bottom-right corner of the region.",
+                        },
+                        "y2": {
+                            "type": "integer",
+                            "description": "Optional y-coordinate of the bottom-right corner of the region.",
+                        },
+                        "tolerance": {
+                            "type": "number",
+                            "description": "Maximum CIEDE2000 distance for a color to count as on-brand (default 10).",
+                        },
+                        "task_detail": {
+                            "type": "string",
+                            "description": "A quick title about the task you are doing",
+                        },
+                    },
+                    "required": ["brand_name", "task_detail"],
+                }
+            }
+        },
         {
             "type": "function",
             "function": {
                 "name": "check_color_contrast",
-                "description": "Analyze the video frame at the specified timestamp for color contrast accessibility compliance.",
+                "description": "Analyze the video frame at the specified timestamp for color contrast accessibility compliance (WCAG AA/AAA). Check one foreground/background pair, many pairs in one call via pairs, and/or set auto_detect to find text regions and measure each of them. Prefer one call with all pairs over one call per pair.",
                 "parameters": {
                     "type": "object",
                     "properties": {
@@ -246,12 +293,52 @@ def get_tool_schemas() -> List[Dict[str, Any]]:
                             },
                             "description": "Region containing the background color.",
                         },
+                        "pairs": {
+                            "type": "array",
+                            "description": "Foreground/background region pairs to check in one call (at most 50).",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "label": {
+                                        "type": "string",
+                                        "description": "Optional name of the element, e.g. 'headline'.",
+                                    },
+                                    "foreground_region": {
+                                        "type": "object",
+                                        "properties": {
+                                            "x1": {"type": "integer"},
+                                            "y1": {"type": "integer"},
+                                            "x2": {"type": "integer"},
+                                            "y2": {"type": "integer"},
+                                        },
+                                    },
+                                    "background_region": {
+                                        "type": "object",
+                                        "properties": {
+                                            "x1": {"type": "integer"},
+                                            "y1": {"type": "integer"},
+                                            "x2": {"type": "integer"},
+                                            "y2": {"type": "integer"},
+                                        },
+                                    },
+                                },
+                                "required": ["foreground_region", "background_region"],
+                            },
+                        },
+                        "auto_detect": {
+                            "type": "boolean",
+                            "description": "Detect likely text regions and report the contrast of each against its surroundings.",
+                        },
+                        "heatmap": {
+                            "type": "boolean",
+                            "description": "Include a coarse grid of local contrast ratios and the cells below the AA threshold.",
+                        },
                         "task_detail": {
                             "type": "string",
                             "description": "A quick title about the task you are doing",
                         },
                     },
-                    "required": ["timestamp", "foreground_region", "background_region", "task_detail"],
+                    "required": ["timestamp", "task_detail"],
                 }
             }
         },
@@ -296,7 +383,7 @@ def get_tool_schemas() -> List[Dict[str, Any]]:
             "type": "function",
             "function": {
                 "name": "check_image_clarity",
-                "description": "Analyze the clarity and quality of brand elements in the video frame at the specified timestamp to detect blurring, pixelation, or other forms of degradation.",
+                "description": "Analyze the clarity and quality of brand elements in the video frame at the specified timestamp to detect blurring, pixelation, or other forms of degradation. Score several elements in one call with regions instead of one call per element.",
                 "parameters": {
                     "type": "object",
                     "properties": {
@@ -318,12 +405,43 @@ def get_tool_schemas() -> List[Dict[str, Any]]:
                             "minimum": 0,
                             "maximum": 100,
                         },
+                        "regions": {
+                            "type": "array",
+                            "description": "Regions to score in one call (at most 50).",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "region_coordinates": {
+                                        "type": "string",
+                                        "description": "Coordinates of the region in format 'x1,y1,x2,y2'.",
+                                    },
+                                    "element_type": {
+                                        "type": "string",
+                                        "description": "Type of brand element (e.g., 'logo', 'text', 'icon').",
+                                    },
+                                    "min_clarity_score": {
+                                        "type": "integer",
+                                        "minimum": 0,
+                                        "maximum": 100,
+                                    },
+                                    "label": {
+                                        "type": "string",
+                                        "description": "Optional name of the element, e.g. 'primary logo'.",
+                                    },
+                                },
+                                "required": ["region_coordinates", "element_type"],
+                            },
+                        },
+                        "include_region_image": {
+                            "type": "boolean",
+                            "description": "Include each cropped region as base64 PNG in the result (off by default).",
+                        },
                         "task_detail": {
                             "type": "string",
                             "description": "A quick title about the task you are doing",
                         },
                     },
-                    "required": ["timestamp", "region_coordinates", "element_type", "task_detail"],
+                    "required": ["timestamp", "task_detail"],
                 }
             }
         },
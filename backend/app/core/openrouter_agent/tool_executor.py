@@ -5,7 +5,6 @@ from typing import Dict, Any, List, Optional
 
 from app.core.openrouter_agent.tool_definitions import execute_tool
 from app.core.openrouter_agent.tool_cache import tool_cache
-from app.core.openrouter_agent.redis import get_cached_image, cache_tool_result
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +36,7 @@ async def execute_and_process_tool(
     Returns:
         A dictionary with the tool execution results and metadata
     """
+    cached_result = None
     try:
         # Log input sizes
         tool_args_str = str(tool_args)
@@ -49,11 +49,13 @@ async def execute_and_process_tool(
 
             # Log values for non-image keys
             for key, value in tool_args.items():
-                if key not in ["image_base64", "images_base64"]:
+                if key not in ["image_base64", "images_base64", "image_handle"]:
                     print(f"\033[93m[DEBUG] {key}: {value}\033[0m")
 
             # For image input, show the length but not the content
-            if "image_base64" in tool_args and tool_args["image_base64"]:
+            if tool_args.get("image_handle"):
+                print(f"\033[92m[IMAGE] {tool_name} uses decoded image {tool_args['image_handle'][:32]}...\033[0m")
+            elif "image_base64" in tool_args and tool_args["image_base64"]:
                 img_len = len(tool_args["image_base64"])
                 print(f"\033[92m[IMAGE SIZE] image_base64 in {tool_name}: {img_len} chars\033[0m")
                 print(f"\033[93m[DEBUG] image_base64 (first 20 chars): {tool_args['image_base64'][:20]}...\033[0m")
@@ -150,42 +152,11 @@ async def execute_and_process_tool(
                             tool_args["images_base64"] = images_base64
                             tool_args["image_base64"] = images_base64[0]
 
-        # Check if we have a cached result for this tool call
-        cached_result = tool_cache.get(tool_name, tool_args)
+        # Serve from the in-process or shared cache, or execute once for all identical calls
+        tool_result, result_source = await tool_cache.execute(tool_name, tool_args, execute_tool)
+        cached_result = tool_result if result_source != "executed" else None
         if cached_result is not None:
-            tool_result = cached_result
-            print(f"\033[92m[CACHE HIT] Using cached result for {tool_name}\033[0m")
-        else:
-            # Check if we have a cached base64 image for this tool call
-            cached_base64 = await get_cached_image(tool_name, tool_args)
-
-            if cached_base64 is not None:
-                print(f"\033[92m[REDIS CACHE] 👍 IMAGE CACHE HIT for {tool_name} - Using cached base64 image ({len(cached_base64) // 1024}KB)\033[0m")
-
-                # Execute the tool to get the basic result structure
-                tool_result = await execute_tool(tool_name, tool_args)
-
-                # If the result is a string (JSON), parse it
-                if isinstance(tool_result, str):
-                    try:
-                        result_dict = json.loads(tool_result)
-                        # Replace the base64 field with our cached version
-                        if isinstance(result_dict, dict) and "base64" in result_dict:
-                            result_dict["base64"] = cached_base64
-                            tool_result = json.dumps(result_dict)
-                            print(f"\033[92m[REDIS CACHE] 🔄 Replaced base64 in result with cached version ({len(cached_base64) // 1024}KB)\033[0m")
-                    except json.JSONDecodeError:
-                        # If we can't parse the result, just use it as is
-                        pass
-            else:
-                # Execute the tool and cache the result
-                tool_result = await execute_tool(tool_name, tool_args)
-
-                # Cache the base64 image if present in the result
-                await cache_tool_result(tool_name, tool_args, tool_result)
-
-            # Cache the full tool result
-            tool_cache.set(tool_name, tool_args, tool_result)
+            print(f"\033[92m[CACHE HIT] Using {result_source} result for {tool_name}\033[0m")
 
         # Log output sizes
         tool_result_str = str(tool_result)
@@ -198,11 +169,13 @@ async def execute_and_process_tool(
         tool_result = {"error": str(e)}
         trunc_tool_result = str(tool_result)
 
-    # Create the result record for the tool trace
+    # Create the result record for the tool trace; image tools carry a media handle,
+    # so the trace never keeps a copy of the base64 asset
+    trace_input = {k: v for k, v in tool_args.items() if k not in ["image_base64", "images_base64"]} if isinstance(tool_args, dict) else tool_args
     trace_record = {
         "timestamp": datetime.datetime.now().isoformat(),
         "tool_name": tool_name,
-        "tool_input": tool_args,
+        "tool_input": trace_input,
         "truncated_result": trunc_tool_result,
         "full_result": tool_result if tool_name == "attempt_completion" else None,
         "cached": cached_result is not None  # Track if result was from cache
@@ -215,6 +188,7 @@ async def execute_and_process_tool(
         if isinstance(filtered_tool_args, dict):
             filtered_tool_args.pop("image_base64", None)
             filtered_tool_args.pop("images_base64", None)
+            filtered_tool_args.pop("image_handle", None)
 
         await on_stream({
             "type": "tool",
@@ -289,7 +263,7 @@ def get_cache_stats():
     """Get current cache statistics.
 
     Returns:
-        Dictionary with cache hit/miss statistics
+        Dictionary with cache hit/miss statistics, entries and bytes
     """
     return tool_cache.get_stats()
 
@@ -301,3 +275,16 @@ def clear_cache(tool_name=None):
         tool_name: Optional tool name to clear cache for specific tool only
     """
     tool_cache.clear(tool_name)
+
+# Function to invalidate cached results
+def invalidate_cache(tool_names=None, media=None):
+    """Drop cached tool results by tool and/or by media.
+
+    Args:
+        tool_names: Optional tool names to drop results for
+        media: Optional media handle, base64 asset or content hash to drop results for
+
+    Returns:
+        Number of entries removed
+    """
+    return tool_cache.invalidate(tool_names, media)
@@ -0,0 +1,187 @@
+import os
+import threading
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Frames whose 64-bit hashes differ in at most this many bits are treated as duplicates
+DEDUP_THRESHOLD = int(os.getenv("VIDEO_DEDUP_THRESHOLD", 8))
+
+# Frames whose mean colours differ by more than this in any channel (0-255) are never duplicates.
+# Both hashes ignore overall colour, so without it black, white and brand-colour cards share one hash.
+DEDUP_COLOR_THRESHOLD = int(os.getenv("VIDEO_DEDUP_COLOR_THRESHOLD", 24))
+
+# Perceptual hash used for deduplication: "dhash" (gradient, cheapest) or "phash" (DCT)
+DEDUP_HASH = os.getenv("VIDEO_DEDUP_HASH", "dhash")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), "big")
+
+
+def _gray(frame: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+
+def dhash(frame: np.ndarray, size: int = 8) -> int:
+    """Difference hash: whether each pixel of a (size+1) x size thumbnail is brighter than its right neighbour."""
+    small = cv2.resize(_gray(frame), (size + 1, size), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def phash(frame: np.ndarray, size: int = 8) -> int:
+    """DCT hash: whether each low-frequency coefficient of a 32x32 thumbnail is above their median."""
+    small = cv2.resize(_gray(frame), (size * 4, size * 4), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(small.astype(np.float32))[:size, :size]
+    # The DC term only reflects overall brightness, so it is left out of the median
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+
+HASH_FUNCTIONS = {"dhash": dhash, "phash": phash}
+
+
+def mean_color(frame: np.ndarray) -> Tuple[int, int, int]:
+    """Mean B, G, R of a frame, repeated for a grayscale frame."""
+    if frame.ndim == 2:
+        value = int(round(float(frame.mean())))
+        return value, value, value
+    return tuple(int(round(c)) for c in cv2.mean(frame)[:3])
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes for Hamming-distance range queries.
+
+    Children are keyed by their distance to the parent, so a query within
+    radius r only descends into children whose key is within r of the
+    query's own distance to the node.
+    """
+
+    def __init__(self):
+        self.root: Optional[list] = None  # [hash, value, {distance: child}]
+        self.size = 0
+
+    def add(self, hash_value: int, value: Any) -> None:
+        """Insert a hash with an associated value."""
+        self.size += 1
+        if self.root is None:
+            self.root = [hash_value, value, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_value, value, {}]
+                return
+            node = child
+
+    def nearest(self, hash_value: int, max_distance: int, accept: Optional[Callable[[Any], bool]] = None) -> Optional[Tuple[int, Any]]:
+        """Closest stored value within max_distance bits.
+
+        Args:
+            hash_value: Hash to look up
+            max_distance: Largest Hamming distance to return
+            accept: Optional filter; values it rejects are skipped but their subtrees still searched
+
+        Returns:
+            Tuple of (distance, value), or None if no hash is that close
+        """
+        best = None
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(hash_value, node[0])
+            if distance <= max_distance and (best is None or distance < best[0]) and (accept is None or accept(node[1])):
+                best = (distance, node[1])
+            radius = max_distance if best is None else min(max_distance, best[0])
+            for key, child in node[2].items():
+                if distance - radius <= key <= distance + radius:
+                    stack.append(child)
+        return best
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class FrameDeduplicator:
+    """Drops frames that look like any frame already kept, anywhere in the video.
+
+    Each frame is reduced to a 64-bit perceptual hash and looked up among the
+    hashes of all kept frames with a BK-tree. A frame within threshold bits
+    of a kept frame, and of a similar mean colour, joins that frame's cluster
+    instead of being kept, so shots that alternate are still recognised as
+    repeats while flat cards of different colours stay apart.
+    """
+
+    def __init__(self, threshold: int = DEDUP_THRESHOLD, method: str = DEDUP_HASH, color_threshold: int = DEDUP_COLOR_THRESHOLD):
+        """Initialize the deduplicator.
+
+        Args:
+            threshold: Maximum Hamming distance between duplicates; below 0 keeps every frame
+            method: Hash function, "dhash" or "phash"
+            color_threshold: Maximum per-channel difference of mean colour between duplicates
+        """
+        self.threshold = threshold
+        self.color_threshold = color_threshold
+        self.method = method if method in HASH_FUNCTIONS else "dhash"
+        self.hash_function = HASH_FUNCTIONS[self.method]
+        self.tree = BKTree()
+        self.clusters: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def add(self, frame: np.ndarray, frame_number: int, timestamp: float) -> Optional[Dict[str, Any]]:
+        """Hash a frame and assign it to a cluster.
+
+        Returns:
+            The new cluster if the frame is distinct and should be kept, or None if it
+            was added to the cluster of an earlier frame
+        """
+        hash_value = self.hash_function(frame)
+        color = mean_color(frame)
+
+        def same_color(cluster_id: int) -> bool:
+            kept = self.clusters[cluster_id]["color"]
+            return max(abs(a - b) for a, b in zip(color, kept)) <= self.color_threshold
+
+        with self.lock:
+            match = self.tree.nearest(hash_value, self.threshold, same_color) if self.threshold >= 0 else None
+            if match is not None:
+                distance, cluster_id = match
+                self.clusters[cluster_id]["duplicates"].append(
+                    {"frame_number": frame_number, "timestamp": timestamp, "distance": distance}
+                )
+                return None
+            cluster = {
+                "cluster": len(self.clusters),
+                "hash": f"{hash_value:016x}",
+                "color": list(color),
+                "frame_number": frame_number,
+                "timestamp": timestamp,
+                "duplicates": [],
+            }
+            self.clusters.append(cluster)
+            self.tree.add(hash_value, cluster["cluster"])
+            return cluster
+
+    def cluster_map(self) -> List[Dict[str, Any]]:
+        """Kept frames with the frames that were folded into each, in the order they were kept."""
+        with self.lock:
+            return [{**c, "duplicates": list(c["duplicates"])} for c in self.clusters]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counts of frames seen, kept and dropped as duplicates."""
+        with self.lock:
+            duplicates = sum(len(c["duplicates"]) for c in self.clusters)
+            return {
+                "dedup_method": self.method,
+                "dedup_threshold": self.threshold,
+                "dedup_color_threshold": self.color_threshold,
+                "frames_kept": len(self.clusters),
+                "frames_duplicate": duplicates,
+            }
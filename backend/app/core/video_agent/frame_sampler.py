@@ -0,0 +1,224 @@
+import os
+import time
+import base64
+import asyncio
+import threading
+import concurrent.futures
+from typing import Dict, Any, Iterator, AsyncIterator, Tuple, Optional
+
+import cv2
+import numpy as np
+
+from app.core.video_agent.frame_dedup import FrameDeduplicator
+
+# How frames between samples are skipped: "grab" reads past them without converting them
+# to images, "seek" jumps straight to the next sample, "auto" seeks only for sparse sampling
+SAMPLER_MODE = os.getenv("VIDEO_SAMPLER_MODE", "auto")
+
+# In auto mode, sampling intervals of at least this many seconds seek instead of grabbing;
+# a seek restarts decoding at the previous keyframe, which only pays off over longer gaps
+SEEK_MIN_INTERVAL = float(os.getenv("VIDEO_SEEK_MIN_INTERVAL", 2.0))
+
+# Encoded frames buffered between the extraction thread and the event loop; the thread
+# pauses when consumers fall this far behind
+FRAME_QUEUE_SIZE = int(os.getenv("VIDEO_FRAME_QUEUE_SIZE", 8))
+
+# Tolerance when comparing timestamps computed from frame numbers
+_TIME_EPSILON = 1e-6
+
+# Marks the end of the frame stream
+_DONE = object()
+
+
+class FrameSampler:
+    """Samples one frame per interval from a video, decoding only the frames it keeps.
+
+    Frames between samples are skipped with cap.grab(), which advances the
+    stream without retrieve()'s conversion to a BGR image, or by seeking to
+    the next sample's frame number. Decode statistics are collected in
+    self.stats while iterating.
+    """
+
+    def __init__(self, video_path: str, interval: float = 1.0, mode: str = SAMPLER_MODE, seek_min_interval: float = SEEK_MIN_INTERVAL):
+        """Initialize the sampler.
+
+        Args:
+            video_path: Path to the video file
+            interval: Minimum number of seconds between sampled frames
+            mode: "grab", "seek" or "auto"
+            seek_min_interval: Interval from which auto mode seeks instead of grabbing
+        """
+        self.video_path = video_path
+        self.interval = max(0.0, float(interval))
+        self.mode = mode if mode in ("grab", "seek", "auto") else "auto"
+        self.seek_min_interval = seek_min_interval
+        self.stats: Dict[str, Any] = {
+            "mode": None,
+            "fps": 0.0,
+            "total_frames": 0,
+            "frames_grabbed": 0,
+            "frames_decoded": 0,
+            "frames_skipped": 0,
+            "seeks": 0,
+            "seek_failures": 0,
+            "expected_samples": 0,
+            "elapsed": 0.0,
+        }
+
+    def _use_seek(self, fps: float) -> bool:
+        # Seeking needs a frame rate to turn sample times into frame numbers
+        if fps <= 0:
+            return False
+        if self.mode == "seek":
+            return True
+        return self.mode == "auto" and self.interval >= self.seek_min_interval
+
+    def __iter__(self) -> Iterator[Tuple[int, float, np.ndarray]]:
+        """Yield (frame number starting at 1, timestamp in seconds, BGR frame) for each sampled frame."""
+        start = time.perf_counter()
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            if not cap.isOpened():
+                print(f"❌ Could not open video {self.video_path}")
+                return
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            seek = self._use_seek(fps)
+            expected = total_frames
+            if fps > 0 and self.interval > 0:
+                expected = int(total_frames / fps / self.interval) + 1
+            self.stats.update(mode="seek" if seek else "grab", fps=fps, total_frames=total_frames, expected_samples=expected)
+
+            index = 0  # Frames consumed so far; the next grab returns frame index + 1
+            last_timestamp = None
+            while True:
+                if seek and last_timestamp is not None:
+                    target = int(np.ceil((last_timestamp + self.interval) * fps - _TIME_EPSILON))
+                    if total_frames and target >= total_frames:
+                        break
+                    if target - index > 1:
+                        if cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                            self.stats["seeks"] += 1
+                            index = target
+                        else:
+                            # Some containers cannot seek; grab through the gap instead
+                            self.stats["seek_failures"] += 1
+                            seek = False
+                            self.stats["mode"] = "grab"
+
+                if not cap.grab():
+                    break
+                index += 1
+                self.stats["frames_grabbed"] += 1
+                timestamp = (index - 1) / fps if fps > 0 else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+
+                if last_timestamp is not None and timestamp - last_timestamp < self.interval - _TIME_EPSILON:
+                    self.stats["frames_skipped"] += 1
+                    continue
+
+                ok, frame = cap.retrieve()
+                if not ok or frame is None:
+                    self.stats["frames_skipped"] += 1
+                    continue
+                self.stats["frames_decoded"] += 1
+                last_timestamp = timestamp
+                yield index, timestamp, frame
+        finally:
+            cap.release()
+            self.stats["elapsed"] = round(time.perf_counter() - start, 3)
+
+    def summary(self) -> str:
+        """One-line description of the decode statistics, for logs."""
+        s = self.stats
+        return (
+            f"{s['frames_decoded']} decoded / {s['frames_grabbed']} grabbed of {s['total_frames']} frames "
+            f"({s['mode']} mode, {s['seeks']} seeks) in {s['elapsed']}s"
+        )
+
+
+async def stream_frames(
+    sampler: FrameSampler,
+    dedup: Optional[FrameDeduplicator] = None,
+    quality: int = 70
+) -> AsyncIterator[Dict[str, Any]]:
+    """Stream sampled frames, decoded and JPEG-encoded in a worker thread.
+
+    OpenCV work never runs on the event loop. Frames are yielded as soon as
+    they are encoded, so consumers overlap with decoding; a small queue
+    pauses the thread when they fall behind. sampler.stats is updated live
+    and can be read for progress. Closing the generator early stops the
+    thread.
+
+    Args:
+        sampler: Sampler for the video
+        dedup: Optional deduplicator run in the worker thread on each sampled frame
+            before encoding; duplicates are dropped and recorded in its clusters
+        quality: JPEG quality of the encoded frames
+
+    Yields:
+        Frame dictionaries with timestamp, frame_number, base64 and image_data, plus
+        the perceptual hash and cluster id when deduplicating
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=FRAME_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Blocks the worker while the queue is full, giving up once the consumer has gone
+        try:
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        except RuntimeError:
+            # The event loop has shut down
+            return False
+        while True:
+            try:
+                future.result(timeout=0.5)
+                return True
+            except concurrent.futures.TimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        frames = iter(sampler)
+        try:
+            for frame_number, timestamp, frame in frames:
+                if stop.is_set():
+                    break
+                cluster = None
+                if dedup is not None:
+                    cluster = dedup.add(frame, frame_number, timestamp)
+                    if cluster is None:
+                        continue
+                _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+                base64_data = base64.b64encode(buffer).decode('utf-8')
+                item = {
+                    'timestamp': timestamp,
+                    'base64': base64_data,
+                    'image_data': base64_data,  # Add image_data key for OpenRouterAgent
+                    'frame_number': frame_number
+                }
+                if cluster is not None:
+                    item['hash'] = cluster['hash']
+                    item['cluster'] = cluster['cluster']
+                if not put(item):
+                    break
+        except Exception as e:
+            put(e)
+        finally:
+            frames.close()
+            if not stop.is_set():
+                put(_DONE)
+
+    worker = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await worker
+    finally:
+        stop.set()
@@ -9,7 +9,6 @@ from app.core.agent.prompt import gemini_system_prompt
 import numpy as np
 from openai import OpenAI  # Gemini via OpenAI wrapper
 import asyncio
-import base64
 import sys
 import os
 from dotenv import load_dotenv
@@ -17,6 +16,9 @@ from pathlib import Path
 import hashlib
 import time
 
+from app.core.video_agent.frame_sampler import FrameSampler, stream_frames
+from app.core.video_agent.frame_dedup import FrameDeduplicator
+
 # Load environment variables
 load_dotenv()
 
@@ -53,60 +55,22 @@ async def validate_video_file(file_path):
     except Exception as e:
         return False, str(e)
 
-def calculate_frame_similarity(frame1, frame2, threshold=0.5):
-    gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
-    gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
-    size = (200, 200)
-    gray1 = cv2.resize(gray1, size)
-    gray2 = cv2.resize(gray2, size)
-    score = cv2.compareHist(
-        cv2.calcHist([gray1], [0], None, [256], [0, 256]),
-        cv2.calcHist([gray2], [0], None, [256], [0, 256]),
-        cv2.HISTCMP_CORREL,
-    )
-    is_similar = score > threshold
-    return is_similar, score
+async def extract_frames(video_path, initial_interval=0.1, similarity_threshold=0.95, stats=None, dedup_threshold=None):
+    """Sample one frame per interval, keeping only frames unlike any kept so far.
 
-async def extract_frames(video_path, initial_interval=0.1, similarity_threshold=0.95):
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frames = []
-    frame_count = 0
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    print(f"Processing video with {total_frames} total frames")
-    video_length = total_frames / fps if fps > 0 else 0
-    fixed_interval = initial_interval
-    last_timestamp = -1
-    prev_frame = None
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frame_count += 1
-        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
-        if frame_count % 100 == 0:
-            progress = (frame_count / total_frames) * 100 if total_frames > 0 else 0
-            print(f"Processed {frame_count}/{total_frames} frames ({progress:.1f}%)")
-        if last_timestamp < 0 or (timestamp - last_timestamp) >= fixed_interval:
-            is_unique = True
-            if prev_frame is not None:
-                is_similar, score = calculate_frame_similarity(prev_frame, frame, threshold=0.5)
-                if is_similar:
-                    is_unique = False
-            if is_unique:
-                # Compress the image by reducing JPEG quality to 70% (30% compression)
-                encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), 70]
-                _, buffer = cv2.imencode('.jpg', frame, encode_params)
-                base64_data = base64.b64encode(buffer).decode('utf-8')
-                frames.append({
-                    'timestamp': timestamp,
-                    'base64': base64_data,
-                    'image_data': base64_data,  # Add image_data key for OpenRouterAgent
-                    'frame_number': frame_count
-                })
-                prev_frame = frame
-            last_timestamp = timestamp
-    cap.release()
+    Decoding, perceptual-hash deduplication and encoding run in a worker
+    thread (see stream_frames), and only the sampled frames are decoded. If a
+    stats dict is passed, it is filled with decode and dedup statistics and
+    the frame-cluster map under "frame_clusters".
+    """
+    sampler = FrameSampler(video_path, interval=initial_interval)
+    dedup = FrameDeduplicator() if dedup_threshold is None else FrameDeduplicator(threshold=dedup_threshold)
+    # Compress the image by reducing JPEG quality to 70% (30% compression)
+    frames = [frame async for frame in stream_frames(sampler, dedup=dedup, quality=70)]
+    dedup_stats = dedup.get_stats()
+    print(f"🎞️ Kept {len(frames)} distinct frames ({dedup_stats['frames_duplicate']} duplicates dropped): {sampler.summary()}")
+    if stats is not None:
+        stats.update(sampler.stats, **dedup_stats, frame_clusters=dedup.cluster_map())
     return frames
 
 def get_frames_by_timestamp(frames, timestamp):
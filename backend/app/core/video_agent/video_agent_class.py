@@ -3,19 +3,19 @@ import os
 import json
 import shutil
 import tempfile
-import requests
 import urllib.parse
 from datetime import datetime
 from typing import Optional, List, Dict, Any, Callable
 
 # Import the functions from the Gemini-based LLM implementation
 from app.core.video_agent.gemini_llm import (
-    calculate_frame_similarity,
     extract_frames,
     get_frames_by_timestamp,
     get_frame_by_timestamp,
 )
 
+from app.core.video_agent.video_downloader import video_downloader
+
 from app.core.agent.prompt import gemini_system_prompt
 # import download_video
 from app.core.video_agent.llm import download_video
@@ -35,6 +35,9 @@ async def download_video(video_url: str) -> tuple:
     """
     Download a video from a URL to a temporary file.
     
+    The file in the temporary directory is a hard link to (or copy of) the
+    cached video, so callers may delete the directory when done.
+    
     Args:
         video_url: URL of the video to download
         
@@ -55,15 +58,8 @@ async def download_video(video_url: str) -> tuple:
         # Create the full path for the video
         video_path = os.path.join(temp_dir, video_filename)
         
-        # Download the video
-        response = requests.get(video_url, stream=True)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        
-        # Write the content to the file
-        with open(video_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        # Download the video (parallel ranges when supported, served from the disk cache on repeat checks)
+        await video_downloader.download(video_url, video_path)
         
         print(f"✅ Downloaded video to: {video_path}")
         
@@ -0,0 +1,370 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import asyncio
+import hashlib
+import tempfile
+import threading
+import contextlib
+import urllib.parse
+from typing import Dict, Any, Iterator, Optional
+
+import aiohttp
+
+# Directory of the on-disk video cache
+VIDEO_CACHE_DIR = os.getenv("VIDEO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "brandcompliance_video_cache"))
+
+# Total size of cached videos before the least recently used are evicted (2GB by default)
+VIDEO_CACHE_MAX_BYTES = int(os.getenv("VIDEO_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+# Videos larger than this are downloaded but not cached (500MB by default)
+VIDEO_CACHE_MAX_ENTRY_BYTES = int(os.getenv("VIDEO_CACHE_MAX_ENTRY_BYTES", 500 * 1024 * 1024))
+
+# Range requests in flight at once, and the size of each
+DOWNLOAD_PARALLELISM = int(os.getenv("VIDEO_DOWNLOAD_PARALLELISM", 4))
+DOWNLOAD_PART_BYTES = int(os.getenv("VIDEO_DOWNLOAD_PART_BYTES", 8 * 1024 * 1024))
+
+# Attempts per stream or range before giving up; each retry resumes where the last one stopped
+DOWNLOAD_RETRIES = int(os.getenv("VIDEO_DOWNLOAD_RETRIES", 3))
+
+# Overall time limit of one download in seconds
+DOWNLOAD_TIMEOUT = int(os.getenv("VIDEO_DOWNLOAD_TIMEOUT", 600))
+
+# Bytes read from the response per write
+CHUNK_BYTES = 1024 * 1024
+
+# Seconds between attempts to take a download lock held by another process
+LOCK_POLL_INTERVAL = 0.2
+
+
+class RangeNotSupported(Exception):
+    """Raised when a server answers a range request with the whole body."""
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class VideoDownloader:
+    """Async video downloader with a content-addressed disk cache.
+
+    Servers that accept byte ranges are downloaded with several range
+    requests in parallel; others are streamed, resuming with a Range header
+    after a dropped connection when possible. Each range is retried from the
+    bytes it already received, but only a streamed download leaves a partial
+    file that a later download of the same version resumes from; a failed
+    parallel download is discarded. Finished downloads are stored
+    once per content hash and indexed by URL and ETag (or Last-Modified), so
+    re-checking the same uploaded video skips the network. The cache is
+    bounded in bytes and evicts the least recently used videos.
+
+    The cache directory is shared by every server process: the index is
+    re-read and rewritten under an exclusive file lock, and each video
+    version is downloaded by one process at a time under a per-key file
+    lock, so the others wait and then hit the cache.
+    """
+
+    def __init__(self, cache_dir: str = VIDEO_CACHE_DIR, max_bytes: int = VIDEO_CACHE_MAX_BYTES, max_entry_bytes: int = VIDEO_CACHE_MAX_ENTRY_BYTES):
+        """Initialize the downloader.
+
+        Args:
+            cache_dir: Directory for cached videos, partial downloads and the index
+            max_bytes: Total size of cached videos kept before evicting the least recently used
+            max_entry_bytes: Videos larger than this are not cached
+        """
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.partial_dir = os.path.join(cache_dir, "partial")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index_lock_path = os.path.join(cache_dir, "index.lock")
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.index_lock = threading.Lock()
+        self.key_locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "uncached": 0,
+            "parallel_downloads": 0,
+            "stream_downloads": 0,
+            "resumes": 0,
+            "bytes_downloaded": 0,
+            "evictions": 0,
+        }
+
+    @contextlib.contextmanager
+    def _locked_index(self) -> Iterator[Dict[str, Any]]:
+        """Hold the index exclusively across processes and yield it as currently on disk.
+
+        The index maps cache key -> content hash and content hash -> size and
+        last use. Changes made to it inside the block are written back on exit.
+        """
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        with self.index_lock, open(self.index_lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = {"keys": {}, "blobs": {}}
+            snapshot = json.dumps(index, sort_keys=True)
+            yield index
+            if json.dumps(index, sort_keys=True) != snapshot:
+                tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, self.index_path)
+
+    @contextlib.asynccontextmanager
+    async def _download_lock(self, key: str):
+        """Hold the download of one video version exclusively across processes."""
+        os.makedirs(self.partial_dir, exist_ok=True)
+        with open(os.path.join(self.partial_dir, f"{key}.lock"), "a") as lock_file:
+            # Poll instead of blocking a thread, so a cancelled wait never leaves the lock taken
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(LOCK_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, f"{digest}.bin")
+
+    @staticmethod
+    def cache_key(url: str, etag: Optional[str], last_modified: Optional[str], size: Optional[int]) -> Optional[str]:
+        """Key of a video version, or None if the server gives nothing to validate a cached copy with.
+
+        With an ETag the query string is ignored, so presigned URLs of the same
+        object share an entry.
+        """
+        if etag:
+            parts = urllib.parse.urlsplit(url)
+            identity = f"{parts.scheme}://{parts.netloc}{parts.path}\n{etag}"
+        elif last_modified:
+            identity = f"{url}\n{last_modified}\n{size}"
+        else:
+            return None
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def _lookup(self, key: str, destination: str) -> Optional[str]:
+        """Place the cached video for a key at destination, refreshing its last use.
+
+        The video is placed under the index lock, so no other process can evict
+        it in between.
+
+        Returns:
+            Path of the cached video, or None if the key is not cached
+        """
+        with self._locked_index() as index:
+            digest = index["keys"].get(key)
+            if digest is None:
+                return None
+            path = self._blob_path(digest)
+            if digest not in index["blobs"] or not os.path.exists(path):
+                index["keys"].pop(key, None)
+                index["blobs"].pop(digest, None)
+                return None
+            index["blobs"][digest]["last_used"] = time.time()
+            self._place(path, destination)
+            return path
+
+    def _add(self, key: str, path: str, digest: str, destination: str) -> str:
+        """Move a finished download into the cache, place it at destination and evict over budget.
+
+        Returns:
+            Path of the cached video
+        """
+        with self._locked_index() as index:
+            blob_path = self._blob_path(digest)
+            if os.path.exists(blob_path):
+                # Same content under another URL; keep the copy already cached
+                os.remove(path)
+            else:
+                os.replace(path, blob_path)
+            index["keys"][key] = digest
+            index["blobs"][digest] = {"size": os.path.getsize(blob_path), "last_used": time.time()}
+
+            total = sum(blob["size"] for blob in index["blobs"].values())
+            for old_digest, blob in sorted(index["blobs"].items(), key=lambda item: item[1]["last_used"]):
+                if total <= self.max_bytes:
+                    break
+                if old_digest == digest:
+                    continue
+                try:
+                    os.remove(self._blob_path(old_digest))
+                except OSError:
+                    pass
+                del index["blobs"][old_digest]
+                total -= blob["size"]
+                self.stats["evictions"] += 1
+            index["keys"] = {k: d for k, d in index["keys"].items() if d in index["blobs"]}
+            self._place(blob_path, destination)
+            return blob_path
+
+    async def _probe(self, session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
+        """Size, validators and range support of a URL, from a HEAD request."""
+        info = {"size": None, "etag": None, "last_modified": None, "ranges": False}
+        try:
+            async with session.head(url, allow_redirects=True) as response:
+                if response.status < 400:
+                    info.update(
+                        size=response.content_length,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                        ranges=response.headers.get("Accept-Ranges", "").lower() == "bytes",
+                    )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"⚠️ HEAD request failed, downloading without cache: {str(e)}")
+        return info
+
+    async def _stream(self, session: aiohttp.ClientSession, url: str, path: str, size: Optional[int], ranges: bool) -> None:
+        """Download in one stream, resuming from the bytes already in path when the server allows it."""
+        for attempt in range(DOWNLOAD_RETRIES):
+            offset = os.path.getsize(path) if ranges and os.path.exists(path) else 0
+            if size is not None and offset >= size:
+                return
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                async with session.get(url, headers=headers) as response:
+                    response.raise_for_status()
+                    if offset and response.status != 206:
+                        offset = 0
+                    elif offset:
+                        self.stats["resumes"] += 1
+                        print(f"🔁 Resuming download at {offset // 1024}KB")
+                    with open(path, "r+b" if offset else "wb") as f:
+                        f.seek(offset)
+                        async for chunk in response.content.iter_chunked(CHUNK_BYTES):
+                            f.write(chunk)
+                            self.stats["bytes_downloaded"] += len(chunk)
+                if size is None or os.path.getsize(path) >= size:
+                    return
+            except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == DOWNLOAD_RETRIES - 1:
+                    raise
+                print(f"⚠️ Download interrupted ({str(e)}), retrying")
+        raise ValueError("Download ended before the whole video was received")
+
+    async def _fetch_range(self, session: aiohttp.ClientSession, url: str, path: str, start: int, end: int) -> None:
+        """Download bytes start..end (inclusive) into their place in path."""
+        written = 0
+        for attempt in range(DOWNLOAD_RETRIES):
+            try:
+                async with session.get(url, headers={"Range": f"bytes={start + written}-{end}"}) as response:
+                    response.raise_for_status()
+                    if response.status != 206:
+                        raise RangeNotSupported()
+                    with open(path, "r+b") as f:
+                        f.seek(start + written)
+                        async for chunk in response.content.iter_chunked(CHUNK_BYTES):
+                            f.write(chunk)
+                            written += len(chunk)
+                            self.stats["bytes_downloaded"] += len(chunk)
+                if written >= end - start + 1:
+                    return
+            except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == DOWNLOAD_RETRIES - 1:
+                    raise
+                print(f"⚠️ Range {start}-{end} interrupted ({str(e)}), retrying")
+        raise ValueError(f"Range {start}-{end} ended early")
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str, path: str, info: Dict[str, Any]) -> None:
+        """Download url to path, with parallel ranges when the server supports them."""
+        size = info["size"]
+        if info["ranges"] and size and size >= 2 * DOWNLOAD_PART_BYTES:
+            with open(path, "wb") as f:
+                f.truncate(size)
+            semaphore = asyncio.Semaphore(DOWNLOAD_PARALLELISM)
+
+            async def fetch_part(start: int) -> None:
+                async with semaphore:
+                    await self._fetch_range(session, url, path, start, min(start + DOWNLOAD_PART_BYTES, size) - 1)
+
+            # Ranges do not record their progress on disk, so this always starts from an empty file
+            tasks = [asyncio.create_task(fetch_part(start)) for start in range(0, size, DOWNLOAD_PART_BYTES)]
+            try:
+                await asyncio.gather(*tasks)
+                self.stats["parallel_downloads"] += 1
+                return
+            except BaseException as e:
+                # Stop the other ranges; a preallocated file must not be mistaken for a partial download
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                if os.path.exists(path):
+                    os.remove(path)
+                if not isinstance(e, RangeNotSupported):
+                    raise
+                print("⚠️ Server ignored range requests, streaming instead")
+        self.stats["stream_downloads"] += 1
+        await self._stream(session, url, path, size, info["ranges"])
+
+    async def download(self, url: str, destination: str) -> str:
+        """Download a video to destination, serving it from the disk cache when the same version was fetched before.
+
+        Args:
+            url: URL of the video
+            destination: Path to place the video at; a hard link to the cached copy when possible
+
+        Returns:
+            The destination path
+        """
+        timeout = aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            info = await self._probe(session, url)
+            key = self.cache_key(url, info["etag"], info["last_modified"], info["size"])
+            if key is None or (info["size"] or 0) > self.max_entry_bytes:
+                self.stats["uncached"] += 1
+                await self._fetch(session, url, destination, info)
+                return destination
+
+            # The in-process lock keeps concurrent requests of this process off the file lock
+            lock = self.key_locks.setdefault(key, asyncio.Lock())
+            async with lock, self._download_lock(key):
+                cached = await asyncio.to_thread(self._lookup, key, destination)
+                if cached:
+                    self.stats["hits"] += 1
+                    print(f"⚡ Video cache hit for {url}")
+                else:
+                    self.stats["misses"] += 1
+                    # Partial downloads are named by key, so an interrupted stream of the same version resumes
+                    partial = os.path.join(self.partial_dir, f"{key}.part")
+                    start = time.perf_counter()
+                    await self._fetch(session, url, partial, info)
+                    digest = await asyncio.to_thread(_file_sha256, partial)
+                    cached = await asyncio.to_thread(self._add, key, partial, digest, destination)
+                    print(f"✅ Downloaded {os.path.getsize(cached) // 1024}KB in {time.perf_counter() - start:.1f}s and cached it")
+        return destination
+
+    @staticmethod
+    def _place(source: str, destination: str) -> None:
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Download and cache statistics, including the videos held on disk."""
+        with self._locked_index() as index:
+            return {
+                **self.stats,
+                "entries": len(index["blobs"]),
+                "total_bytes": sum(blob["size"] for blob in index["blobs"].values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Shared downloader for this process
+video_downloader = VideoDownloader()
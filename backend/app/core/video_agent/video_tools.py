@@ -19,6 +19,9 @@ import base64
 import json
 import requests
 
+from app.core.agent.media_store import DecodedMedia
+from app.core.agent.palette import extract_palettes
+
 # Load environment variables
 load_dotenv()
 
@@ -65,61 +68,29 @@ async def get_video_color_scheme(data):
         return json.dumps({"error": "No images provided for the video frame(s)."})
 
     try:
-        # Process all frames and collect their color palettes
-        all_colors = set()
-        frame_palettes = []
-
-        for i, image_base64 in enumerate(images_base64):
-            # Ensure correct padding for base64 string
-            padding_needed = len(image_base64) % 4
-            if padding_needed != 0:
-                image_base64 += "=" * (4 - padding_needed)  # Add padding if necessary
-
-            # Decode the base64 string into binary data
-            image_data = base64.b64decode(image_base64)
-
-            # Open the image using PIL
-            with Image.open(BytesIO(image_data)) as img:
-                # Convert image to RGB if it's not already
-                img = img.convert("RGB")
-
-                # Get the color palette of the image
-                colors = img.getcolors(
-                    maxcolors=1000000
-                )  # Increase maxcolors to cover all colors
-
-                if not colors:
-                    print(f"No colors found in frame {i} at timestamp {timestamp}")
-                    continue
-
-                # Convert RGB tuples to hex format
-                frame_colors = [
-                    f"#{r:02x}{g:02x}{b:02x}" for count, (r, g, b) in colors
-                ]
-
-                # Add to the overall set of colors
-                all_colors.update(frame_colors)
-
-                # Store this frame's palette
-                frame_palettes.append(
-                    {
-                        "frame_index": i,
-                        "color_palette": frame_colors[
-                            :10
-                        ],  # Limit to 10 colors per frame
-                    }
-                )
+        # Decode every frame once and extract the palettes in one pass
+        frames = [DecodedMedia.from_base64(image_base64).array for image_base64 in images_base64]
+        palettes = extract_palettes(frames)
 
-        if not all_colors:
+        if not palettes["palette"]:
             return json.dumps({"error": "No colors found in any video frames."})
 
-        # Convert the set to a list and limit to 10 colors for the overall palette
-        color_palette = list(all_colors)[:10]
+        # Overall palette across all frames, with coverage percentages
+        color_palette = [color["hex"] for color in palettes["palette"]]
+        frame_palettes = [
+            {
+                "frame_index": i,
+                "color_palette": [color["hex"] for color in palette],
+                "color_coverage": palette,
+            }
+            for i, palette in enumerate(palettes["frame_palettes"])
+        ]
 
         # Create the response with both overall palette and individual frame palettes
         response_data = {
             "timestamp": timestamp,
             "color_palette": color_palette,  # Overall palette across all frames
+            "color_coverage": palettes["palette"],
             "frame_count": len(images_base64),
             "frame_palettes": frame_palettes if len(images_base64) > 1 else None,
         }
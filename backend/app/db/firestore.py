@@ -415,6 +415,41 @@ def get_brand_guidelines_by_user(user_id: str) -> List[Dict]:
         results.append(convert_to_dict(doc))
     return results
 
+def update_brand_guideline_colors(guideline_id: str, brand_colors: List[Dict]) -> str:
+    """
+    Store the brand colors extracted from a guideline's pages
+
+    Args:
+        guideline_id: Guideline ID
+        brand_colors: List of colors, each with hex and an optional name
+
+    Returns:
+        str: ID of the updated guideline
+    """
+    return update_document(brand_guidelines_collection, guideline_id, {'brand_colors': brand_colors})
+
+def get_brand_colors(brand_name: str) -> List[Dict]:
+    """
+    Get the brand colors stored on all guidelines of a brand
+
+    Args:
+        brand_name: Brand name (matched case-insensitively)
+
+    Returns:
+        list: Colors from every matching guideline, each with hex and an optional name
+    """
+    guidelines = query_collection(brand_guidelines_collection, 'brand_name', '==', brand_name)
+    if not guidelines:
+        # Firestore has no case-insensitive match; scan a bounded number of guidelines
+        guidelines = [
+            convert_to_dict(doc) for doc in brand_guidelines_collection.limit(100).stream()
+            if (doc.to_dict() or {}).get('brand_name', '').lower() == brand_name.lower()
+        ]
+    colors = []
+    for guideline in guidelines:
+        colors.extend(guideline.get('brand_colors') or [])
+    return colors
+
 # Guideline Pages Operations
 def create_guideline_page(page_data: Dict) -> str:
     """
@@ -14,6 +14,8 @@ import multiprocessing
 from datetime import datetime
 from app.core.agent.llm import llm
 from app.utils.pdf_to_image import pdf_to_image_fitz, pdf_to_image
+from app.core.openrouter_agent.client_registry import get_gemini_client
+from app.core.agent.brand_palette import parse_brand_colors
 # Import both MongoDB and Firestore functions for backward compatibility
 from app.db.database import create_guideline_page as create_guideline_page_mongo
 from app.db.firestore import create_guideline_page
@@ -44,9 +46,6 @@ async def process_guideline_page(page_data: Dict[str, Any]) -> Dict[str, Any]:
         guideline_id = page_data.get("guideline_id")
         page_number = page_data.get("page_number")
 
-        import os
-        from openai import OpenAI
-
         # Prepare the image as base64
         image_base64 = page_data["base64"]
         if image_base64.startswith("data:image"):
@@ -64,18 +63,19 @@ You will receive an image of a page from a brand guideline PDF. Provide a brief,
 
 The output should be dense and clear for search/embeddings—no extra explanation or filler.
 
+If the page specifies official brand colors, end with one line listing each of them as name and hex code (convert RGB, CMYK or Pantone values to hex), e.g.:
+Colors: Coke Red #F40009, Black #000000
+
 Example Based on Your Image:
 Color usage principle, emphasizes trademark red, shows product cans in various colors (cherry, vanilla, lemon, lime, orange), rule: use red as dominant color to differentiate products and maintain brand consistency
         """
 
-        # Instantiate OpenAI client for Gemini
-        client = OpenAI(
-            api_key=os.getenv("GOOGLE_API_KEY"),
-            base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-        )
+        # Shared async client for Gemini, so pages reuse pooled connections
+        # and the call no longer blocks the event loop
+        client = get_gemini_client()
 
         # Compose the Gemini Vision API call
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="gemini-2.0-flash",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -104,6 +104,7 @@ Color usage principle, emphasizes trademark red, shows product cans in various c
             "guideline_id": guideline_id,
             "page_number": page_number,
             "result": result_text,
+            "brand_colors": parse_brand_colors(result_text),
         }
 
         return final_result
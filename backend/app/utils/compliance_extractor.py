@@ -13,7 +13,7 @@ import re
 import asyncio
 from typing import Dict, Any, Tuple, Optional, Union
 
-from openai import AsyncOpenAI
+from app.core.openrouter_agent.client_registry import get_openrouter_client
 
 # Constants
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
@@ -70,15 +70,8 @@ async def extract_brand_and_score(
     else:
         report_text = str(compliance_report)
     
-    # Initialize OpenAI client with OpenRouter settings
-    client = AsyncOpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key,
-        default_headers={
-            "HTTP-Referer": "https://brandguideline.ai",
-            "X-Title": "Brand Compliance AI"
-        }
-    )
+    # Use the shared OpenRouter client with its keep-alive connection pool
+    client = get_openrouter_client(api_key)
     
     # Create the full prompt
     full_prompt = EXTRACTION_PROMPT + report_text
@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+import asyncio
 from dotenv import load_dotenv
 import os
 import logging
@@ -20,6 +21,10 @@ from app.core.firebase_init import firebase_app
 
 # Import API modules
 from app.api import auth, items, brand_guidelines, compliance, video_upload, firebase_auth, user_profile
+from app.core.openrouter_agent.conversation_journal import journal_writer
+from app.core.openrouter_agent.llm_tracer import llm_tracer
+from app.core.openrouter_agent.client_registry import llm_clients
+from app.core.openrouter_agent.tool_definitions import tool_pool
 
 # Import Redis startup module
 try:
@@ -54,6 +59,16 @@ async def startup_event():
         except Exception as e:
             logger.exception(f"Error initializing Redis cache: {str(e)}")
 
+    # Create the shared LLM clients so the first requests reuse their connection pools
+    await llm_clients.startup()
+    logger.info(f"LLM client registry ready: {llm_clients.get_pool_metrics()}")
+
+    # Start the tool worker processes so the first CPU-bound tool call finds them warm
+    try:
+        await tool_pool.startup()
+    except Exception as e:
+        logger.exception(f"Error starting the tool process pool: {str(e)}")
+
     logger.info("Compliance API startup complete")
 
 @app.on_event("shutdown")
@@ -72,6 +87,23 @@ async def shutdown_event():
         except Exception as e:
             logger.exception(f"Error closing Redis connections: {str(e)}")
 
+    # Close the shared LLM clients and their connection pools
+    logger.info(f"Closing LLM clients: {llm_clients.get_pool_metrics()}")
+    await llm_clients.aclose()
+
+    # Finish or cancel background frame pre-extractions before the process exits
+    await video_upload.shutdown_frame_manifests()
+
+    # Stop the tool worker processes
+    logger.info(f"Stopping tool process pool: {tool_pool.get_stats()}")
+    await asyncio.to_thread(tool_pool.shutdown)
+
+    # Flush pending conversation journal records off the event loop
+    await asyncio.to_thread(journal_writer.close)
+    logger.info(f"Conversation journal closed: {journal_writer.get_stats()}")
+    await asyncio.to_thread(llm_tracer.close)
+    logger.info(f"LLM tracer closed: {llm_tracer.get_stats()}")
+
     logger.info("Compliance API shutdown complete")
 
 # Configure CORS
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Script to test the in-process tier of the tool result cache.
+
+Covers media-aware keys (the same call on another image misses), eviction of
+the least recently used results once the byte bound is exceeded, and
+invalidation of every result that references a given image.
+"""
+
+import base64
+import hashlib
+from io import BytesIO
+
+from PIL import Image
+
+from app.core.openrouter_agent.tool_cache import ToolResultCache, media_fingerprints
+
+
+def png_base64(color):
+    """A small solid-colour PNG as base64."""
+    buffer = BytesIO()
+    Image.new("RGB", (16, 16), color).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+IMAGE_A = png_base64((255, 0, 0))
+IMAGE_B = png_base64((0, 0, 255))
+
+
+def test_other_image_misses():
+    """A call cached for image A is a hit for A and a miss for B with otherwise identical arguments."""
+    cache = ToolResultCache()
+    args = {"image_base64": IMAGE_A, "coordinates": "0,0,16,16", "task_detail": "Check clarity"}
+    cache.set("check_image_clarity", args, '{"clarity": "sharp"}')
+
+    assert cache.get("check_image_clarity", args) == '{"clarity": "sharp"}'
+    # task_detail only describes the call, so changing it still hits
+    assert cache.get("check_image_clarity", {**args, "task_detail": "Again"}) == '{"clarity": "sharp"}'
+    assert cache.get("check_image_clarity", {**args, "image_base64": IMAGE_B}) is None
+    # A data URL of the same image is the same content
+    assert cache.get("check_image_clarity", {**args, "image_base64": f"data:image/png;base64,{IMAGE_A}"}) == '{"clarity": "sharp"}'
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+    print("✅ Same call on another image misses")
+
+
+def test_lru_byte_eviction():
+    """Once the stored results exceed max_bytes, the least recently used are evicted first."""
+    result = "x" * 400
+    cache = ToolResultCache(max_bytes=1000)
+    first = {"image_base64": IMAGE_A, "coordinates": "0,0,8,8"}
+    second = {"image_base64": IMAGE_A, "coordinates": "8,8,16,16"}
+    third = {"image_base64": IMAGE_B, "coordinates": "0,0,8,8"}
+
+    cache.set("check_image_clarity", first, result)
+    cache.set("check_image_clarity", second, result)
+    assert cache.get_stats()["bytes"] == 800
+
+    # Using the first result makes the second the least recently used
+    assert cache.get("check_image_clarity", first) == result
+    cache.set("check_image_clarity", third, result)
+
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 800
+    assert cache.get("check_image_clarity", second) is None
+    assert cache.get("check_image_clarity", first) == result
+    assert cache.get("check_image_clarity", third) == result
+
+    # A result larger than the whole cache is not stored and evicts nothing
+    cache.set("check_image_clarity", {"image_base64": IMAGE_B, "coordinates": "1,1,2,2"}, "x" * 1001)
+    stats = cache.get_stats()
+    assert stats["oversized"] == 1
+    assert stats["entries"] == 2
+    print("✅ LRU byte eviction")
+
+
+def test_invalidate_by_media():
+    """invalidate(media=...) drops every result referencing that image, whether named by base64, handle or hash."""
+    cache = ToolResultCache()
+    digest_a = hashlib.sha256(IMAGE_A.encode()).hexdigest()
+    assert media_fingerprints({"image_base64": IMAGE_A}) == [digest_a]
+
+    cache.set("check_image_clarity", {"image_base64": IMAGE_A}, "clarity A")
+    cache.set("get_region_color_scheme", {"image_base64": IMAGE_A}, "colors A")
+    cache.set("check_layout_consistency", {"images_base64": [IMAGE_A, IMAGE_B]}, "layout A+B")
+    cache.set("check_image_clarity", {"image_base64": IMAGE_B}, "clarity B")
+
+    assert cache.invalidate(media=IMAGE_A) == 3
+    assert cache.get("check_image_clarity", {"image_base64": IMAGE_A}) is None
+    assert cache.get("get_region_color_scheme", {"image_base64": IMAGE_A}) is None
+    assert cache.get("check_layout_consistency", {"images_base64": [IMAGE_A, IMAGE_B]}) is None
+    assert cache.get("check_image_clarity", {"image_base64": IMAGE_B}) == "clarity B"
+
+    # Handles and bare content hashes name the same media
+    cache.set("check_image_clarity", {"image_handle": f"media:sha256:{digest_a}"}, "clarity A")
+    assert cache.get("check_image_clarity", {"image_base64": IMAGE_A}) == "clarity A"
+    assert cache.invalidate(media=digest_a) == 1
+
+    # Restricting by tool leaves other tools' results for the same image
+    cache.set("check_image_clarity", {"image_base64": IMAGE_B}, "clarity B")
+    cache.set("get_region_color_scheme", {"image_base64": IMAGE_B}, "colors B")
+    assert cache.invalidate(["get_region_color_scheme"], media=IMAGE_B) == 1
+    assert cache.get("check_image_clarity", {"image_base64": IMAGE_B}) == "clarity B"
+    assert cache.get_stats()["invalidations"] == 5
+    print("✅ Invalidation by media")
+
+
+if __name__ == "__main__":
+    test_other_image_misses()
+    test_lru_byte_eviction()
+    test_invalidate_by_media()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Script to test the video downloader against a local HTTP server.
+
+Covers parallel range downloads, the fallback to a single stream when the
+server ignores Range headers, and cache hits on repeated downloads.
+"""
+
+import os
+import asyncio
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Small parts so a test video is split into several ranges
+os.environ.setdefault("VIDEO_DOWNLOAD_PART_BYTES", str(64 * 1024))
+
+from app.core.video_agent.video_downloader import VideoDownloader
+
+VIDEO_BYTES = os.urandom(300 * 1024)
+
+
+class VideoHandler(BaseHTTPRequestHandler):
+    """Serves VIDEO_BYTES at /ranges (honouring Range) and /no-ranges (always the whole body)."""
+
+    requests_seen = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_headers(self, status, length, start=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"video-v1"')
+        if start is not None:
+            self.send_header("Content-Range", f"bytes {start}-{start + length - 1}/{len(VIDEO_BYTES)}")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.requests_seen.append(("HEAD", self.path, None))
+        self._send_headers(200, len(VIDEO_BYTES))
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        self.requests_seen.append(("GET", self.path, range_header))
+        if range_header and self.path == "/ranges":
+            start, _, end = range_header.replace("bytes=", "").partition("-")
+            start = int(start)
+            end = int(end) if end else len(VIDEO_BYTES) - 1
+            body = VIDEO_BYTES[start:end + 1]
+            self._send_headers(206, len(body), start)
+        else:
+            body = VIDEO_BYTES
+            self._send_headers(200, len(body))
+        self.wfile.write(body)
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), VideoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def gets(path):
+    return [r for r in VideoHandler.requests_seen if r[0] == "GET" and r[1] == path]
+
+
+def test_parallel_ranges_and_cache_hit():
+    """A range-capable server is fetched in parts, and the second download is served from the cache."""
+    server, base_url = start_server()
+    VideoHandler.requests_seen.clear()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            downloader = VideoDownloader(cache_dir=os.path.join(tmp, "cache"))
+            first = asyncio.run(downloader.download(f"{base_url}/ranges", os.path.join(tmp, "first.mp4")))
+            with open(first, "rb") as f:
+                assert f.read() == VIDEO_BYTES
+            assert downloader.stats["parallel_downloads"] == 1
+            assert len(gets("/ranges")) == 5
+            assert all(r[2] and r[2].startswith("bytes=") for r in gets("/ranges"))
+
+            # Another downloader on the same directory stands in for another server process
+            other = VideoDownloader(cache_dir=os.path.join(tmp, "cache"))
+            second = asyncio.run(other.download(f"{base_url}/ranges?signature=other", os.path.join(tmp, "second.mp4")))
+            with open(second, "rb") as f:
+                assert f.read() == VIDEO_BYTES
+            assert other.stats["hits"] == 1
+            assert len(gets("/ranges")) == 5
+            assert other.get_stats()["entries"] == 1
+    finally:
+        server.shutdown()
+    print("✅ Parallel range download and cache hit")
+
+
+def test_stream_fallback():
+    """A server that ignores Range headers is downloaded in a single stream."""
+    server, base_url = start_server()
+    VideoHandler.requests_seen.clear()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            downloader = VideoDownloader(cache_dir=os.path.join(tmp, "cache"))
+            path = asyncio.run(downloader.download(f"{base_url}/no-ranges", os.path.join(tmp, "video.mp4")))
+            with open(path, "rb") as f:
+                assert f.read() == VIDEO_BYTES
+            assert downloader.stats["parallel_downloads"] == 0
+            assert downloader.stats["stream_downloads"] == 1
+            assert any(r[2] is None for r in gets("/no-ranges"))
+    finally:
+        server.shutdown()
+    print("✅ Stream fallback")
+
+
+def test_concurrent_processes_share_one_download():
+    """Two downloaders on one cache directory download a video once and both get it."""
+    server, base_url = start_server()
+    VideoHandler.requests_seen.clear()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_dir = os.path.join(tmp, "cache")
+            first, second = VideoDownloader(cache_dir=cache_dir), VideoDownloader(cache_dir=cache_dir)
+
+            async def run_both():
+                return await asyncio.gather(
+                    first.download(f"{base_url}/ranges", os.path.join(tmp, "a.mp4")),
+                    second.download(f"{base_url}/ranges", os.path.join(tmp, "b.mp4")),
+                )
+
+            for path in asyncio.run(run_both()):
+                with open(path, "rb") as f:
+                    assert f.read() == VIDEO_BYTES
+            assert first.stats["misses"] + second.stats["misses"] == 1
+            assert first.stats["hits"] + second.stats["hits"] == 1
+            assert len(gets("/ranges")) == 5
+    finally:
+        server.shutdown()
+    print("✅ Concurrent downloads share one fetch")
+
+
+if __name__ == "__main__":
+    test_parallel_ranges_and_cache_hit()
+    test_stream_fallback()
+    test_concurrent_processes_share_one_download()